@@ -21,3 +21,64 @@ STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET", "[STRIPE_WEBHOOK
 
 SUPPORT_EMAIL = os.environ.get("SUPPORT_EMAIL", "support@email.com")
 NOREPLY_EMAIL = os.environ.get("NOREPLY_EMAIL", "noreply@email.com")
+
+LEADERBOARD_RECONCILE_SECONDS = int(os.environ.get("LEADERBOARD_RECONCILE_SECONDS", "900"))
+XP_WINDOW_RECONCILE_SECONDS = int(os.environ.get("XP_WINDOW_RECONCILE_SECONDS", "300"))
+XP_WEEKLY_RETENTION = int(os.environ.get("XP_WEEKLY_RETENTION", "8"))
+XP_MONTHLY_RETENTION = int(os.environ.get("XP_MONTHLY_RETENTION", "12"))
+STREAK_RESET_SECONDS = int(os.environ.get("STREAK_RESET_SECONDS", "3600"))
+XP_COMPACT_SECONDS = int(os.environ.get("XP_COMPACT_SECONDS", "5"))
+XP_COMPACT_BATCH_SIZE = int(os.environ.get("XP_COMPACT_BATCH_SIZE", "5000"))
+ACHIEVEMENT_AUTO_POST = os.environ.get("ACHIEVEMENT_AUTO_POST", "true").lower() == "true"
+CELEBRITY_FOLLOWER_THRESHOLD = int(os.environ.get("CELEBRITY_FOLLOWER_THRESHOLD", "10000"))
+HOME_TIMELINE_CAP = int(os.environ.get("HOME_TIMELINE_CAP", "800"))
+HOME_TIMELINE_TRIM_SECONDS = int(os.environ.get("HOME_TIMELINE_TRIM_SECONDS", "3600"))
+FOLLOW_BACKFILL_POSTS = int(os.environ.get("FOLLOW_BACKFILL_POSTS", "20"))
+FEED_PAGE_SIZE = int(os.environ.get("FEED_PAGE_SIZE", "50"))
+FEED_CACHED_PAGES = int(os.environ.get("FEED_CACHED_PAGES", "3"))
+FEED_CACHE_REFRESH_SECONDS = int(os.environ.get("FEED_CACHE_REFRESH_SECONDS", "60"))
+HOT_FEED_CANDIDATES = int(os.environ.get("HOT_FEED_CANDIDATES", "2000"))
+HOT_FEED_HALF_LIFE_HOURS = int(os.environ.get("HOT_FEED_HALF_LIFE_HOURS", "12"))
+HOT_FEED_WINDOW_HOURS = int(os.environ.get("HOT_FEED_WINDOW_HOURS", "72"))
+HOT_FEED_REDECAY_SECONDS = int(os.environ.get("HOT_FEED_REDECAY_SECONDS", "300"))
+HOT_FEED_RELOAD_SECONDS = int(os.environ.get("HOT_FEED_RELOAD_SECONDS", "900"))
+HOT_LIKE_WEIGHT = int(os.environ.get("HOT_LIKE_WEIGHT", "1"))
+HOT_COMMENT_WEIGHT = int(os.environ.get("HOT_COMMENT_WEIGHT", "3"))
+HOT_SHARE_WEIGHT = int(os.environ.get("HOT_SHARE_WEIGHT", "5"))
+COUNTER_FLUSH_MS = int(os.environ.get("COUNTER_FLUSH_MS", "500"))
+COUNTER_FLUSH_EVENTS = int(os.environ.get("COUNTER_FLUSH_EVENTS", "1000"))
+COUNTER_LOG_DIR = os.environ.get("COUNTER_LOG_DIR", "/tmp/levelup-counters")
+HOT_POST_SHARDS = int(os.environ.get("HOT_POST_SHARDS", "16"))
+HOT_POST_PROMOTE_RATE = int(os.environ.get("HOT_POST_PROMOTE_RATE", "20"))
+HOT_POST_DEMOTE_RATE = int(os.environ.get("HOT_POST_DEMOTE_RATE", "2"))
+HOT_POST_MIN_SHARDED_SECONDS = int(os.environ.get("HOT_POST_MIN_SHARDED_SECONDS", "300"))
+HOT_POST_REBALANCE_SECONDS = int(os.environ.get("HOT_POST_REBALANCE_SECONDS", "10"))
+TRENDING_BUCKET_SECONDS = int(os.environ.get("TRENDING_BUCKET_SECONDS", "300"))
+TRENDING_BUCKETS = int(os.environ.get("TRENDING_BUCKETS", "12"))
+TRENDING_TOP_K = int(os.environ.get("TRENDING_TOP_K", "200"))
+TRENDING_SKETCH_WIDTH = int(os.environ.get("TRENDING_SKETCH_WIDTH", "4096"))
+TRENDING_SKETCH_DEPTH = int(os.environ.get("TRENDING_SKETCH_DEPTH", "4"))
+TRENDING_WARMUP_POSTS = int(os.environ.get("TRENDING_WARMUP_POSTS", "5000"))
+FEED_CHANGES_RETENTION_HOURS = int(os.environ.get("FEED_CHANGES_RETENTION_HOURS", "24"))
+FEED_CHANGES_PRUNE_SECONDS = int(os.environ.get("FEED_CHANGES_PRUNE_SECONDS", "3600"))
+STREAM_REPLAY_SIZE = int(os.environ.get("STREAM_REPLAY_SIZE", "1000"))
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", "256"))
+STREAM_HEARTBEAT_SECONDS = int(os.environ.get("STREAM_HEARTBEAT_SECONDS", "15"))
+CHAT_SEND_QUEUE_SIZE = int(os.environ.get("CHAT_SEND_QUEUE_SIZE", "256"))
+CHAT_FLUSH_MS = int(os.environ.get("CHAT_FLUSH_MS", "200"))
+CHAT_FLUSH_SIZE = int(os.environ.get("CHAT_FLUSH_SIZE", "500"))
+BUS_BACKEND = os.environ.get("BUS_BACKEND", "local")
+BUS_SOCKET_PATH = os.environ.get("BUS_SOCKET_PATH", "/tmp/levelup-bus.sock")
+BUS_DATABASE_URL = os.environ.get("BUS_DATABASE_URL", os.environ.get("DATABASE_URL", ""))
+BUS_CHANNEL = os.environ.get("BUS_CHANNEL", "levelup_bus")
+BUS_QUEUE_SIZE = int(os.environ.get("BUS_QUEUE_SIZE", "10000"))
+CHAT_SENDER_BACKFILL_BATCH = int(os.environ.get("CHAT_SENDER_BACKFILL_BATCH", "1000"))
+CHAT_UNREAD_CAP = int(os.environ.get("CHAT_UNREAD_CAP", "100"))
+ACHIEVEMENT_FLUSH_MS = int(os.environ.get("ACHIEVEMENT_FLUSH_MS", "500"))
+ACHIEVEMENT_FLUSH_EVENTS = int(os.environ.get("ACHIEVEMENT_FLUSH_EVENTS", "1000"))
+BUS_HEALTH_CHECK_SECONDS = int(os.environ.get("BUS_HEALTH_CHECK_SECONDS", "15"))
+TRENDING_RELOAD_SECONDS = int(os.environ.get("TRENDING_RELOAD_SECONDS", "900"))
+COUNTER_BASE_TTL_SECONDS = int(os.environ.get("COUNTER_BASE_TTL_SECONDS", "30"))
+COUNTER_BASE_CACHE_SIZE = int(os.environ.get("COUNTER_BASE_CACHE_SIZE", "10000"))
+USER_INDEX_RELOAD_SECONDS = int(os.environ.get("USER_INDEX_RELOAD_SECONDS", "3600"))
+SEARCH_MAX_HITS = int(os.environ.get("SEARCH_MAX_HITS", "1000"))
@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from supabase_client import supabase_admin
 from auth_utils import hash_password, verify_password, create_access_token
+from services.leaderboard import leaderboard
+from services.user_index import user_index
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -48,6 +50,8 @@ async def register_user(payload: RegisterRequest):
             raise HTTPException(status_code=500, detail="Failed to create user")
 
         user = response.data[0]
+        user_index.upsert(user)
+        leaderboard.update(user["id"], 0)
         token = create_access_token(user["id"])
 
         return {
@@ -3,6 +3,8 @@ from pydantic import BaseModel
 from typing import Optional
 import random
 from supabase_client import supabase_admin
+from services.events import emit, SCAN_COMPLETED
+from services.xp_awards import award_xp
 from config import BODY_SCANNER_API_KEY, FACE_SCANNER_API_KEY, FOOD_SCANNER_API_KEY
 
 router = APIRouter(prefix="/api/scan", tags=["scanners"])
@@ -38,21 +40,8 @@ async def scan_body(user_id: str, file: UploadFile = File(...)):
 
         response = supabase_admin.table("scans").insert(scan_data).execute()
 
-        user_response = supabase_admin.table("users").select("xp, level").eq("id", user_id).execute()
-        if user_response.data:
-            user = user_response.data[0]
-            new_xp = user.get("xp", 0) + xp_earned
-            current_level = user.get("level", 1)
-
-            xp_for_next_level = current_level * 100
-            if new_xp >= xp_for_next_level:
-                current_level += 1
-                new_xp -= xp_for_next_level
-
-            supabase_admin.table("users").update({
-                "xp": new_xp,
-                "level": current_level
-            }).eq("id", user_id).execute()
+        award_xp(user_id, xp_earned, source="scan:body")
+        emit(SCAN_COMPLETED, user_id, scan_type="body", xp_earned=xp_earned)
 
         return {
             "message": "Body scan completed successfully",
@@ -95,21 +84,8 @@ async def scan_face(user_id: str, file: UploadFile = File(...)):
 
         response = supabase_admin.table("scans").insert(scan_data).execute()
 
-        user_response = supabase_admin.table("users").select("xp, level").eq("id", user_id).execute()
-        if user_response.data:
-            user = user_response.data[0]
-            new_xp = user.get("xp", 0) + xp_earned
-            current_level = user.get("level", 1)
-
-            xp_for_next_level = current_level * 100
-            if new_xp >= xp_for_next_level:
-                current_level += 1
-                new_xp -= xp_for_next_level
-
-            supabase_admin.table("users").update({
-                "xp": new_xp,
-                "level": current_level
-            }).eq("id", user_id).execute()
+        award_xp(user_id, xp_earned, source="scan:face")
+        emit(SCAN_COMPLETED, user_id, scan_type="face", xp_earned=xp_earned)
 
         return {
             "message": "Face scan completed successfully",
@@ -156,21 +132,8 @@ async def scan_food(user_id: str, file: UploadFile = File(...)):
 
         response = supabase_admin.table("scans").insert(scan_data).execute()
 
-        user_response = supabase_admin.table("users").select("xp, level").eq("id", user_id).execute()
-        if user_response.data:
-            user = user_response.data[0]
-            new_xp = user.get("xp", 0) + xp_earned
-            current_level = user.get("level", 1)
-
-            xp_for_next_level = current_level * 100
-            if new_xp >= xp_for_next_level:
-                current_level += 1
-                new_xp -= xp_for_next_level
-
-            supabase_admin.table("users").update({
-                "xp": new_xp,
-                "level": current_level
-            }).eq("id", user_id).execute()
+        award_xp(user_id, xp_earned, source="scan:food")
+        emit(SCAN_COMPLETED, user_id, scan_type="food", xp_earned=xp_earned)
 
         return {
             "message": "Food scan completed successfully",
@@ -1,8 +1,29 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import base64
+import json
+import uuid
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
 from supabase_client import supabase_admin
+from config import FOLLOW_BACKFILL_POSTS, FEED_PAGE_SIZE, CHAT_UNREAD_CAP, SEARCH_MAX_HITS
+from services.chat_gateway import chat_gateway, chat_writer, ChatConnection
+from services.chat_senders import sender_snapshot
+from services.events import emit, POST_CREATED, COMMENT_CREATED, MESSAGE_SENT
+from services.fanout import fanout_worker
+from services.feed_changes import feed_version, changes_since, changes_expired, decode_version, encode_version
+from services.feed_cache import feed_cache, feed_entry, FEED_POST_SELECT
+from services.hot_feed import hot_feed
+from services.leaderboard import leaderboard
+from services.post_counters import post_counters
+from services.stream import stream_hub
+from services.trending import trending
+from services.user_index import get_user_summaries, user_index
+from services.xp_windows import xp_windows, window_start, PERIODS
+from user_fields import USER_SUMMARY_SELECT
+from xp_utils import fold_pending_xp, level_from_total, total_xp
 
 router = APIRouter(prefix="/api/social", tags=["social"])
 
@@ -16,41 +37,294 @@ class LikePostRequest(BaseModel):
     user_id: str
     post_id: str
 
+class SharePostRequest(BaseModel):
+    user_id: str
+    post_id: str
+
+class ViewPostRequest(BaseModel):
+    user_id: Optional[str] = None
+    post_id: str
+
+class FollowRequest(BaseModel):
+    follower_id: str
+    followee_id: str
+
 class CommentPostRequest(BaseModel):
     user_id: str
     post_id: str
     content: str
 
+class MarkReadRequest(BaseModel):
+    user_id: str
+    message_id: Optional[str] = None
+
 @router.get("/feed")
-async def get_social_feed(user_id: Optional[str] = None):
+async def get_social_feed(user_id: Optional[str] = None, page: int = 0, sort: str = "recent"):
     try:
-        response = supabase_admin.table("posts").select("*").order("timestamp", desc=True).limit(50).execute()
+        if sort not in ("recent", "hot"):
+            raise HTTPException(status_code=400, detail="Unknown sort, expected 'recent' or 'hot'")
+
+        page = max(0, page)
+        start = page * FEED_PAGE_SIZE
+        version = None
+
+        if sort == "hot":
+            ids = hot_feed.page(start, FEED_PAGE_SIZE)
+            rows = supabase_admin.table("posts").select(FEED_POST_SELECT).in_("id", ids).execute().data if ids else []
+            by_id = {post["id"]: post for post in rows}
+            rows = [by_id[i] for i in ids if i in by_id]
+        else:
+            cached = feed_cache.page_json(page, user_id)
+
+            if cached is not None:
+                return Response(content=cached, media_type="application/json")
+
+            version = feed_version()
+            rows = supabase_admin.table("posts").select(FEED_POST_SELECT).order("timestamp", desc=True).range(start, start + FEED_PAGE_SIZE - 1).execute().data
+
+        authors = get_user_summaries([post["user_id"] for post in rows])
+
+        rows = [post_counters.overlay(post) for post in rows]
+        liked = post_counters.liked_posts(user_id, rows)
+
+        posts = []
+        for post in rows:
+            entry = feed_entry(post, authors.get(post["user_id"], {}))
+            entry["isLiked"] = post["id"] in liked
+            posts.append(entry)
+
+        if version is None:
+            return {"posts": posts}
+        return {"version": version, "posts": posts}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get feed: {str(e)}")
+
+@router.get("/feed/changes")
+async def get_feed_changes(since: str, user_id: Optional[str] = None, limit: int = 500):
+    try:
+        limit = max(1, min(limit, 1000))
+
+        # Unreadable versions (e.g. from before versions were positions) and
+        # ones older than the pruned part of the log both need a reload
+        position = decode_version(since)
+        if position is None or changes_expired(position):
+            return {"version": feed_version(), "reset": True}
+
+        changes = changes_since(position, limit)
+        if not changes:
+            return {"version": since, "posts": [], "counters": [], "more": False}
+
+        new_ids = []
+        counters = {}
+        for change in changes:
+            if change["kind"] == "post":
+                new_ids.append(change["post_id"])
+            counters[change["post_id"]] = [change["post_id"], change["likes"], change["comments"], change["shares"]]
 
         posts = []
-        for post in response.data:
-            user_response = supabase_admin.table("users").select("name, avatar_url, level").eq("id", post["user_id"]).execute()
+        if new_ids:
+            rows = supabase_admin.table("posts").select(FEED_POST_SELECT).in_("id", new_ids).order("timestamp", desc=True).execute().data
+            rows = [post_counters.overlay(post) for post in rows]
+            authors = get_user_summaries([post["user_id"] for post in rows])
+            liked = post_counters.liked_posts(user_id, rows)
+            for post in rows:
+                entry = feed_entry(post, authors.get(post["user_id"], {}))
+                entry["isLiked"] = post["id"] in liked
+                posts.append(entry)
+                counters.pop(post["id"], None)
+
+        return {
+            "version": encode_version(changes[-1]["xid"], changes[-1]["seq"]),
+            "posts": posts,
+            "counters": list(counters.values()),
+            "more": len(changes) == limit
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get feed changes: {str(e)}")
+
+def _encode_rank_cursor(row: dict) -> str:
+    raw = json.dumps([row["rank"], row["id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_rank_cursor(cursor: str) -> dict:
+    try:
+        rank, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {"after_rank": rank, "after_id": last_id}
+
+def _search_page(rpc: str, params: dict, cursor: Optional[str]) -> tuple:
+    params["max_hits"] = SEARCH_MAX_HITS
+    if cursor:
+        params.update(_decode_rank_cursor(cursor))
 
-            user_data = user_response.data[0] if user_response.data else {"name": "User", "avatar_url": None, "level": 1}
+    rows = supabase_admin.rpc(rpc, params).execute().data or []
 
-            likes_by = post.get("likes_by", [])
-            is_liked = user_id in likes_by if user_id and isinstance(likes_by, list) else False
+    next_cursor = None
+    if len(rows) == params["page_size"]:
+        next_cursor = _encode_rank_cursor(rows[-1])
 
+    return rows, next_cursor
+
+@router.get("/search")
+async def search_posts(q: str, cursor: Optional[str] = None, limit: int = 20):
+    try:
+        rows, next_cursor = _search_page("search_posts", {"q": q, "page_size": max(1, min(limit, 100))}, cursor)
+        authors = get_user_summaries([row["user_id"] for row in rows])
+
+        posts = []
+        for row in map(post_counters.overlay, rows):
+            author = authors.get(row["user_id"], {})
             posts.append({
-                "id": post["id"],
-                "user": user_data,
-                "content": post["content"],
-                "timestamp": post["timestamp"],
-                "likes": post.get("likes", 0),
-                "comments": len(post.get("comments", [])),
-                "isLiked": is_liked,
-                "type": post.get("type", "general"),
-                "xp_earned": post.get("xp_earned"),
-                "media": post.get("media", [])
+                "id": row["id"],
+                "user": {"name": author.get("name", "User"), "avatar_url": author.get("avatar_url"), "level": author.get("level", 1)},
+                "content": row["content"],
+                "timestamp": row["timestamp"],
+                "likes": row.get("likes") or 0,
+                "shares": row.get("share_count") or 0,
+                "type": row.get("type", "general"),
+                "media": row.get("media") or []
             })
 
-        return {"posts": posts}
+        return {"posts": posts, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get feed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+@router.get("/trending")
+async def get_trending(limit: int = 10, kind: str = "all"):
+    if kind not in ("all", "hashtag", "keyword"):
+        raise HTTPException(status_code=400, detail="Unknown kind, expected 'all', 'hashtag' or 'keyword'")
+
+    return {"trending": trending.top(max(1, min(limit, 50)), kind)}
+
+@router.get("/stream")
+async def stream_feed(request: Request, last_event_id: Optional[str] = None):
+    resume = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        stream_hub.frames(resume),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _encode_home_cursor(row: dict) -> str:
+    raw = json.dumps([row["timestamp"], row["id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_home_cursor(cursor: str) -> dict:
+    try:
+        timestamp, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        uuid.UUID(post_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {"p_before_ts": timestamp, "p_before_id": post_id}
+
+@router.get("/home")
+async def get_home_feed(user_id: str, limit: int = 20, before: Optional[str] = None):
+    try:
+        params = {"p_user_id": user_id, "p_limit": max(1, min(limit, 50))}
+
+        if before:
+            params.update(_decode_home_cursor(before))
+
+        response = supabase_admin.rpc("home_feed", params).execute()
+        rows = [post_counters.overlay(row) for row in response.data or []]
+        liked = post_counters.liked_posts(user_id, rows)
+        authors = get_user_summaries([row["user_id"] for row in rows])
+
+        posts = []
+        for row in rows:
+            author = authors.get(row["user_id"], {})
+            posts.append({
+                "id": row["id"],
+                "user": {"name": author.get("name", "User"), "avatar_url": author.get("avatar_url"), "level": author.get("level", 1)},
+                "content": row["content"],
+                "timestamp": row["timestamp"],
+                "likes": row.get("likes") or 0,
+                "comments": row.get("comments") or 0,
+                "isLiked": row["id"] in liked,
+                "type": row.get("type", "general"),
+                "xp_earned": row.get("xp_earned"),
+                "media": row.get("media") or []
+            })
+
+        next_cursor = None
+        if len(rows) == params["p_limit"]:
+            next_cursor = _encode_home_cursor(rows[-1])
+
+        return {"posts": posts, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get home feed: {str(e)}")
+
+@router.post("/follow")
+async def follow_user(req: FollowRequest):
+    try:
+        if req.follower_id == req.followee_id:
+            raise HTTPException(status_code=400, detail="Cannot follow yourself")
+
+        response = supabase_admin.rpc("follow_user", {
+            "p_follower_id": req.follower_id,
+            "p_followee_id": req.followee_id,
+            "p_backfill": FOLLOW_BACKFILL_POSTS
+        }).execute()
+
+        return {"following": True, "changed": bool(response.data)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to follow user: {str(e)}")
+
+@router.post("/unfollow")
+async def unfollow_user(req: FollowRequest):
+    try:
+        response = supabase_admin.rpc("unfollow_user", {
+            "p_follower_id": req.follower_id,
+            "p_followee_id": req.followee_id
+        }).execute()
+
+        return {"following": False, "changed": bool(response.data)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to unfollow user: {str(e)}")
+
+def _follow_page(column: str, other: str, user_id: str, after: Optional[str], limit: int) -> dict:
+    query = supabase_admin.table("follows").select(other).eq(column, user_id)
+
+    if after:
+        query = query.gt(other, after)
+
+    limit = max(1, min(limit, 200))
+    response = query.order(other).limit(limit).execute()
+    ids = [row[other] for row in response.data]
+    profiles = get_user_summaries(ids)
+
+    return {
+        "users": [profiles[i] for i in ids if i in profiles],
+        "next_cursor": ids[-1] if len(ids) == limit else None
+    }
+
+@router.get("/followers/{user_id}")
+async def get_followers(user_id: str, after: Optional[str] = None, limit: int = 50):
+    try:
+        return _follow_page("followee_id", "follower_id", user_id, after, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get followers: {str(e)}")
+
+@router.get("/following/{user_id}")
+async def get_following(user_id: str, after: Optional[str] = None, limit: int = 50):
+    try:
+        return _follow_page("follower_id", "followee_id", user_id, after, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get following: {str(e)}")
 
 @router.post("/post")
 async def create_post(req: CreatePostRequest):
@@ -74,6 +348,12 @@ async def create_post(req: CreatePostRequest):
 
         post = response.data[0]
         user = user_response.data[0]
+        fanout_worker.enqueue(post["id"])
+        entry = feed_entry(post, user)
+        feed_cache.add_post(entry)
+        stream_hub.publish("post", f"post:{post['id']}", {**entry, "isLiked": False})
+        hot_feed.add_post(post["id"], post["timestamp"])
+        emit(POST_CREATED, req.user_id, post_id=post["id"], type=post["type"])
 
         return {
             "id": post["id"],
@@ -94,27 +374,20 @@ async def create_post(req: CreatePostRequest):
 @router.post("/like")
 async def like_post(req: LikePostRequest):
     try:
-        response = supabase_admin.table("posts").select("likes, likes_by").eq("id", req.post_id).execute()
+        state = post_counters.like_state(req.post_id, req.user_id)
 
-        if not response.data:
+        if state is None:
             raise HTTPException(status_code=404, detail="Post not found")
 
-        post = response.data[0]
-        likes_by = post.get("likes_by", [])
+        likes, was_liked = state
+        liked = not was_liked
+        new_likes = max(0, likes + (1 if liked else -1))
 
-        if req.user_id in likes_by:
-            likes_by.remove(req.user_id)
-            new_likes = max(0, post.get("likes", 0) - 1)
-            liked = False
-        else:
-            likes_by.append(req.user_id)
-            new_likes = post.get("likes", 0) + 1
-            liked = True
+        post_counters.like(req.post_id, req.user_id, liked)
 
-        supabase_admin.table("posts").update({
-            "likes": new_likes,
-            "likes_by": likes_by
-        }).eq("id", req.post_id).execute()
+        feed_cache.patch(req.post_id, likes=new_likes)
+        stream_hub.publish("counters", f"likes:{req.post_id}", {"post_id": req.post_id, "likes": new_likes})
+        hot_feed.update(req.post_id, likes=new_likes)
 
         return {"liked": liked, "likes": new_likes}
     except HTTPException:
@@ -147,6 +420,10 @@ async def comment_post(req: CommentPostRequest):
         comments.append(new_comment)
 
         supabase_admin.table("posts").update({"comments": comments}).eq("id", req.post_id).execute()
+        feed_cache.patch(req.post_id, comments=len(comments))
+        stream_hub.publish("counters", f"comments:{req.post_id}", {"post_id": req.post_id, "comments": len(comments)})
+        hot_feed.update(req.post_id, comments=len(comments))
+        emit(COMMENT_CREATED, req.user_id, post_id=req.post_id)
 
         user = user_response.data[0]
 
@@ -163,29 +440,112 @@ async def comment_post(req: CommentPostRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to comment: {str(e)}")
 
+@router.get("/post/{post_id}/comments")
+async def get_post_comments(post_id: str):
+    try:
+        response = supabase_admin.table("posts").select("comments").eq("id", post_id).execute()
+
+        if not response.data:
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        comments = response.data[0].get("comments") or []
+        authors = get_user_summaries([comment["user_id"] for comment in comments])
+
+        results = []
+        for comment in comments:
+            author = authors.get(comment["user_id"], {})
+            results.append({
+                "id": comment["id"],
+                "user": {"name": author.get("name", "User"), "avatar_url": author.get("avatar_url")},
+                "content": comment["content"],
+                "timestamp": comment["timestamp"]
+            })
+
+        return {"comments": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get comments: {str(e)}")
+
+@router.post("/share")
+async def share_post(req: SharePostRequest):
+    try:
+        counts = post_counters.counts(req.post_id)
+
+        if counts is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        post_counters.add(req.post_id, "shares")
+        new_count = counts["share_count"] + 1
+
+        feed_cache.patch(req.post_id, shares=new_count)
+        stream_hub.publish("counters", f"shares:{req.post_id}", {"post_id": req.post_id, "shares": new_count})
+        hot_feed.update(req.post_id, shares=new_count)
+
+        return {"share_count": new_count}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to share post: {str(e)}")
+
+@router.post("/view")
+async def view_post(req: ViewPostRequest):
+    try:
+        counts = post_counters.counts(req.post_id)
+
+        if counts is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        post_counters.add(req.post_id, "views")
+
+        return {"view_count": counts["view_count"] + 1}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to record view: {str(e)}")
+
+def _chat_room(room: dict, is_joined: bool, unread: int = 0) -> dict:
+    return {
+        "id": room["id"],
+        "name": room["name"],
+        "description": room.get("description", ""),
+        "category": room.get("category", "general"),
+        "type": room.get("type", "public"),
+        "members": room.get("member_count", 0),
+        "lastMessage": room.get("last_message", ""),
+        "lastActivity": room.get("last_activity"),
+        "isJoined": is_joined,
+        "unread": unread
+    }
+
+def _unread_counts(user_id: str, room_ids: list) -> dict:
+    # Only rooms the user belongs to come back, so this doubles as the membership check
+    rows = supabase_admin.rpc("chat_unread_counts", {
+        "p_user_id": user_id,
+        "p_room_ids": room_ids,
+        "p_cap": CHAT_UNREAD_CAP
+    }).execute().data or []
+    return {row["room_id"]: row["unread"] for row in rows}
+
 @router.get("/chat-rooms")
-async def get_chat_rooms(user_id: Optional[str] = None):
+async def get_chat_rooms(user_id: Optional[str] = None, joined: bool = False):
     try:
+        if joined:
+            if not user_id:
+                raise HTTPException(status_code=400, detail="user_id is required with joined=true")
+            rows = supabase_admin.rpc("user_chat_rooms", {"p_user_id": user_id, "p_limit": 50}).execute().data or []
+            unread = _unread_counts(user_id, [room["id"] for room in rows]) if rows else {}
+            return {"rooms": [_chat_room(room, True, unread.get(room["id"], 0)) for room in rows]}
+
         response = supabase_admin.table("chat_rooms").select("*").order("last_activity", desc=True).limit(50).execute()
 
-        rooms = []
-        for room in response.data:
-            members = room.get("members", [])
-            is_joined = user_id in members if user_id else False
-
-            rooms.append({
-                "id": room["id"],
-                "name": room["name"],
-                "description": room.get("description", ""),
-                "category": room.get("category", "general"),
-                "type": room.get("type", "public"),
-                "members": len(members),
-                "lastMessage": room.get("last_message", ""),
-                "lastActivity": room.get("last_activity"),
-                "isJoined": is_joined
-            })
+        unread = {}
+        if user_id and response.data:
+            unread = _unread_counts(user_id, [room["id"] for room in response.data])
 
-        return {"rooms": rooms}
+        return {"rooms": [_chat_room(room, room["id"] in unread, unread.get(room["id"], 0)) for room in response.data]}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get chat rooms: {str(e)}")
 
@@ -198,8 +558,7 @@ async def create_chat_room(room: dict):
             "category": room.get("category", "general"),
             "type": room.get("type", "public"),
             "max_members": room.get("maxMembers", 50),
-            "creator_id": room.get("creator_id"),
-            "members": [room.get("creator_id")] if room.get("creator_id") else []
+            "creator_id": room.get("creator_id")
         }
 
         response = supabase_admin.table("chat_rooms").insert(room_data).execute()
@@ -207,19 +566,7 @@ async def create_chat_room(room: dict):
         if not response.data:
             raise HTTPException(status_code=500, detail="Failed to create chat room")
 
-        new_room = response.data[0]
-
-        return {
-            "id": new_room["id"],
-            "name": new_room["name"],
-            "description": new_room.get("description", ""),
-            "category": new_room.get("category", "general"),
-            "type": new_room.get("type", "public"),
-            "members": len(new_room.get("members", [])),
-            "lastMessage": "",
-            "lastActivity": new_room.get("last_activity"),
-            "isJoined": True
-        }
+        return _chat_room(response.data[0], True)
     except HTTPException:
         raise
     except Exception as e:
@@ -231,20 +578,15 @@ async def join_room(data: dict):
         user_id = data.get("user_id")
         room_id = data.get("room_id")
 
-        response = supabase_admin.table("chat_rooms").select("members").eq("id", room_id).execute()
-
-        if not response.data:
-            raise HTTPException(status_code=404, detail="Room not found")
-
-        members = response.data[0].get("members", [])
+        if not user_id or not room_id:
+            raise HTTPException(status_code=400, detail="Missing required fields")
 
-        if user_id not in members:
-            members.append(user_id)
+        result = supabase_admin.rpc("join_chat_room", {"p_room_id": room_id, "p_user_id": user_id}).execute().data
 
-        supabase_admin.table("chat_rooms").update({
-            "members": members,
-            "last_activity": datetime.utcnow().isoformat()
-        }).eq("id", room_id).execute()
+        if result == "not_found":
+            raise HTTPException(status_code=404, detail="Room not found")
+        if result == "full":
+            raise HTTPException(status_code=409, detail="Room is full")
 
         return {"message": "Joined successfully"}
     except HTTPException:
@@ -252,34 +594,87 @@ async def join_room(data: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to join room: {str(e)}")
 
+@router.post("/chat-room/{room_id}/read")
+async def mark_room_read(room_id: str, req: MarkReadRequest):
+    try:
+        updated = supabase_admin.rpc("mark_chat_room_read", {
+            "p_room_id": room_id,
+            "p_user_id": req.user_id,
+            "p_message_id": req.message_id
+        }).execute().data
+
+        return {"updated": bool(updated)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to mark room read: {str(e)}")
+
+def _decode_history_cursor(before: str) -> dict:
+    timestamp, _, message_id = before.rpartition(",")
+    try:
+        datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        uuid.UUID(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {"p_before_ts": timestamp, "p_before_id": message_id}
+
 @router.get("/chat-room/{room_id}/messages")
-async def get_chat_messages(room_id: str):
+async def get_chat_messages(room_id: str, before: Optional[str] = None, limit: int = 50):
     try:
-        response = supabase_admin.table("chat_messages").select("*").eq("room_id", room_id).order("timestamp").limit(200).execute()
+        params = {"p_room_id": room_id, "p_limit": max(1, min(limit, 200))}
+        if before:
+            params.update(_decode_history_cursor(before))
 
-        messages = []
-        for msg in response.data:
-            user_response = supabase_admin.table("users").select("name, avatar_url").eq("id", msg["user_id"]).execute()
+        # Newest first from the index; the page is returned oldest first for display
+        rows = supabase_admin.rpc("chat_messages_before", params).execute().data or []
+        next_before = f"{rows[-1]['timestamp']},{rows[-1]['id']}" if len(rows) == params["p_limit"] else None
 
-            user_data = user_response.data[0] if user_response.data else {"name": "User", "avatar_url": None}
+        messages = [_chat_message(msg) for msg in reversed(rows)]
 
+        return {"messages": messages, "next_before": next_before}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get messages: {str(e)}")
+
+@router.get("/chat-room/{room_id}/search")
+async def search_chat_messages(room_id: str, user_id: str, q: str, cursor: Optional[str] = None, limit: int = 20):
+    try:
+        if not _can_join_room(user_id, room_id):
+            raise HTTPException(status_code=404, detail="Room not found")
+
+        params = {"p_room_id": room_id, "q": q, "page_size": max(1, min(limit, 100))}
+        rows, next_cursor = _search_page("search_chat_messages", params, cursor)
+
+        messages = []
+        for row in rows:
             messages.append({
-                "id": msg["id"],
-                "room_id": msg["room_id"],
-                "user": {
-                    "id": msg["user_id"],
-                    "name": user_data["name"],
-                    "avatar": user_data.get("avatar_url")
-                },
-                "message": msg["message"],
-                "timestamp": msg["timestamp"],
-                "type": msg.get("type", "text"),
-                "meta": msg.get("meta")
+                "id": row["id"],
+                "room_id": row["room_id"],
+                "user": _chat_sender(row),
+                "message": row["message"],
+                "timestamp": row["timestamp"],
+                "type": row.get("type", "text")
             })
 
-        return {"messages": messages}
+        return {"messages": messages, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get messages: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+def _chat_sender(msg: dict) -> dict:
+    return {"id": msg["user_id"], **(msg.get("sender") or {"name": "User", "avatar": None})}
+
+def _chat_message(msg: dict) -> dict:
+    return {
+        "id": msg["id"],
+        "room_id": msg["room_id"],
+        "user": _chat_sender(msg),
+        "message": msg["message"],
+        "timestamp": msg["timestamp"],
+        "type": msg.get("type", "text"),
+        "meta": msg.get("meta")
+    }
 
 @router.post("/chat-room/message")
 async def post_chat_message(data: dict):
@@ -291,9 +686,9 @@ async def post_chat_message(data: dict):
         if not all([user_id, room_id, message]):
             raise HTTPException(status_code=400, detail="Missing required fields")
 
-        user_response = supabase_admin.table("users").select("name, avatar_url").eq("id", user_id).execute()
+        user = get_user_summaries([user_id]).get(user_id)
 
-        if not user_response.data:
+        if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
         message_data = {
@@ -304,33 +699,252 @@ async def post_chat_message(data: dict):
             "meta": data.get("meta")
         }
 
+        # Triggers fill the sender snapshot and update the room in the same statement
         response = supabase_admin.table("chat_messages").insert(message_data).execute()
 
         if not response.data:
             raise HTTPException(status_code=500, detail="Failed to send message")
 
-        supabase_admin.table("chat_rooms").update({
-            "last_message": message,
-            "last_activity": datetime.utcnow().isoformat()
-        }).eq("id", room_id).execute()
-
         msg = response.data[0]
-        user = user_response.data[0]
+        emit(MESSAGE_SENT, user_id, room_id=room_id, message_id=msg["id"])
+
+        payload = _chat_message(msg)
+        chat_gateway.broadcast(room_id, {"type": "message", **payload})
+
+        return payload
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to send message: {str(e)}")
+
+def _can_join_room(user_id: str, room_id: str) -> bool:
+    response = supabase_admin.table("chat_rooms").select("type").eq("id", room_id).execute()
+    if not response.data:
+        return False
+    if response.data[0].get("type", "public") == "public":
+        return True
+    membership = supabase_admin.table("chat_room_members").select("id").eq("room_id", room_id).eq("user_id", user_id).execute()
+    return bool(membership.data)
+
+CHAT_MESSAGE_TYPES = ("text", "shared_post")
+CHAT_MESSAGE_MAX_CHARS = 4000
+CHAT_META_MAX_BYTES = 4096
+CHAT_CLIENT_ID_MAX_CHARS = 100
+
+def _socket_frame_error(frame) -> Optional[str]:
+    # Anything a client sends is checked before its fields are used, so a bad
+    # frame gets an error frame instead of closing the socket
+    if not isinstance(frame, dict):
+        return "Frames must be JSON objects"
+    if not isinstance(frame.get("type"), str):
+        return "Frames need a string type"
+    room_id = frame.get("room_id")
+    if room_id is not None:
+        try:
+            uuid.UUID(room_id)
+        except (TypeError, ValueError, AttributeError):
+            return "Invalid room_id"
+    client_id = frame.get("client_id")
+    if client_id is not None and (not isinstance(client_id, str) or len(client_id) > CHAT_CLIENT_ID_MAX_CHARS):
+        return f"client_id must be a string of at most {CHAT_CLIENT_ID_MAX_CHARS} characters"
+    return None
+
+def _chat_frame_error(frame: dict) -> Optional[str]:
+    # Socket messages are inserted later in a batch, so reject anything the
+    # table would refuse before it is broadcast and queued
+    message = frame.get("message")
+    if not isinstance(message, str) or not message:
+        return "Send a non-empty message"
+    if len(message) > CHAT_MESSAGE_MAX_CHARS:
+        return f"Messages are limited to {CHAT_MESSAGE_MAX_CHARS} characters"
+    if frame.get("message_type", "text") not in CHAT_MESSAGE_TYPES:
+        return f"Unknown message type: {frame.get('message_type')}"
+    meta = frame.get("meta")
+    if meta is not None:
+        if not isinstance(meta, dict):
+            return "meta must be an object"
+        if len(json.dumps(meta, separators=(",", ":"))) > CHAT_META_MAX_BYTES:
+            return f"meta is limited to {CHAT_META_MAX_BYTES} bytes"
+    return None
+
+@router.websocket("/chat/ws")
+async def chat_socket(websocket: WebSocket, user_id: str):
+    # Lookups are blocking calls, so keep them off the loop every socket shares
+    loop = asyncio.get_running_loop()
+    users = await loop.run_in_executor(None, get_user_summaries, [user_id])
+    user = users.get(user_id)
+    if not user:
+        await websocket.close(code=4404)
+        return
+
+    await websocket.accept()
+    connection = ChatConnection(websocket, {"id": user_id, **sender_snapshot(user)})
+    chat_gateway.connect(connection)
+
+    try:
+        while True:
+            try:
+                frame = json.loads(await websocket.receive_text())
+            except ValueError:
+                chat_gateway.send(connection, {"type": "error", "detail": "Invalid JSON"})
+                continue
+
+            error = _socket_frame_error(frame)
+            if error:
+                chat_gateway.send(connection, {"type": "error", "detail": error})
+                continue
+
+            kind = frame.get("type")
+            room_id = frame.get("room_id")
+
+            if kind == "subscribe":
+                if not room_id or not await loop.run_in_executor(None, _can_join_room, user_id, room_id):
+                    chat_gateway.send(connection, {"type": "error", "room_id": room_id, "detail": "Room not found"})
+                    continue
+                chat_gateway.join(connection, room_id)
+                chat_gateway.send(connection, {"type": "subscribed", "room_id": room_id})
+            elif kind == "unsubscribe":
+                chat_gateway.leave(connection, room_id)
+                chat_gateway.send(connection, {"type": "unsubscribed", "room_id": room_id})
+            elif kind == "message":
+                if room_id not in connection.rooms:
+                    chat_gateway.send(connection, {"type": "error", "room_id": room_id, "detail": "Subscribe to the room first"})
+                    continue
+                error = _chat_frame_error(frame)
+                if error:
+                    chat_gateway.send(connection, {"type": "error", "room_id": room_id, "detail": error})
+                    continue
+                row = {
+                    "id": str(uuid.uuid4()),
+                    "room_id": room_id,
+                    "user_id": user_id,
+                    "message": frame["message"],
+                    "type": frame.get("message_type", "text"),
+                    "meta": frame.get("meta")
+                }
+                # The stored timestamp and sender snapshot are taken at insert
+                # time; the broadcast uses the current profile rather than the
+                # one at connect
+                sender = user_index.get_many([user_id]).get(user_id, user)
+                chat_writer.enqueue(row)
+                chat_gateway.broadcast(room_id, {"type": "message", **_chat_message({
+                    **row,
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "sender": sender_snapshot(sender)
+                })})
+                if frame.get("client_id"):
+                    chat_gateway.send(connection, {"type": "ack", "client_id": frame["client_id"], "id": row["id"]})
+            else:
+                chat_gateway.send(connection, {"type": "error", "detail": f"Unknown frame type: {kind}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        chat_gateway.disconnect(connection)
+
+def _leaderboard_board(period: str):
+    if period == "all":
+        return leaderboard
+    if period in PERIODS:
+        return xp_windows.board(period)
+    raise HTTPException(status_code=400, detail=f"Unknown period: {period}")
+
+def _leaderboard_entries(ranked: list, period: str = "all") -> list:
+    profiles = get_user_summaries([user_id for _, user_id, _ in ranked])
+
+    entries = []
+    for rank, user_id, score in ranked:
+        profile = profiles.get(user_id, {})
+        entry = {
+            "rank": rank,
+            "id": user_id,
+            "name": profile.get("name", "User"),
+            "username": profile.get("username"),
+            "avatar_url": profile.get("avatar_url")
+        }
+
+        if period == "all":
+            level, xp = level_from_total(score)
+            entry.update({"level": level, "xp": xp, "total_xp": score})
+        else:
+            entry.update({"level": profile.get("level", 1), "window_xp": score})
+
+        entries.append(entry)
+
+    return entries
+
+def _leaderboard_from_db(period: str, limit: int, offset: int) -> list:
+    if period == "all":
+        response = supabase_admin.table("users").select(USER_SUMMARY_SELECT).order("level", desc=True).order("xp", desc=True).range(offset, offset + limit - 1).execute()
+        users = [fold_pending_xp(u) for u in response.data]
+        return [(offset + i + 1, u["id"], total_xp(u.get("level") or 1, u.get("xp") or 0)) for i, u in enumerate(users)]
+
+    response = supabase_admin.table("xp_windows").select("user_id, xp").eq("period", period).eq("window_start", window_start(period).isoformat()).order("xp", desc=True).range(offset, offset + limit - 1).execute()
+    return [(offset + i + 1, row["user_id"], row["xp"]) for i, row in enumerate(response.data)]
+
+@router.get("/leaderboard")
+async def get_leaderboard(limit: int = 50, offset: int = 0, period: str = "all"):
+    try:
+        limit = max(1, min(limit, 100))
+        offset = max(0, offset)
+        board = _leaderboard_board(period)
+
+        if not board.ready:
+            ranked = _leaderboard_from_db(period, limit, offset)
+        else:
+            ranked = board.top(limit, offset)
+
+        return {"period": period, "leaderboard": _leaderboard_entries(ranked, period)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get leaderboard: {str(e)}")
+
+def _leaderboard_position_from_db(period: str, user_id: str, radius: int) -> tuple:
+    # Counts the users ahead, ranked the same way as _leaderboard_from_db
+    try:
+        uuid.UUID(user_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="User not found")
+    response = supabase_admin.table("users").select("id, level, xp").eq("id", user_id).execute()
+    if not response.data:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if period == "all":
+        level, xp = response.data[0].get("level") or 1, response.data[0].get("xp") or 0
+        score = total_xp(level, xp)
+        ahead = supabase_admin.table("users").select("id", count="exact", head=True).or_(f"level.gt.{level},and(level.eq.{level},xp.gt.{xp})").execute().count
+    else:
+        start = window_start(period).isoformat()
+        window = supabase_admin.table("xp_windows").select("xp").eq("period", period).eq("window_start", start).eq("user_id", user_id).execute()
+        score = window.data[0]["xp"] if window.data else 0
+        ahead = supabase_admin.table("xp_windows").select("user_id", count="exact", head=True).eq("period", period).eq("window_start", start).gt("xp", score).execute().count
+
+    rank = (ahead or 0) + 1
+    offset = max(0, rank - 1 - radius)
+    return rank, score, _leaderboard_from_db(period, rank - offset + radius, offset)
+
+@router.get("/leaderboard/{user_id}")
+async def get_leaderboard_position(user_id: str, radius: int = 5, period: str = "all"):
+    try:
+        board = _leaderboard_board(period)
+        radius = max(0, min(radius, 25))
+        position = board.rank_of(user_id) if board.ready else None
+
+        # Before the board has loaded (startup, a new week or month) and for
+        # users it does not hold yet, rank from the tables instead
+        if position is None:
+            rank, score, neighbors = _leaderboard_position_from_db(period, user_id, radius)
+        else:
+            rank, score = position
+            neighbors = board.around(user_id, radius)
 
         return {
-            "id": msg["id"],
-            "room_id": msg["room_id"],
-            "user": {
-                "id": user_id,
-                "name": user["name"],
-                "avatar": user.get("avatar_url")
-            },
-            "message": msg["message"],
-            "timestamp": msg["timestamp"],
-            "type": msg.get("type", "text"),
-            "meta": msg.get("meta")
+            "period": period,
+            "rank": rank,
+            "score": score,
+            "neighbors": _leaderboard_entries(neighbors, period)
         }
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to send message: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get leaderboard position: {str(e)}")
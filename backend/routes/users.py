@@ -1,9 +1,26 @@
+import base64
+import json
+import uuid
+from zoneinfo import ZoneInfo
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from supabase_client import supabase_admin
+from config import SEARCH_MAX_HITS
+from services.achievements import ACHIEVEMENTS, ACHIEVEMENTS_BY_ID
+from services.chat_senders import chat_sender_backfill
+from services.streaks import streak_tracker
+from services.user_index import user_index
+from services.xp_awards import award_xp
+from user_fields import resolve_user_fields, USER_SUMMARY_SELECT
+from xp_utils import fold_pending_xp
 
 router = APIRouter(prefix="/api/user", tags=["users"])
+directory_router = APIRouter(prefix="/api/users", tags=["users"])
+
+MAX_BULK_USERS = 500
+# ids per in_() filter; each goes in the query string, so keep the URL short
+LOOKUP_CHUNK_SIZE = 100
 
 class UpdateUserRequest(BaseModel):
     name: Optional[str] = None
@@ -11,19 +28,73 @@ class UpdateUserRequest(BaseModel):
     goals: Optional[list] = None
     activity_level: Optional[str] = None
     onboarding_completed: Optional[bool] = None
+    timezone: Optional[str] = None
+
+class BulkUsersRequest(BaseModel):
+    ids: List[str]
+
+def _encode_search_cursor(row: dict) -> str:
+    raw = json.dumps([row["rank"], (row.get("username") or "").lower(), row["id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_search_cursor(cursor: str) -> dict:
+    try:
+        rank, username, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {"after_rank": rank, "after_username": username, "after_id": last_id}
+
+@router.get("/search")
+async def search_users(q: str, cursor: Optional[str] = None, limit: int = 20):
+    try:
+        params = {"q": q, "page_size": max(1, min(limit, 100)), "max_hits": SEARCH_MAX_HITS}
+
+        if cursor:
+            params.update(_decode_search_cursor(cursor))
+
+        response = supabase_admin.rpc("search_users_ranked", params).execute()
+        users = response.data or []
+
+        next_cursor = None
+        if len(users) == params["page_size"]:
+            next_cursor = _encode_search_cursor(users[-1])
+
+        for user in users:
+            user.pop("rank", None)
+
+        return {"users": users, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+@router.get("/autocomplete")
+async def autocomplete_users(q: str, limit: int = 10):
+    try:
+        limit = max(1, min(limit, 25))
+
+        if not user_index.ready:
+            response = supabase_admin.rpc("search_users_ranked", {"q": q, "page_size": limit, "max_hits": SEARCH_MAX_HITS}).execute()
+            users = response.data or []
+            for user in users:
+                user.pop("rank", None)
+            return {"users": users}
+
+        return {"users": user_index.complete(q, limit)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Autocomplete failed: {str(e)}")
 
 @router.get("/{user_id}")
-async def get_user_data(user_id: str):
+async def get_user_data(user_id: str, fields: Optional[str] = None):
     try:
-        response = supabase_admin.table("users").select("*").eq("id", user_id).execute()
+        columns = resolve_user_fields(fields)
+        response = supabase_admin.table("users").select(columns).eq("id", user_id).execute()
 
         if not response.data:
             raise HTTPException(status_code=404, detail="User not found")
 
-        user = response.data[0]
-        user.pop("password_hash", None)
-
-        return user
+        return fold_pending_xp(response.data[0])
     except HTTPException:
         raise
     except Exception as e:
@@ -37,6 +108,12 @@ async def update_user_data(user_id: str, payload: UpdateUserRequest):
         if not update_data:
             raise HTTPException(status_code=400, detail="No data to update")
 
+        if "timezone" in update_data:
+            try:
+                ZoneInfo(update_data["timezone"])
+            except Exception:
+                raise HTTPException(status_code=400, detail="Unknown timezone")
+
         response = supabase_admin.table("users").update(update_data).eq("id", user_id).execute()
 
         if not response.data:
@@ -45,6 +122,12 @@ async def update_user_data(user_id: str, payload: UpdateUserRequest):
         user = response.data[0]
         user.pop("password_hash", None)
 
+        user_index.upsert(user)
+        if "name" in update_data or "avatar_url" in update_data:
+            chat_sender_backfill.enqueue(user_id)
+        if "timezone" in update_data:
+            streak_tracker.forget(user_id)
+
         return user
     except HTTPException:
         raise
@@ -54,46 +137,92 @@ async def update_user_data(user_id: str, payload: UpdateUserRequest):
 @router.post("/{user_id}/add-xp")
 async def add_xp(user_id: str, xp_amount: int):
     try:
-        response = supabase_admin.table("users").select("xp, level").eq("id", user_id).execute()
+        result = award_xp(user_id, xp_amount, source="manual")
 
-        if not response.data:
+        if result is None:
             raise HTTPException(status_code=404, detail="User not found")
 
-        user = response.data[0]
-        current_xp = user.get("xp", 0)
-        current_level = user.get("level", 1)
-
-        new_xp = current_xp + xp_amount
-        xp_for_next_level = current_level * 100
-
-        level_ups = 0
-        while new_xp >= xp_for_next_level:
-            current_level += 1
-            new_xp -= xp_for_next_level
-            xp_for_next_level = current_level * 100
-            level_ups += 1
-
-        update_response = supabase_admin.table("users").update({
-            "xp": new_xp,
-            "level": current_level
-        }).eq("id", user_id).execute()
-
-        return {
-            "xp": new_xp,
-            "level": current_level,
-            "leveled_up": level_ups > 0,
-            "level_ups": level_ups
-        }
+        return result
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add XP: {str(e)}")
 
-@router.get("/search")
-async def search_users(q: str):
+@router.get("/{user_id}/xp-events")
+async def get_xp_events(user_id: str, limit: int = 50, before_id: Optional[int] = None):
     try:
-        response = supabase_admin.table("users").select("id, name, username, avatar_url, level").or_(f"name.ilike.%{q}%,username.ilike.%{q}%").limit(20).execute()
+        query = supabase_admin.table("xp_events").select("id, amount, source, created_at, compacted_at").eq("user_id", user_id)
+
+        if before_id is not None:
+            query = query.lt("id", before_id)
 
-        return {"users": response.data}
+        response = query.order("id", desc=True).limit(max(1, min(limit, 200))).execute()
+
+        return {"events": response.data}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get XP events: {str(e)}")
+
+@router.get("/{user_id}/achievements")
+async def get_achievements(user_id: str):
+    try:
+        response = supabase_admin.table("user_achievements").select("achievement_id, awarded_at").eq("user_id", user_id).order("awarded_at", desc=True).execute()
+
+        unlocked = []
+        for row in response.data:
+            achievement = ACHIEVEMENTS_BY_ID.get(row["achievement_id"])
+            if achievement:
+                unlocked.append({
+                    "id": achievement.id,
+                    "name": achievement.name,
+                    "description": achievement.description,
+                    "xp": achievement.xp,
+                    "awarded_at": row["awarded_at"]
+                })
+
+        return {"achievements": unlocked, "total": len(ACHIEVEMENTS)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get achievements: {str(e)}")
+
+def _lookup_users(ids: List[str]) -> dict:
+    ids = list(dict.fromkeys(i for i in ids if i))
+
+    if len(ids) > MAX_BULK_USERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_USERS} ids per request")
+
+    if not ids:
+        return {"users": [], "missing": []}
+
+    try:
+        ids = [str(uuid.UUID(i)) for i in ids]
+    except (ValueError, AttributeError, TypeError):
+        raise HTTPException(status_code=400, detail="ids must be UUIDs")
+    ids = list(dict.fromkeys(ids))
+
+    by_id = {}
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        chunk = ids[start:start + LOOKUP_CHUNK_SIZE]
+        response = supabase_admin.table("users").select(USER_SUMMARY_SELECT).in_("id", chunk).execute()
+        by_id.update({u["id"]: fold_pending_xp(u) for u in response.data})
+
+    return {
+        "users": [by_id[i] for i in ids if i in by_id],
+        "missing": [i for i in ids if i not in by_id]
+    }
+
+@directory_router.get("")
+async def get_users_bulk(ids: str):
+    try:
+        return _lookup_users([i.strip() for i in ids.split(",")])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get users: {str(e)}")
+
+@directory_router.post("/lookup")
+async def lookup_users_bulk(req: BulkUsersRequest):
+    try:
+        return _lookup_users(req.ids)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get users: {str(e)}")
@@ -1,5 +1,8 @@
 # NOTE: All backend routes are prefixed with /api via APIRouter to comply with ingress
+import base64
+import json
 import os
+import re
 import uuid
 from datetime import datetime
 from typing import Optional, List
@@ -9,6 +12,7 @@ from fastapi.responses import Response
 from pydantic import BaseModel, Field
 from bson.binary import Binary
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -43,6 +47,12 @@ def serialize_doc(doc: dict) -> dict:
             out[k] = v
     return out
 
+def search_terms(username: Optional[str], name: Optional[str]) -> List[str]:
+    # Lowercased username and name words, indexed so user search is an anchored prefix scan
+    terms = {(username or "").lower(), *(name or "").lower().split()}
+    terms.discard("")
+    return sorted(terms)
+
 # ----------------------------- Auth (minimal) -----------------------------
 
 class RegisterRequest(BaseModel):
@@ -59,6 +69,7 @@ async def register_user(payload: RegisterRequest):
         "name": payload.name,
         "email": payload.email,
         "username": username,
+        "search_terms": search_terms(username, payload.name),
         "created_at": datetime.utcnow(),
         "level": 1,
         "xp": 0,
@@ -84,6 +95,7 @@ async def login_user(payload: LoginRequest):
             "name": username,
             "email": payload.email,
             "username": username,
+            "search_terms": search_terms(username, username),
             "created_at": datetime.utcnow(),
             "level": 1,
             "xp": 0,
@@ -250,19 +262,18 @@ async def create_post(req: CreatePostRequest):
 
 @api_router.post("/social/like")
 async def like_post(req: LikePostRequest):
-    post = await db.posts.find_one({"id": req.post_id})
+    post = await db.posts.find_one({"id": req.post_id}, {"likes_by": 1})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    likes_by = post.get("likes_by", [])
-    liked = req.user_id in likes_by
-    if liked:
-        likes_by.remove(req.user_id)
-        new_likes = max(0, post.get("likes", 0) - 1)
+    # Single atomic update; the filter makes a concurrent double toggle a no-op
+    if req.user_id in post.get("likes_by", []):
+        query = {"id": req.post_id, "likes_by": req.user_id}
+        update = {"$pull": {"likes_by": req.user_id}, "$inc": {"likes": -1}}
     else:
-        likes_by.append(req.user_id)
-        new_likes = post.get("likes", 0) + 1
-    await db.posts.update_one({"id": req.post_id}, {"$set": {"likes_by": likes_by, "likes": new_likes}})
-    return {"liked": not liked, "likes": new_likes}
+        query = {"id": req.post_id, "likes_by": {"$ne": req.user_id}}
+        update = {"$addToSet": {"likes_by": req.user_id}, "$inc": {"likes": 1}}
+    post = await db.posts.find_one_and_update(query, update, return_document=ReturnDocument.AFTER) or await db.posts.find_one({"id": req.post_id})
+    return {"liked": req.user_id in post.get("likes_by", []), "likes": max(0, post.get("likes", 0))}
 
 @api_router.post("/social/comment")
 async def comment_post(req: CommentPostRequest):
@@ -280,12 +291,10 @@ async def comment_post(req: CommentPostRequest):
 
 @api_router.post("/social/share")
 async def share_post(req: SharePostRequest):
-    post = await db.posts.find_one({"id": req.post_id})
+    post = await db.posts.find_one_and_update({"id": req.post_id}, {"$inc": {"share_count": 1}}, return_document=ReturnDocument.AFTER)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    new_count = post.get("share_count", 0) + 1
-    await db.posts.update_one({"id": req.post_id}, {"$set": {"share_count": new_count}})
-    return {"share_count": new_count}
+    return {"share_count": post["share_count"]}
 
 # ----------------------------- Social: Chat Rooms -----------------------------
 
@@ -396,15 +405,27 @@ async def chat_room_members(room_id: str):
     return {"members": members}
 
 @api_router.get("/chat-room/{room_id}/messages")
-async def chat_room_messages(room_id: str, user_id: Optional[str] = None):
-    msgs = await db.chat_room_messages.find({"room_id": room_id}).sort("timestamp", 1).to_list(200)
+async def chat_room_messages(room_id: str, user_id: Optional[str] = None, before: Optional[str] = None, limit: int = 50):
+    limit = max(1, min(limit, 200))
+    query = {"room_id": room_id}
+    if before:
+        ts, _, last_id = before.rpartition(",")
+        try:
+            ts = datetime.fromisoformat(ts)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query["$or"] = [{"timestamp": {"$lt": ts}}, {"timestamp": ts, "id": {"$lt": last_id}}]
+
+    # Newest first from the (room_id, timestamp, id) index; the page is returned oldest first
+    msgs = await db.chat_room_messages.find(query).sort([("timestamp", -1), ("id", -1)]).to_list(limit)
+    next_before = f"{msgs[-1]['timestamp'].isoformat()},{msgs[-1]['id']}" if len(msgs) == limit else None
     out = []
-    for m in msgs:
+    for m in reversed(msgs):
         m.pop("_id", None)
         if isinstance(m.get("timestamp"), datetime):
             m["timestamp"] = m["timestamp"].isoformat()
         out.append(m)
-    return {"messages": out}
+    return {"messages": out, "next_before": next_before}
 
 @api_router.post("/chat-room/message")
 async def post_chat_room_message(data: dict):
@@ -438,8 +459,16 @@ class UserPublic(BaseModel):
 
 @api_router.get("/users/search")
 async def search_users(q: str):
-    regex = {"$regex": q, "$options": "i"}
-    users = await db.users.find({"$or": [{"name": regex}, {"username": regex}]}, {"password_hash": 0}).limit(20).to_list(20)
+    term = q.strip().lower()
+    if not term:
+        return {"users": []}
+    # Exact terms first, then prefixes; both are anchored, case-normalized
+    # lookups on the search_terms index, so cost does not grow with the table
+    users = await db.users.find({"search_terms": term}, {"password_hash": 0}).limit(20).to_list(20)
+    if len(users) < 20:
+        prefix = {"$regex": f"^{re.escape(term)}"}
+        seen = [u.get("id") for u in users]
+        users += await db.users.find({"search_terms": prefix, "id": {"$nin": seen}}, {"password_hash": 0}).limit(20 - len(users)).to_list(20 - len(users))
     result = []
     for u in users:
         u.pop("_id", None)
@@ -461,6 +490,59 @@ async def get_user_scans(user_id: str, scan_type: Optional[str] = None):
     scans = await db.scans.find(query).sort("timestamp", -1).to_list(200)
     return [serialize_doc(s) for s in scans]
 
+# ----------------------------- Full-Text Search -----------------------------
+
+def _encode_rank_cursor(doc: dict) -> str:
+    raw = json.dumps([doc["score"], doc["id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+async def _text_search(collection, match: dict, cursor: Optional[str], limit: int) -> tuple:
+    limit = max(1, min(limit, 100))
+    pipeline = [{"$match": match}, {"$addFields": {"score": {"$meta": "textScore"}}}]
+    if cursor:
+        try:
+            score, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        pipeline.append({"$match": {"$or": [{"score": {"$lt": score}}, {"score": score, "id": {"$gt": last_id}}]}})
+    pipeline += [{"$sort": {"score": -1, "id": 1}}, {"$limit": limit}, {"$project": {"_id": 0}}]
+    docs = await collection.aggregate(pipeline).to_list(limit)
+    next_cursor = _encode_rank_cursor(docs[-1]) if len(docs) == limit else None
+    return [serialize_doc(d) for d in docs], next_cursor
+
+@api_router.get("/social/search")
+async def search_posts(q: str, cursor: Optional[str] = None, limit: int = 20):
+    posts, next_cursor = await _text_search(db.posts, {"$text": {"$search": q}}, cursor, limit)
+    return {"posts": posts, "next_cursor": next_cursor}
+
+@api_router.get("/chat-room/{room_id}/search")
+async def search_chat_room_messages(room_id: str, q: str, user_id: str, cursor: Optional[str] = None, limit: int = 20):
+    # Private rooms are only searchable by their members; others get the same 404 as a missing room
+    room = await db.chat_rooms.find_one({"id": room_id}, {"type": 1, "members": 1})
+    if not room or (room.get("type", "public") != "public" and user_id not in room.get("members", [])):
+        raise HTTPException(status_code=404, detail="Room not found")
+    messages, next_cursor = await _text_search(db.chat_room_messages, {"room_id": room_id, "$text": {"$search": q}}, cursor, limit)
+    return {"messages": messages, "next_cursor": next_cursor}
+
+@app.on_event("startup")
+async def ensure_user_search_terms():
+    # Users stored before search_terms existed get them computed in place
+    await db.users.update_many({"search_terms": {"$exists": False}}, [{"$set": {"search_terms": {"$setDifference": [
+        {"$setUnion": [[{"$toLower": {"$ifNull": ["$username", ""]}}], {"$split": [{"$toLower": {"$ifNull": ["$name", ""]}}, " "]}]},
+        [""]
+    ]}}}])
+    await db.users.create_index([("search_terms", 1)], name="users_search_terms_idx")
+
+@app.on_event("startup")
+async def ensure_search_indexes():
+    # The room_id prefix keeps chat search inside one room's index entries
+    await db.posts.create_index([("content", "text")], name="posts_text_idx")
+    await db.chat_room_messages.create_index([("room_id", 1), ("message", "text")], name="chat_room_messages_text_idx")
+
+@app.on_event("startup")
+async def ensure_chat_indexes():
+    await db.chat_room_messages.create_index([("room_id", 1), ("timestamp", -1), ("id", -1)], name="chat_room_messages_history_idx")
+
 app.include_router(api_router)
 
 @api_router.get("/")
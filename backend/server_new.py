@@ -1,6 +1,29 @@
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes import auth, users, scanners, social, notifications, payments
+from config import LEADERBOARD_RECONCILE_SECONDS, XP_WINDOW_RECONCILE_SECONDS, STREAK_RESET_SECONDS, XP_COMPACT_SECONDS, HOME_TIMELINE_TRIM_SECONDS, FEED_CACHE_REFRESH_SECONDS, HOT_FEED_REDECAY_SECONDS, HOT_FEED_RELOAD_SECONDS, HOT_POST_REBALANCE_SECONDS, FEED_CHANGES_PRUNE_SECONDS, TRENDING_RELOAD_SECONDS, USER_INDEX_RELOAD_SECONDS
+from services.events import subscribe, dispatch_events, ACTIVITY_EVENTS
+from services.achievements import achievement_engine
+from services.bus import bus
+from services.chat_gateway import chat_gateway, chat_writer
+from services.chat_senders import chat_sender_backfill
+from services.fanout import fanout_worker
+from services.feed_cache import feed_cache
+from services.feed_changes import prune_feed_changes
+from services.hot_feed import hot_feed
+from services.leaderboard import leaderboard
+from services.post_counters import post_counters
+from services.post_shards import post_shards
+from services.stream import stream_hub
+from services.streaks import streak_tracker
+from services.trending import trending
+from services.user_index import user_index
+from services.xp_awards import compact_xp_events
+from services.xp_windows import xp_windows
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="LevelUp API")
 
@@ -14,11 +37,51 @@ app.add_middleware(
 
 app.include_router(auth.router)
 app.include_router(users.router)
+app.include_router(users.directory_router)
 app.include_router(scanners.router)
 app.include_router(social.router)
 app.include_router(notifications.router)
 app.include_router(payments.router)
 
+subscribe(ACTIVITY_EVENTS, streak_tracker.on_activity)
+subscribe(achievement_engine.event_types, achievement_engine.on_event)
+bus.subscribe("stream", stream_hub.deliver)
+bus.subscribe("stream", trending.on_stream)
+bus.subscribe("chat", chat_gateway.deliver)
+bus.subscribe("users", user_index.deliver)
+
+@app.on_event("startup")
+async def start_background_jobs():
+    stream_hub.start()
+    asyncio.create_task(run_periodically(leaderboard.reconcile, LEADERBOARD_RECONCILE_SECONDS))
+    asyncio.create_task(run_periodically(xp_windows.reconcile, XP_WINDOW_RECONCILE_SECONDS))
+    asyncio.create_task(run_periodically(streak_tracker.reset_broken, STREAK_RESET_SECONDS))
+    asyncio.create_task(run_periodically(compact_xp_events, XP_COMPACT_SECONDS))
+    asyncio.create_task(run_periodically(fanout_worker.trim, HOME_TIMELINE_TRIM_SECONDS))
+    asyncio.create_task(fanout_worker.run())
+    asyncio.create_task(post_counters.run())
+    asyncio.create_task(chat_writer.run())
+    asyncio.create_task(achievement_engine.run())
+    asyncio.create_task(dispatch_events())
+    asyncio.create_task(chat_sender_backfill.run())
+    asyncio.create_task(bus.run())
+    asyncio.create_task(run_periodically(post_shards.rebalance, HOT_POST_REBALANCE_SECONDS))
+    asyncio.create_task(run_periodically(feed_cache.load, FEED_CACHE_REFRESH_SECONDS))
+    asyncio.create_task(run_periodically(prune_feed_changes, FEED_CHANGES_PRUNE_SECONDS))
+    asyncio.create_task(run_periodically(hot_feed.reconcile, HOT_FEED_RELOAD_SECONDS))
+    asyncio.create_task(run_periodically(hot_feed.redecay, HOT_FEED_REDECAY_SECONDS))
+    asyncio.create_task(run_periodically(trending.load, TRENDING_RELOAD_SECONDS))
+    asyncio.create_task(run_periodically(user_index.load, USER_INDEX_RELOAD_SECONDS))
+
+async def run_periodically(job, interval: int):
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, job)
+        except Exception:
+            logger.exception("Background job %s failed", job.__qualname__)
+        await asyncio.sleep(interval)
+
 @app.get("/")
 async def root():
     return {"message": "LevelUp API is running", "version": "2.0"}
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Callable, NamedTuple, Tuple
+from supabase_client import supabase_admin
+from config import ACHIEVEMENT_AUTO_POST, ACHIEVEMENT_FLUSH_MS, ACHIEVEMENT_FLUSH_EVENTS
+from services.events import SCAN_COMPLETED, POST_CREATED, COMMENT_CREATED, MESSAGE_SENT, LEVEL_UP, STREAK_UPDATED
+from services.fanout import fanout_worker
+from services.feed_cache import feed_cache, feed_entry
+from services.hot_feed import hot_feed
+from services.stream import stream_hub
+from services.user_index import get_user_summaries
+from services.xp_awards import award_xp
+
+# Achievement rules are indexed by the event type they depend on, so an event
+# only evaluates its own rules. Events are buffered and evaluated in batches
+# off the request path: the counters a batch touches are bumped in one round
+# trip, and a counter rule fires when its counter crosses the threshold
+# within the batch. The primary key on user_achievements makes a repeat award
+# a no-op.
+
+logger = logging.getLogger(__name__)
+
+
+class Achievement(NamedTuple):
+    id: str
+    name: str
+    description: str
+    xp: int
+    event_type: str
+    counters: Tuple[str, ...]
+    check: Callable[[dict, dict], bool]
+
+
+def counter_reached(counter: str, threshold: int):
+    # counters maps a counter name to its (before, after) values for the batch
+    def check(counters: dict, payload: dict) -> bool:
+        before, after = counters.get(counter.format(**payload), (0, 0))
+        return before < threshold <= after
+    return check
+
+
+def level_reached(level: int):
+    def check(counters: dict, payload: dict) -> bool:
+        return payload["previous_level"] < level <= payload["level"]
+    return check
+
+
+def streak_reached(days: int):
+    def check(counters: dict, payload: dict) -> bool:
+        return payload["streak_days"] == days
+    return check
+
+
+ACHIEVEMENTS = [
+    Achievement("first_scan", "First Scan", "Completed a first scan", 10, SCAN_COMPLETED, ("scans",), counter_reached("scans", 1)),
+    Achievement("scan_regular", "Scan Regular", "Completed 25 scans", 50, SCAN_COMPLETED, ("scans",), counter_reached("scans", 25)),
+    Achievement("body_tracker", "Body Tracker", "Completed 10 body scans", 30, SCAN_COMPLETED, ("scans:{scan_type}",), counter_reached("scans:body", 10)),
+    Achievement("glow_getter", "Glow Getter", "Completed 10 face scans", 30, SCAN_COMPLETED, ("scans:{scan_type}",), counter_reached("scans:face", 10)),
+    Achievement("meal_logger", "Meal Logger", "Completed 10 food scans", 30, SCAN_COMPLETED, ("scans:{scan_type}",), counter_reached("scans:food", 10)),
+    Achievement("first_post", "Hello World", "Shared a first post", 10, POST_CREATED, ("posts",), counter_reached("posts", 1)),
+    Achievement("storyteller", "Storyteller", "Shared 50 posts", 50, POST_CREATED, ("posts",), counter_reached("posts", 50)),
+    Achievement("first_comment", "Conversation Starter", "Left a first comment", 5, COMMENT_CREATED, ("comments",), counter_reached("comments", 1)),
+    Achievement("chatterbox", "Chatterbox", "Sent 100 chat messages", 25, MESSAGE_SENT, ("messages",), counter_reached("messages", 100)),
+    Achievement("level_5", "Rising Star", "Reached level 5", 0, LEVEL_UP, (), level_reached(5)),
+    Achievement("level_10", "Level Up Legend", "Reached level 10", 0, LEVEL_UP, (), level_reached(10)),
+    Achievement("streak_7", "On Fire", "Stayed active 7 days in a row", 40, STREAK_UPDATED, (), streak_reached(7)),
+    Achievement("streak_30", "Unstoppable", "Stayed active 30 days in a row", 150, STREAK_UPDATED, (), streak_reached(30))
+]
+
+ACHIEVEMENTS_BY_ID = {a.id: a for a in ACHIEVEMENTS}
+
+
+class AchievementEngine:
+    def __init__(self, achievements: list, auto_post: bool):
+        self._auto_post = auto_post
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._wake = None
+        self._loop = None
+        self._rules = defaultdict(list)
+        self._counters = defaultdict(set)
+        for achievement in achievements:
+            self._rules[achievement.event_type].append(achievement)
+            self._counters[achievement.event_type].update(achievement.counters)
+
+    @property
+    def event_types(self) -> list:
+        return list(self._rules)
+
+    def on_event(self, event_type: str, user_id: str, payload: dict):
+        if event_type not in self._rules:
+            return
+
+        with self._lock:
+            self._buffer.append((event_type, user_id, payload))
+            full = len(self._buffer) >= ACHIEVEMENT_FLUSH_EVENTS
+        if self._wake is None:
+            self.flush()
+        elif full:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def flush(self):
+        with self._lock:
+            events, self._buffer = self._buffer, []
+        if not events:
+            return
+
+        bumps = Counter()
+        for event_type, user_id, payload in events:
+            for counter in self._counters[event_type]:
+                bumps[(user_id, counter.format(**payload))] += 1
+
+        # Counter bumps are not idempotent, so a failed batch is dropped rather
+        # than retried
+        counters = defaultdict(dict)
+        if bumps:
+            keys = list(bumps)
+            response = supabase_admin.rpc("bump_user_counters", {
+                "p_user_ids": [user_id for user_id, _ in keys],
+                "p_counters": [counter for _, counter in keys],
+                "p_deltas": [bumps[key] for key in keys]
+            }).execute()
+            for row in response.data:
+                after = row["value"]
+                counters[row["user_id"]][row["counter"]] = (after - bumps[(row["user_id"], row["counter"])], after)
+
+        evaluated = set()
+        for event_type, user_id, payload in events:
+            for achievement in self._rules[event_type]:
+                if achievement.counters:
+                    # Counter rules depend only on the batch totals
+                    if (user_id, achievement.id) in evaluated:
+                        continue
+                    evaluated.add((user_id, achievement.id))
+                if achievement.check(counters[user_id], payload):
+                    self._award(user_id, achievement)
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), ACHIEVEMENT_FLUSH_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._loop.run_in_executor(None, self.flush)
+            except Exception:
+                logger.exception("Achievement flush failed")
+
+    def _award(self, user_id: str, achievement: Achievement):
+        response = supabase_admin.table("user_achievements").upsert({
+            "user_id": user_id,
+            "achievement_id": achievement.id
+        }, on_conflict="user_id,achievement_id", ignore_duplicates=True).execute()
+
+        if not response.data:
+            return
+
+        if achievement.xp:
+            award_xp(user_id, achievement.xp, source=f"achievement:{achievement.id}")
+
+        if self._auto_post:
+            response = supabase_admin.table("posts").insert({
+                "user_id": user_id,
+                "content": f"Unlocked {achievement.name}: {achievement.description}!",
+                "type": "achievement",
+                "xp_earned": achievement.xp or None
+            }).execute()
+            if response.data:
+                post = response.data[0]
+                fanout_worker.enqueue(post["id"])
+                entry = feed_entry(post, get_user_summaries([user_id]).get(user_id, {}))
+                feed_cache.add_post(entry)
+                stream_hub.publish("post", f"post:{post['id']}", {**entry, "isLiked": False})
+                hot_feed.add_post(post["id"], post["timestamp"])
+
+
+achievement_engine = AchievementEngine(ACHIEVEMENTS, ACHIEVEMENT_AUTO_POST)
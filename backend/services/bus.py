@@ -0,0 +1,286 @@
+import asyncio
+import fcntl
+import itertools
+import json
+import logging
+import os
+import uuid
+from collections import defaultdict, OrderedDict
+from typing import Optional
+from config import BUS_BACKEND, BUS_SOCKET_PATH, BUS_DATABASE_URL, BUS_CHANNEL, BUS_QUEUE_SIZE, BUS_HEALTH_CHECK_SECONDS
+
+# Cross-worker broadcast for realtime events. publish() delivers to this
+# worker's handlers right away and queues the event for the backend; events
+# queued in the same loop iteration go out as one batch, and events that
+# share a key (e.g. the like count of one post) are coalesced to the latest.
+# Remote batches are delivered to local handlers, skipping our own.
+#
+# Backends:
+#   unix      single host; the worker holding the lock file runs the broker
+#             and relays each batch to the others (one extra hop)
+#   postgres  LISTEN/NOTIFY on BUS_CHANNEL (needs asyncpg); reconnects when
+#             either connection closes or fails a health check, and
+#             notifications sent while disconnected are missed. An event too
+#             big for a notification is written to bus_payloads and only its
+#             id is notified; receivers read it back in order
+#   local     no cross-worker delivery
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_PAYLOAD_LIMIT = 7900
+MAX_PEER_BUFFER = 4 * 1024 * 1024
+
+# Stores one oversized batch and prunes ones every receiver has long since read
+SPILL_PAYLOAD_SQL = (
+    "WITH pruned AS (DELETE FROM bus_payloads WHERE created_at < now() - interval '5 minutes') "
+    "INSERT INTO bus_payloads (payload) VALUES ($1) RETURNING id"
+)
+
+
+class UnixSocketBackend:
+    def __init__(self, path: str):
+        self._path = path
+        self._peers = set()
+        self._writer = None
+        self._broker = False
+        self._on_message = None
+
+    def send(self, message: dict):
+        line = (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+        if self._broker:
+            self._relay(line, None)
+        elif self._writer is not None:
+            self._writer.write(line)
+
+    def _relay(self, line: bytes, source):
+        for peer in list(self._peers):
+            if peer is source:
+                continue
+            if peer.transport.get_write_buffer_size() > MAX_PEER_BUFFER:
+                logger.warning("Dropping slow bus peer")
+                self._peers.discard(peer)
+                peer.close()
+                continue
+            peer.write(line)
+
+    async def _serve_peer(self, reader, writer):
+        self._peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._relay(line, writer)
+                self._on_message(json.loads(line))
+        except Exception:
+            logger.exception("Bus peer failed")
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _run_broker(self):
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+        server = await asyncio.start_unix_server(self._serve_peer, path=self._path)
+        self._broker = True
+        try:
+            await server.serve_forever()
+        finally:
+            self._broker = False
+            server.close()
+
+    async def _run_client(self):
+        reader, writer = await asyncio.open_unix_connection(self._path)
+        self._writer = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                self._on_message(json.loads(line))
+        finally:
+            self._writer = None
+            writer.close()
+
+    async def run(self, on_message):
+        self._on_message = on_message
+        lock = open(self._path + ".lock", "a")
+        while True:
+            try:
+                # The lock outlives a crashed broker only as long as its process
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                await self._run_broker()
+            except BlockingIOError:
+                try:
+                    await self._run_client()
+                except (ConnectionRefusedError, FileNotFoundError):
+                    pass
+                except Exception:
+                    logger.exception("Bus connection failed")
+            except Exception:
+                logger.exception("Bus broker failed")
+            await asyncio.sleep(1)
+
+
+class PostgresBackend:
+    def __init__(self, dsn: str, channel: str):
+        self._dsn = dsn
+        self._channel = channel
+        self._queue = asyncio.Queue(maxsize=BUS_QUEUE_SIZE)
+
+    def send(self, message: dict):
+        # NOTIFY payloads are capped at 8000 bytes, so big batches go out in parts
+        chunk = []
+        size = 0
+        for event in message["events"]:
+            event_size = len(json.dumps(event, separators=(",", ":")))
+            if chunk and size + event_size > NOTIFY_PAYLOAD_LIMIT - 100:
+                self._put(message["origin"], chunk)
+                chunk = []
+                size = 0
+            chunk.append(event)
+            size += event_size + 1
+        if chunk:
+            self._put(message["origin"], chunk)
+
+    def _put(self, origin: str, events: list):
+        try:
+            self._queue.put_nowait((origin, json.dumps({"origin": origin, "events": events}, separators=(",", ":"))))
+        except asyncio.QueueFull:
+            logger.warning("Bus queue full, dropping batch")
+
+    async def _send_loop(self, connection):
+        while True:
+            origin, payload = await self._queue.get()
+            if len(payload) > NOTIFY_PAYLOAD_LIMIT:
+                # A single event over the limit: notify a reference to the stored batch
+                ref = await connection.fetchval(SPILL_PAYLOAD_SQL, payload)
+                payload = json.dumps({"origin": origin, "ref": ref}, separators=(",", ":"))
+            await connection.execute("SELECT pg_notify($1, $2)", self._channel, payload)
+
+    async def _receive_loop(self, connection, inbox: asyncio.Queue, on_message):
+        while True:
+            try:
+                payload = await asyncio.wait_for(inbox.get(), BUS_HEALTH_CHECK_SECONDS)
+            except asyncio.TimeoutError:
+                # An idle LISTEN connection that dropped is only noticed when used
+                await connection.execute("SELECT 1", timeout=BUS_HEALTH_CHECK_SECONDS)
+                continue
+            message = json.loads(payload)
+            if "ref" in message:
+                stored = await connection.fetchval("SELECT payload FROM bus_payloads WHERE id = $1", message["ref"])
+                if stored is None:
+                    logger.warning("Bus payload %s was pruned before it was read", message["ref"])
+                    continue
+                message = json.loads(stored)
+            on_message(message)
+
+    async def run(self, on_message):
+        import asyncpg
+
+        while True:
+            listen = notify = None
+            lost = asyncio.Event()
+            inbox = asyncio.Queue()
+            tasks = []
+            try:
+                listen = await asyncpg.connect(self._dsn)
+                notify = await asyncpg.connect(self._dsn)
+                listen.add_termination_listener(lambda connection: lost.set())
+                notify.add_termination_listener(lambda connection: lost.set())
+                # Notifications are handled one at a time so a stored payload
+                # that has to be read back is not overtaken by later ones
+                await listen.add_listener(self._channel, lambda connection, pid, channel, payload: inbox.put_nowait(payload))
+                tasks = [
+                    asyncio.create_task(self._send_loop(notify)),
+                    asyncio.create_task(self._receive_loop(listen, inbox, on_message)),
+                    asyncio.create_task(lost.wait())
+                ]
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+                logger.warning("Postgres bus connection closed, reconnecting")
+            except Exception:
+                logger.exception("Postgres bus connection failed")
+            finally:
+                for task in tasks:
+                    task.cancel()
+                for connection in (listen, notify):
+                    if connection is not None and not connection.is_closed():
+                        connection.terminate()
+            await asyncio.sleep(1)
+
+
+def _backend():
+    if BUS_BACKEND == "unix":
+        return UnixSocketBackend(BUS_SOCKET_PATH)
+    if BUS_BACKEND == "postgres":
+        return PostgresBackend(BUS_DATABASE_URL, BUS_CHANNEL)
+    return None
+
+
+class Bus:
+    def __init__(self, backend):
+        self._backend = backend
+        self._origin = uuid.uuid4().hex
+        self._handlers = defaultdict(list)
+        self._outbox = OrderedDict()
+        self._unique = itertools.count()
+        self._loop = None
+        self._flush_scheduled = False
+
+    def subscribe(self, channel: str, handler):
+        self._handlers[channel].append(handler)
+
+    def publish(self, channel: str, payload: dict, key: Optional[str] = None):
+        if self._loop is None:
+            self._deliver(channel, payload)
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._enqueue(channel, payload, key)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, channel, payload, key)
+
+    def _enqueue(self, channel: str, payload: dict, key: Optional[str]):
+        self._deliver(channel, payload)
+        if self._backend is None:
+            return
+
+        slot = (channel, key if key is not None else next(self._unique))
+        self._outbox.pop(slot, None)
+        self._outbox[slot] = [channel, payload]
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._loop.call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        events = list(self._outbox.values())
+        self._outbox.clear()
+        if events:
+            self._backend.send({"origin": self._origin, "events": events})
+
+    def _receive(self, message: dict):
+        if message.get("origin") == self._origin:
+            return
+        for channel, payload in message["events"]:
+            self._deliver(channel, payload)
+
+    def _deliver(self, channel: str, payload: dict):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("Bus handler for %s failed", channel)
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        if self._backend is not None:
+            await self._backend.run(self._receive)
+
+
+bus = Bus(_backend())
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from supabase_client import supabase_admin
+from config import CHAT_SEND_QUEUE_SIZE, CHAT_FLUSH_MS, CHAT_FLUSH_SIZE
+from services.events import emit, MESSAGE_SENT
+from services.bus import bus
+
+# WebSocket chat fan-out. Each connection has a bounded send queue drained by
+# its own sender task; broadcasting to a room is a put_nowait per subscriber,
+# and a subscriber whose queue is full is evicted instead of slowing the room
+# down. Broadcasts go through the bus so members connected to other workers
+# get them too. Messages are broadcast as soon as they are accepted and
+# persisted by ChatWriter in batches of one insert each; the
+# chat_messages_bump_room trigger updates each room once per insert. If a batch
+# fails it is retried row by row: rows the database rejects are logged and
+# dropped (the room gets a message_failed frame), and on any other error the
+# remaining rows are requeued.
+
+logger = logging.getLogger(__name__)
+
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
+
+class ChatConnection:
+    def __init__(self, websocket, user: dict):
+        self.websocket = websocket
+        self.user = user
+        self.rooms = set()
+        self.queue = asyncio.Queue(maxsize=CHAT_SEND_QUEUE_SIZE)
+        self.sender = None
+
+    async def send_loop(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                await self.websocket.send_text(frame)
+        except Exception:
+            # The receive loop sees the same disconnect and cleans up
+            pass
+
+
+class ChatGateway:
+    def __init__(self):
+        self._rooms = defaultdict(set)
+
+    def connect(self, connection: ChatConnection):
+        connection.sender = asyncio.create_task(connection.send_loop())
+
+    def disconnect(self, connection: ChatConnection):
+        for room_id in connection.rooms:
+            members = self._rooms.get(room_id)
+            if members is not None:
+                members.discard(connection)
+                if not members:
+                    del self._rooms[room_id]
+        connection.rooms.clear()
+        if connection.sender is not None:
+            connection.sender.cancel()
+
+    def join(self, connection: ChatConnection, room_id: str):
+        self._rooms[room_id].add(connection)
+        connection.rooms.add(room_id)
+
+    def leave(self, connection: ChatConnection, room_id: str):
+        connection.rooms.discard(room_id)
+        members = self._rooms.get(room_id)
+        if members is not None:
+            members.discard(connection)
+            if not members:
+                del self._rooms[room_id]
+
+    def send(self, connection: ChatConnection, payload: dict):
+        self._offer(connection, json.dumps(payload, separators=(",", ":")))
+
+    def broadcast(self, room_id: str, payload: dict):
+        bus.publish("chat", {"room_id": room_id, "payload": payload})
+
+    def deliver(self, message: dict):
+        room_id = message["room_id"]
+        if room_id not in self._rooms:
+            return
+        frame = json.dumps(message["payload"], separators=(",", ":"))
+        for connection in list(self._rooms[room_id]):
+            self._offer(connection, frame)
+
+    def _offer(self, connection: ChatConnection, frame: str):
+        try:
+            connection.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.disconnect(connection)
+            asyncio.create_task(self._evict(connection))
+
+    async def _evict(self, connection: ChatConnection):
+        try:
+            await connection.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+
+
+def _rejected(error: Exception) -> bool:
+    # Data and integrity errors (SQLSTATE classes 22 and 23) fail the same way on retry
+    code = getattr(error, "code", None)
+    return isinstance(code, str) and code[:2] in ("22", "23")
+
+
+class ChatWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._wake = None
+        self._loop = None
+
+    def enqueue(self, row: dict):
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= CHAT_FLUSH_SIZE
+        if full and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return
+
+        try:
+            supabase_admin.table("chat_messages").insert(rows).execute()
+        except Exception:
+            # Find the rows the database rejects so they cannot block the rest
+            rows = self._insert_each(rows)
+
+        for row in rows:
+            emit(MESSAGE_SENT, row["user_id"], room_id=row["room_id"], message_id=row["id"])
+
+    def _insert_each(self, rows: list) -> list:
+        saved = []
+        for i, row in enumerate(rows):
+            try:
+                supabase_admin.table("chat_messages").insert(row).execute()
+            except Exception as e:
+                if not _rejected(e):
+                    # Not the row's fault (e.g. the database is unreachable): retry the rest later
+                    with self._lock:
+                        self._buffer[:0] = rows[i:]
+                    for done in saved:
+                        emit(MESSAGE_SENT, done["user_id"], room_id=done["room_id"], message_id=done["id"])
+                    raise
+                logger.error("Dropping chat message %s: %s %s", row["id"], e, json.dumps(row))
+                # It was broadcast when accepted; tell the room it was not kept
+                chat_gateway.broadcast(row["room_id"], {"type": "message_failed", "room_id": row["room_id"], "id": row["id"]})
+                continue
+            saved.append(row)
+        return saved
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), CHAT_FLUSH_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._loop.run_in_executor(None, self.flush)
+            except Exception:
+                logger.exception("Chat message flush failed")
+
+
+chat_gateway = ChatGateway()
+chat_writer = ChatWriter()
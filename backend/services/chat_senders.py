@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from supabase_client import supabase_admin
+from config import CHAT_SENDER_BACKFILL_BATCH
+
+# Chat messages carry a {name, avatar} snapshot of their sender so history is
+# one query. Writers leave the snapshot out and the
+# chat_messages_default_sender trigger fills it at insert time. When a
+# profile's name or avatar changes, the user id is queued here and the worker
+# pages through that user's messages by id, rewriting stale snapshots;
+# history shows the old name until the page reaches it.
+
+logger = logging.getLogger(__name__)
+
+
+def sender_snapshot(user: dict) -> dict:
+    return {"name": user.get("name") or "User", "avatar": user.get("avatar_url")}
+
+
+class ChatSenderBackfill:
+    def __init__(self):
+        self._queue = None
+        self._pending = set()
+
+    def enqueue(self, user_id: str):
+        if self._queue is None:
+            self.backfill(user_id)
+            return
+        if user_id not in self._pending:
+            self._pending.add(user_id)
+            self._queue.put_nowait(user_id)
+
+    def backfill(self, user_id: str):
+        after = None
+        while True:
+            after = supabase_admin.rpc("refresh_chat_senders", {
+                "p_user_id": user_id,
+                "p_after_id": after,
+                "p_batch": CHAT_SENDER_BACKFILL_BATCH
+            }).execute().data
+            if not after:
+                return
+
+    async def run(self):
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        while True:
+            user_id = await self._queue.get()
+            # A change made while this runs queues the user again
+            self._pending.discard(user_id)
+            try:
+                await loop.run_in_executor(None, self.backfill, user_id)
+            except Exception:
+                logger.exception("Chat sender backfill failed for user %s", user_id)
+
+
+chat_sender_backfill = ChatSenderBackfill()
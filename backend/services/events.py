@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import threading
+from collections import defaultdict, deque
+
+# In-process activity events. Routes emit; services such as streak tracking
+# subscribe at startup. Once dispatch_events is running, emit only queues the
+# event and handlers run on a worker thread, so no handler's round trips land
+# on the request (or chat send) path. A failing handler is logged and never
+# affects the code that emitted the event.
+
+SCAN_COMPLETED = "scan_completed"
+POST_CREATED = "post_created"
+COMMENT_CREATED = "comment_created"
+MESSAGE_SENT = "message_sent"
+LEVEL_UP = "level_up"
+STREAK_UPDATED = "streak_updated"
+
+ACTIVITY_EVENTS = (SCAN_COMPLETED, POST_CREATED, COMMENT_CREATED, MESSAGE_SENT)
+
+logger = logging.getLogger(__name__)
+
+_handlers = defaultdict(list)
+_lock = threading.Lock()
+_pending = deque()
+_loop = None
+_wake = None
+
+
+def subscribe(event_types, handler):
+    for event_type in event_types:
+        _handlers[event_type].append(handler)
+
+
+def emit(event_type: str, user_id: str, **payload):
+    if _wake is None:
+        _dispatch(event_type, user_id, payload)
+        return
+    with _lock:
+        _pending.append((event_type, user_id, payload))
+    _loop.call_soon_threadsafe(_wake.set)
+
+
+def _dispatch(event_type: str, user_id: str, payload: dict):
+    for handler in _handlers.get(event_type, ()):
+        try:
+            handler(event_type, user_id, payload)
+        except Exception:
+            logger.exception("Handler for %s failed", event_type)
+
+
+def _drain():
+    # Handlers may emit follow-up events (level ups, streaks); they are drained too
+    while True:
+        with _lock:
+            if not _pending:
+                return
+            batch = list(_pending)
+            _pending.clear()
+        for event_type, user_id, payload in batch:
+            _dispatch(event_type, user_id, payload)
+
+
+async def dispatch_events():
+    global _loop, _wake
+    _loop = asyncio.get_running_loop()
+    _wake = asyncio.Event()
+    while True:
+        await _wake.wait()
+        _wake.clear()
+        await _loop.run_in_executor(None, _drain)
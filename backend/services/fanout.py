@@ -0,0 +1,44 @@
+import asyncio
+import logging
+from supabase_client import supabase_admin
+from config import CELEBRITY_FOLLOWER_THRESHOLD, HOME_TIMELINE_CAP
+
+# Background fan-out of new posts into followers' home timelines. create_post
+# only enqueues the post id; the worker does the set-based copy off the
+# request path. Authors past the celebrity threshold are skipped by
+# fan_out_post and pulled on read by home_feed instead.
+
+logger = logging.getLogger(__name__)
+
+
+class FanoutWorker:
+    def __init__(self):
+        self._queue = None
+
+    def enqueue(self, post_id: str):
+        if self._queue is None:
+            self.fan_out(post_id)
+            return
+        self._queue.put_nowait(post_id)
+
+    def fan_out(self, post_id: str):
+        supabase_admin.rpc("fan_out_post", {
+            "p_post_id": post_id,
+            "p_celebrity_threshold": CELEBRITY_FOLLOWER_THRESHOLD
+        }).execute()
+
+    def trim(self):
+        supabase_admin.rpc("trim_home_timelines", {"p_cap": HOME_TIMELINE_CAP}).execute()
+
+    async def run(self):
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        while True:
+            post_id = await self._queue.get()
+            try:
+                await loop.run_in_executor(None, self.fan_out, post_id)
+            except Exception:
+                logger.exception("Fan-out failed for post %s", post_id)
+
+
+fanout_worker = FanoutWorker()
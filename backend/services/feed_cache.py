@@ -0,0 +1,120 @@
+import json
+import threading
+from typing import Optional
+from supabase_client import supabase_admin
+from config import FEED_PAGE_SIZE, FEED_CACHED_PAGES
+from services.feed_changes import feed_version
+from services.post_counters import post_counters
+from services.user_index import get_user_summaries
+
+FEED_POST_SELECT = "id, user_id, content, type, likes, comment_count, share_count, media, xp_earned, timestamp"
+
+# The first FEED_CACHED_PAGES pages of the global feed, kept pre-serialized:
+# each post is stored as its JSON object minus the closing brace, so a page is
+# assembled by appending the viewer's isLiked and joining strings.
+# Posts are read with comment_count rather than their comments and likes_by
+# arrays: comments load per post on demand, and isLiked is looked up for
+# just the page's posts.
+# create_post writes through, counter changes re-serialize only the patched
+# post, and a periodic refresh picks up writes made by other workers.
+
+
+def feed_entry(post: dict, author: dict) -> dict:
+    comments = post.get("comment_count", post.get("comments")) or 0
+    return {
+        "id": post["id"],
+        "user": {
+            "name": author.get("name", "User"),
+            "avatar_url": author.get("avatar_url"),
+            "level": author.get("level", 1)
+        },
+        "content": post["content"],
+        "timestamp": post["timestamp"],
+        "likes": post.get("likes") or 0,
+        "comments": comments if isinstance(comments, int) else len(comments),
+        "shares": post.get("share_count") or 0,
+        "type": post.get("type", "general"),
+        "xp_earned": post.get("xp_earned"),
+        "media": post.get("media") or []
+    }
+
+
+def _fragment(entry: dict) -> str:
+    return json.dumps(entry, separators=(",", ":"))[:-1]
+
+
+class FeedCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._order = []
+        self._entries = {}
+        self._fragments = {}
+        self._version = None
+        self.ready = False
+
+    @property
+    def capacity(self) -> int:
+        return FEED_PAGE_SIZE * FEED_CACHED_PAGES
+
+    def load(self):
+        # Taken before the read, so changes racing the load are replayed by /feed/changes
+        version = feed_version()
+        response = supabase_admin.table("posts").select(FEED_POST_SELECT).order("timestamp", desc=True).limit(self.capacity).execute()
+        authors = get_user_summaries([post["user_id"] for post in response.data])
+
+        order = []
+        entries = {}
+        fragments = {}
+        for post in map(post_counters.overlay, response.data):
+            entry = feed_entry(post, authors.get(post["user_id"], {}))
+            order.append(post["id"])
+            entries[post["id"]] = entry
+            fragments[post["id"]] = _fragment(entry)
+
+        with self._lock:
+            self._order = order
+            self._entries = entries
+            self._fragments = fragments
+            self._version = version
+            self.ready = True
+
+    def page_json(self, page: int, user_id: Optional[str]) -> Optional[str]:
+        if not self.ready or page >= FEED_CACHED_PAGES:
+            return None
+
+        start = page * FEED_PAGE_SIZE
+        with self._lock:
+            ids = self._order[start:start + FEED_PAGE_SIZE]
+            fragments = [self._fragments[i] for i in ids]
+            version = self._version
+
+        liked = post_counters.liked_posts(user_id, [{"id": i} for i in ids])
+
+        posts = [
+            fragment + (',"isLiked":true}' if i in liked else ',"isLiked":false}')
+            for i, fragment in zip(ids, fragments)
+        ]
+        return '{"version":' + json.dumps(version) + ',"posts":[' + ",".join(posts) + "]}"
+
+    def add_post(self, entry: dict):
+        with self._lock:
+            if not self.ready or entry["id"] in self._entries:
+                return
+            self._order.insert(0, entry["id"])
+            self._entries[entry["id"]] = entry
+            self._fragments[entry["id"]] = _fragment(entry)
+            for post_id in self._order[self.capacity:]:
+                self._entries.pop(post_id, None)
+                self._fragments.pop(post_id, None)
+            del self._order[self.capacity:]
+
+    def patch(self, post_id: str, **counters):
+        with self._lock:
+            entry = self._entries.get(post_id)
+            if entry is not None:
+                entry = {**entry, **counters}
+                self._entries[post_id] = entry
+                self._fragments[post_id] = _fragment(entry)
+
+
+feed_cache = FeedCache()
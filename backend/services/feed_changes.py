@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from supabase_client import supabase_admin
+from config import FEED_CHANGES_RETENTION_HOURS
+
+# Reads over the feed_changes log that triggers on posts (and on the shards of
+# sharded posts) append to. A feed version is a position in that log, "xid-seq":
+# changes are read in (xid, seq) order and only below the snapshot's xmin, so
+# a change committed late cannot land behind a version already handed out.
+
+
+def encode_version(xid, seq) -> str:
+    return f"{xid}-{seq}"
+
+
+def decode_version(version: str) -> Optional[tuple]:
+    xid, _, seq = version.partition("-")
+    if not xid.isdigit() or not seq.isdigit():
+        return None
+    return xid, int(seq)
+
+
+def feed_version() -> str:
+    return encode_version(supabase_admin.rpc("feed_changes_head", {}).execute().data, 0)
+
+
+def changes_since(since: tuple, limit: int) -> list:
+    return supabase_admin.rpc("feed_changes_since", {
+        "p_after_xid": since[0],
+        "p_after_seq": since[1],
+        "p_limit": limit
+    }).execute().data or []
+
+
+def changes_expired(since: tuple) -> bool:
+    return bool(supabase_admin.rpc("feed_changes_expired", {
+        "p_after_xid": since[0],
+        "p_after_seq": since[1]
+    }).execute().data)
+
+
+def prune_feed_changes():
+    cutoff = datetime.utcnow() - timedelta(hours=FEED_CHANGES_RETENTION_HOURS)
+    supabase_admin.rpc("prune_feed_changes", {"p_before": cutoff.isoformat()}).execute()
@@ -0,0 +1,157 @@
+import heapq
+import threading
+import time
+from datetime import datetime
+from supabase_client import supabase_admin
+from config import HOT_FEED_CANDIDATES, HOT_FEED_HALF_LIFE_HOURS, HOT_FEED_WINDOW_HOURS, HOT_LIKE_WEIGHT, HOT_COMMENT_WEIGHT, HOT_SHARE_WEIGHT
+from services.post_counters import post_counters
+from services.skiplist import IndexableSkipList
+
+# Engagement-ranked candidate set for the "hot" feed. A post's score is its
+# weighted engagement halved every HOT_FEED_HALF_LIFE_HOURS, measured against
+# a shared reference time, so a counter change re-scores only that post and
+# the ordering stays consistent between passes. Posts in the window that do
+# not make the top HOT_FEED_CANDIDATES are benched with their counters, so a
+# new or reviving post can still climb in. redecay() moves the reference to
+# now and drops posts that aged out of the window; reconcile() reloads the
+# window from the posts table. Serving a page is a slice of the ranking.
+
+LOAD_BATCH_SIZE = 1000
+
+
+def _engagement(likes: int, comments: int, shares: int) -> float:
+    return 1 + likes * HOT_LIKE_WEIGHT + comments * HOT_COMMENT_WEIGHT + shares * HOT_SHARE_WEIGHT
+
+
+def _created_at(timestamp: str) -> float:
+    return datetime.fromisoformat(timestamp).timestamp()
+
+
+class HotFeed:
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._half_life = HOT_FEED_HALF_LIFE_HOURS * 3600
+        self._window = HOT_FEED_WINDOW_HOURS * 3600
+        self._lock = threading.Lock()
+        self._reference = time.time()
+        self._posts = {}
+        self._scores = {}
+        self._ranking = IndexableSkipList()
+        self._bench = {}
+        self._pending = None
+        self.ready = False
+
+    def _score(self, reference: float, created_at: float, likes: int, comments: int, shares: int) -> float:
+        return _engagement(likes, comments, shares) * 0.5 ** ((reference - created_at) / self._half_life)
+
+    def _set(self, post_id: str, stats: tuple):
+        old = self._scores.get(post_id)
+        if old is not None:
+            self._ranking.remove((-old, post_id))
+        self._bench.pop(post_id, None)
+        score = self._score(self._reference, *stats)
+        self._ranking.insert((-score, post_id))
+        self._posts[post_id] = stats
+        self._scores[post_id] = score
+
+        while len(self._ranking) > self._capacity:
+            neg, evicted = self._ranking.slice(len(self._ranking) - 1, 1)[0]
+            self._ranking.remove((neg, evicted))
+            del self._scores[evicted]
+            self._bench[evicted] = self._posts.pop(evicted)
+
+    def add_post(self, post_id: str, timestamp: str):
+        stats = (_created_at(timestamp), 0, 0, 0)
+        with self._lock:
+            if post_id not in self._posts and post_id not in self._bench:
+                self._set(post_id, stats)
+                if self._pending is not None:
+                    self._pending[post_id] = stats
+
+    def update(self, post_id: str, **counters):
+        with self._lock:
+            stats = self._posts.get(post_id) or self._bench.get(post_id)
+            if stats is None:
+                return
+            created_at, likes, comments, shares = stats
+            stats = (
+                created_at,
+                counters.get("likes", likes),
+                counters.get("comments", comments),
+                counters.get("shares", shares)
+            )
+            self._set(post_id, stats)
+            if self._pending is not None:
+                self._pending[post_id] = stats
+
+    def page(self, offset: int, limit: int) -> list:
+        with self._lock:
+            return [post_id for _, post_id in self._ranking.slice(offset, limit)]
+
+    def _rebuild(self, entries: dict):
+        # Only the top capacity posts are ranked; the rest of the window is
+        # benched with its counters so engagement can still lift it in
+        reference = time.time()
+        cutoff = reference - self._window
+        keys = [
+            (-self._score(reference, *stats), post_id)
+            for post_id, stats in entries.items()
+            if stats[0] >= cutoff
+        ]
+        top = heapq.nsmallest(self._capacity, keys)
+        ranking = IndexableSkipList()
+        for key in top:
+            ranking.insert(key)
+        posts = {post_id: entries[post_id] for _, post_id in top}
+        bench = {post_id: entries[post_id] for _, post_id in keys if post_id not in posts}
+
+        self._reference = reference
+        self._posts = posts
+        self._scores = {post_id: -neg for neg, post_id in top}
+        self._ranking = ranking
+        self._bench = bench
+
+    def redecay(self):
+        with self._lock:
+            self._rebuild({**self._bench, **self._posts})
+
+    def reconcile(self):
+        with self._lock:
+            self._pending = {}
+
+        try:
+            since = datetime.utcfromtimestamp(time.time() - self._window).isoformat()
+            entries = {}
+            last = None
+            while True:
+                # Keyset pages on (timestamp, id) inside the window, so a pass
+                # reads only the window and is never cut off at the PostgREST row limit
+                query = supabase_admin.table("posts").select("id, likes, comment_count, share_count, timestamp").gte("timestamp", since)
+                if last is not None:
+                    last_timestamp, last_id = last
+                    query = query.gte("timestamp", last_timestamp).or_(f'timestamp.gt."{last_timestamp}",id.gt.{last_id}')
+                response = query.order("timestamp").order("id").limit(LOAD_BATCH_SIZE).execute()
+                for post in map(post_counters.overlay, response.data):
+                    entries[post["id"]] = (
+                        _created_at(post["timestamp"]),
+                        post.get("likes") or 0,
+                        post.get("comment_count") or 0,
+                        post.get("share_count") or 0
+                    )
+                if len(response.data) < LOAD_BATCH_SIZE:
+                    break
+                last = (response.data[-1]["timestamp"], response.data[-1]["id"])
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            # Counter changes that landed while the table was being read win over the snapshot
+            entries.update(self._pending)
+            self._rebuild(entries)
+            self._pending = None
+            self.ready = True
+
+
+hot_feed = HotFeed(HOT_FEED_CANDIDATES)
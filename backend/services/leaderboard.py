@@ -0,0 +1,100 @@
+import threading
+from typing import Optional
+from supabase_client import supabase_admin
+from services.skiplist import IndexableSkipList
+from xp_utils import fold_pending_xp, total_xp
+
+LOAD_BATCH_SIZE = 1000
+
+# XP ranking keyed by (-score, user_id) so position 0 is the leader and ties
+# break deterministically. award_xp keeps it current; reconcile() rebuilds it
+# from the loader's (user_id, score) rows to repair any drift.
+
+
+def load_lifetime_totals():
+    last_id = None
+    while True:
+        # pending_xp folds in awards the compactor has not reached yet; keyset
+        # pages by id so each page is an index seek rather than an offset scan
+        query = supabase_admin.table("users").select("id, level, xp, pending_xp")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        response = query.order("id").limit(LOAD_BATCH_SIZE).execute()
+        for user in map(fold_pending_xp, response.data):
+            yield user["id"], total_xp(user.get("level") or 1, user.get("xp") or 0)
+        if len(response.data) < LOAD_BATCH_SIZE:
+            break
+        last_id = response.data[-1]["id"]
+
+
+class Leaderboard:
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._scores = {}
+        self._ranking = IndexableSkipList()
+        self._pending = None
+        self.ready = False
+
+    def _set(self, scores: dict, ranking: IndexableSkipList, user_id: str, total: int):
+        old = scores.get(user_id)
+        if old == total:
+            return
+        if old is not None:
+            ranking.remove((-old, user_id))
+        ranking.insert((-total, user_id))
+        scores[user_id] = total
+
+    def update(self, user_id: str, total: int):
+        with self._lock:
+            self._set(self._scores, self._ranking, user_id, total)
+            if self._pending is not None:
+                self._pending[user_id] = total
+
+    def top(self, limit: int, offset: int = 0) -> list:
+        with self._lock:
+            keys = self._ranking.slice(offset, limit)
+        return [(offset + i + 1, user_id, -neg) for i, (neg, user_id) in enumerate(keys)]
+
+    def rank_of(self, user_id: str) -> Optional[tuple]:
+        with self._lock:
+            total = self._scores.get(user_id)
+            if total is None:
+                return None
+            return self._ranking.rank((-total, user_id)) + 1, total
+
+    def around(self, user_id: str, radius: int) -> list:
+        with self._lock:
+            total = self._scores.get(user_id)
+            if total is None:
+                return []
+            position = self._ranking.rank((-total, user_id))
+            start = max(0, position - radius)
+            keys = self._ranking.slice(start, position - start + radius + 1)
+        return [(start + i + 1, uid, -neg) for i, (neg, uid) in enumerate(keys)]
+
+    def reconcile(self):
+        with self._lock:
+            self._pending = {}
+
+        try:
+            scores = {}
+            ranking = IndexableSkipList()
+            for user_id, total in self._loader():
+                self._set(scores, ranking, user_id, total)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            # Awards that landed while the table was being read win over the snapshot
+            for user_id, total in self._pending.items():
+                self._set(scores, ranking, user_id, total)
+            self._scores = scores
+            self._ranking = ranking
+            self._pending = None
+            self.ready = True
+
+
+leaderboard = Leaderboard(load_lifetime_totals)
@@ -0,0 +1,287 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+from supabase_client import supabase_admin
+from config import COUNTER_FLUSH_MS, COUNTER_FLUSH_EVENTS, COUNTER_LOG_DIR, COUNTER_BASE_TTL_SECONDS, COUNTER_BASE_CACHE_SIZE
+from services.post_shards import post_shards
+
+# Write-behind buffer for post likes, shares and views. Each change is
+# appended to this worker's log file and folded into an in-memory delta;
+# run() flushes the deltas as one apply_post_counter_deltas call every
+# COUNTER_FLUSH_MS or COUNTER_FLUSH_EVENTS changes, whichever comes first.
+#
+# A log file's name is the id of the batch it becomes, so a log left behind
+# by a crashed worker is replayed under the same id and the batch table keeps
+# it from applying twice. Live logs are flock'ed so replay skips them, and
+# log writes are flushed but not fsync'ed, which covers process crashes.
+# Reads overlay the deltas that are still in flight or pending, on top of
+# the shard totals for posts in sharded mode (see post_shards).
+#
+# Shares and views only need a post's stored share and view counts, so those
+# are kept in a small LRU for COUNTER_BASE_TTL_SECONDS and bumped by this
+# worker's own flushes; other workers' writes show up when an entry expires.
+
+logger = logging.getLogger(__name__)
+
+
+def _empty() -> dict:
+    return {"likes": 0, "shares": 0, "views": 0, "likers": {}}
+
+
+def _apply(pending: dict, record: dict):
+    delta = pending.setdefault(record["post_id"], _empty())
+    if "liked" in record:
+        delta["likers"][record["user_id"]] = record["liked"]
+        delta["likes"] += 1 if record["liked"] else -1
+    else:
+        delta[record["counter"]] += record.get("delta", 1)
+
+
+def _batch(pending: dict) -> list:
+    return [
+        {
+            "post_id": post_id,
+            "shares": delta["shares"],
+            "views": delta["views"],
+            "liked": [u for u, liked in delta["likers"].items() if liked],
+            "unliked": [u for u, liked in delta["likers"].items() if not liked]
+        }
+        for post_id, delta in pending.items()
+    ]
+
+
+def _apply_batch(batch_id: str, pending: dict):
+    supabase_admin.rpc("apply_post_counter_deltas", {"p_batch_id": batch_id, "p_deltas": _batch(pending)}).execute()
+
+
+def _liked_post_ids(user_id: str, post_ids: list) -> set:
+    response = supabase_admin.rpc("liked_post_ids", {"p_user_id": user_id, "p_post_ids": post_ids}).execute()
+    return {row["post_id"] for row in response.data or []}
+
+
+class PostCounterBuffer:
+    def __init__(self, log_dir: str):
+        self._log_dir = log_dir
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._events = 0
+        self._log = None
+        self._log_id = None
+        self._inflight = None
+        self._loop = None
+        self._wake = None
+        self._bases = OrderedDict()
+
+    def _open_log(self):
+        self._log_id = str(uuid.uuid4())
+        self._log = open(os.path.join(self._log_dir, f"{self._log_id}.log"), "a", encoding="utf-8")
+        fcntl.flock(self._log, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def open(self):
+        os.makedirs(self._log_dir, exist_ok=True)
+        with self._lock:
+            self._open_log()
+
+    def replay(self):
+        for name in sorted(os.listdir(self._log_dir)):
+            if not name.endswith(".log"):
+                continue
+            path = os.path.join(self._log_dir, name)
+            try:
+                log = open(path, "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with log:
+                try:
+                    fcntl.flock(log, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                pending = {}
+                for line in log:
+                    # A torn final line means the change was never acknowledged
+                    try:
+                        _apply(pending, json.loads(line))
+                    except ValueError:
+                        break
+                if pending:
+                    _apply_batch(name[:-len(".log")], pending)
+                os.remove(path)
+
+    def _record(self, record: dict):
+        post_shards.observe(record["post_id"])
+        with self._lock:
+            if self._log is None:
+                pending = {}
+                _apply(pending, record)
+            else:
+                self._log.write(json.dumps(record) + "\n")
+                self._log.flush()
+                _apply(self._pending, record)
+                self._events += 1
+                if self._events >= COUNTER_FLUSH_EVENTS and self._wake is not None:
+                    self._loop.call_soon_threadsafe(self._wake.set)
+                return
+        _apply_batch(str(uuid.uuid4()), pending)
+
+    def like(self, post_id: str, user_id: str, liked: bool):
+        self._record({"post_id": post_id, "user_id": user_id, "liked": liked})
+
+    def add(self, post_id: str, counter: str, delta: int = 1):
+        self._record({"post_id": post_id, "counter": counter, "delta": delta})
+
+    def _deltas(self, post_id: str) -> list:
+        with self._lock:
+            sources = [self._inflight[1]] if self._inflight else []
+            sources.append(self._pending)
+            return [
+                {**source[post_id], "likers": dict(source[post_id]["likers"])}
+                for source in sources if post_id in source
+            ]
+
+    def overlay(self, post: dict) -> dict:
+        sharded = post_shards.is_sharded(post["id"])
+        if sharded:
+            post = post_shards.overlay(post)
+
+        deltas = self._deltas(post["id"])
+        if not deltas:
+            return post
+
+        post = dict(post)
+        for delta in deltas:
+            if "likes_by" in post and not sharded:
+                likers = set(post["likes_by"] or [])
+                likers.update(u for u, liked in delta["likers"].items() if liked)
+                likers.difference_update(u for u, liked in delta["likers"].items() if not liked)
+                post["likes_by"] = list(likers)
+                post["likes"] = len(likers)
+            elif "likes" in post:
+                post["likes"] = max(0, (post["likes"] or 0) + delta["likes"])
+            if "share_count" in post:
+                post["share_count"] = (post["share_count"] or 0) + delta["shares"]
+            if "view_count" in post:
+                post["view_count"] = (post["view_count"] or 0) + delta["views"]
+        return post
+
+    def counts(self, post_id: str) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._bases.get(post_id)
+            if cached is not None and now - cached[0] < COUNTER_BASE_TTL_SECONDS:
+                self._bases.move_to_end(post_id)
+            else:
+                cached = None
+        if cached is not None:
+            return self.overlay(cached[1])
+
+        response = supabase_admin.table("posts").select("id, share_count, view_count").eq("id", post_id).execute()
+        if not response.data:
+            return None
+
+        with self._lock:
+            self._bases[post_id] = (now, response.data[0])
+            self._bases.move_to_end(post_id)
+            while len(self._bases) > COUNTER_BASE_CACHE_SIZE:
+                self._bases.popitem(last=False)
+        return self.overlay(response.data[0])
+
+    def _absorb_bases(self, pending: dict):
+        for post_id, delta in pending.items():
+            cached = self._bases.get(post_id)
+            if cached is None or post_shards.is_sharded(post_id):
+                continue
+            at, base = cached
+            self._bases[post_id] = (at, {
+                **base,
+                "share_count": (base["share_count"] or 0) + delta["shares"],
+                "view_count": (base["view_count"] or 0) + delta["views"]
+            })
+
+    def liked_posts(self, user_id: str, posts: list) -> set:
+        if not user_id:
+            return set()
+
+        # Sharded posts keep likers in post_likes, and rows read without
+        # likes_by (the feed) carry no like state, so both are looked up
+        lookup = {
+            post["id"] for post in posts
+            if post_shards.is_sharded(post["id"]) or ("likes_by" not in post and "is_liked" not in post)
+        }
+        stored = _liked_post_ids(user_id, list(lookup)) if lookup else set()
+
+        liked = set()
+        for post in posts:
+            if post["id"] in lookup:
+                state = post["id"] in stored
+            elif "likes_by" in post:
+                state = user_id in (post["likes_by"] or [])
+            else:
+                state = bool(post.get("is_liked"))
+            for delta in self._deltas(post["id"]):
+                state = delta["likers"].get(user_id, state)
+            if state:
+                liked.add(post["id"])
+        return liked
+
+    def like_state(self, post_id: str, user_id: str) -> Optional[tuple]:
+        # The membership check runs in the database; only the count and the
+        # flag come back, and this worker's unflushed likes are folded in
+        response = supabase_admin.rpc("post_like_state", {"p_post_id": post_id, "p_user_id": user_id}).execute()
+        if not response.data:
+            return None
+
+        row = response.data[0]
+        liked = row["liked"]
+        for delta in self._deltas(post_id):
+            liked = delta["likers"].get(user_id, liked)
+        return self.overlay({"id": post_id, "likes": row["likes"]})["likes"], liked
+
+    def flush(self):
+        with self._lock:
+            if self._inflight is None:
+                if not self._pending:
+                    return
+                self._inflight = (self._log_id, self._pending, self._log)
+                self._pending = {}
+                self._events = 0
+                self._open_log()
+            batch_id, pending, log = self._inflight
+
+        # A failed batch stays in flight and is retried under the same id
+        _apply_batch(batch_id, pending)
+        post_shards.absorb(pending)
+        os.remove(log.name)
+        log.close()
+        with self._lock:
+            # The batch leaves in flight as it lands in the cached bases
+            self._absorb_bases(pending)
+            self._inflight = None
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        await self._loop.run_in_executor(None, self.open)
+        try:
+            await self._loop.run_in_executor(None, self.replay)
+        except Exception:
+            logger.exception("Post counter log replay failed")
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), COUNTER_FLUSH_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._loop.run_in_executor(None, self.flush)
+            except Exception:
+                logger.exception("Post counter flush failed")
+
+
+post_counters = PostCounterBuffer(COUNTER_LOG_DIR)
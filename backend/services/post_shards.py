@@ -0,0 +1,85 @@
+import threading
+from collections import Counter
+from supabase_client import supabase_admin
+from config import HOT_POST_SHARDS, HOT_POST_PROMOTE_RATE, HOT_POST_DEMOTE_RATE, HOT_POST_MIN_SHARDED_SECONDS, HOT_POST_REBALANCE_SECONDS
+
+# Sharded counter mode for posts hot enough that even one batched UPDATE per
+# flush per worker contends on the posts row. post_counters reports every
+# write here; rebalance() hands this worker's write counts to
+# rebalance_post_counters, which promotes and demotes from the rate summed
+# over all workers (so every worker agrees on a post's mode) and returns the
+# sharded posts. Their shards are re-summed into a cache that reads add to
+# the posts row's base counts.
+
+EMPTY_TOTALS = {"likes": 0, "shares": 0, "views": 0}
+
+
+class PostShards:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._writes = Counter()
+        self._sharded = set()
+        self._totals = {}
+
+    def observe(self, post_id: str):
+        with self._lock:
+            self._writes[post_id] += 1
+
+    def is_sharded(self, post_id: str) -> bool:
+        return post_id in self._sharded
+
+    def overlay(self, post: dict) -> dict:
+        with self._lock:
+            totals = self._totals.get(post["id"], EMPTY_TOTALS)
+        post = dict(post)
+        if "likes" in post:
+            post["likes"] = (post["likes"] or 0) + totals["likes"]
+        if "share_count" in post:
+            post["share_count"] = (post["share_count"] or 0) + totals["shares"]
+        if "view_count" in post:
+            post["view_count"] = (post["view_count"] or 0) + totals["views"]
+        return post
+
+    def absorb(self, pending: dict):
+        # Deltas this worker just flushed, so totals do not dip until the next refresh
+        with self._lock:
+            for post_id, delta in pending.items():
+                totals = self._totals.get(post_id)
+                if totals is not None:
+                    self._totals[post_id] = {
+                        "likes": totals["likes"] + delta["likes"],
+                        "shares": totals["shares"] + delta["shares"],
+                        "views": totals["views"] + delta["views"]
+                    }
+
+    def rebalance(self):
+        with self._lock:
+            writes, self._writes = self._writes, Counter()
+
+        try:
+            response = supabase_admin.rpc("rebalance_post_counters", {
+                "p_writes": [{"post_id": post_id, "writes": count} for post_id, count in writes.items()],
+                "p_window_seconds": HOT_POST_REBALANCE_SECONDS,
+                "p_shards": HOT_POST_SHARDS,
+                "p_promote_rate": HOT_POST_PROMOTE_RATE,
+                "p_demote_rate": HOT_POST_DEMOTE_RATE,
+                "p_min_sharded_seconds": HOT_POST_MIN_SHARDED_SECONDS
+            }).execute()
+        except Exception:
+            # Unreported writes carry over to the next round
+            with self._lock:
+                self._writes.update(writes)
+            raise
+        sharded = {row["post_id"] for row in response.data or []}
+
+        totals = {}
+        if sharded:
+            response = supabase_admin.rpc("post_counter_totals", {"p_post_ids": list(sharded)}).execute()
+            totals = {row["post_id"]: {"likes": row["likes"], "shares": row["shares"], "views": row["views"]} for row in response.data}
+
+        with self._lock:
+            self._sharded = sharded
+            self._totals = totals
+
+
+post_shards = PostShards()
@@ -0,0 +1,104 @@
+import random
+
+MAX_HEIGHT = 32
+
+# Skip list with per-link widths (the number of level-0 steps each link
+# spans), giving O(log n) insert, remove, rank and select by position.
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, height: int):
+        self.key = key
+        self.next = [None] * height
+        self.width = [1] * height
+
+
+class IndexableSkipList:
+    def __init__(self):
+        self.size = 0
+        self._head = _Node(None, MAX_HEIGHT)
+
+    def __len__(self):
+        return self.size
+
+    def _random_height(self) -> int:
+        height = 1
+        while height < MAX_HEIGHT and random.random() < 0.5:
+            height += 1
+        return height
+
+    def insert(self, key):
+        chain = [None] * MAX_HEIGHT
+        steps_at_level = [0] * MAX_HEIGHT
+        node = self._head
+        for level in reversed(range(MAX_HEIGHT)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        height = self._random_height()
+        new = _Node(key, height)
+        steps = 0
+        for level in range(height):
+            prev = chain[level]
+            new.next[level] = prev.next[level]
+            prev.next[level] = new
+            new.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(height, MAX_HEIGHT):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain = [None] * MAX_HEIGHT
+        node = self._head
+        for level in reversed(range(MAX_HEIGHT)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), MAX_HEIGHT):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def rank(self, key) -> int:
+        node = self._head
+        position = -1
+        for level in reversed(range(MAX_HEIGHT)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+
+        target = node.next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        return position + 1
+
+    def slice(self, start: int, count: int) -> list:
+        if start < 0 or start >= self.size or count <= 0:
+            return []
+
+        node = self._head
+        position = -1
+        for level in reversed(range(MAX_HEIGHT)):
+            while node.next[level] is not None and position + node.width[level] <= start:
+                position += node.width[level]
+                node = node.next[level]
+
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
@@ -0,0 +1,41 @@
+import threading
+from datetime import datetime, timezone
+from supabase_client import supabase_admin
+from services.events import emit, STREAK_UPDATED
+
+# Daily activity streaks. record_activity does the work in one statement; the
+# tracker remembers when each user's local day ends so repeat events on the
+# same day never reach the database.
+
+
+class StreakTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._day_ends_at = {}
+
+    def on_activity(self, event_type: str, user_id: str, payload: dict):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            day_ends_at = self._day_ends_at.get(user_id)
+        if day_ends_at and now < day_ends_at:
+            return
+
+        response = supabase_admin.rpc("record_activity", {"p_user_id": user_id}).execute()
+        if response.data:
+            row = response.data[0]
+            with self._lock:
+                self._day_ends_at[user_id] = datetime.fromisoformat(row["day_ends_at"])
+            emit(STREAK_UPDATED, user_id, streak_days=row["streak_days"])
+
+    def forget(self, user_id: str):
+        with self._lock:
+            self._day_ends_at.pop(user_id, None)
+
+    def reset_broken(self):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self._day_ends_at = {k: v for k, v in self._day_ends_at.items() if v > now}
+        supabase_admin.rpc("reset_broken_streaks", {}).execute()
+
+
+streak_tracker = StreakTracker()
@@ -0,0 +1,122 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import deque, OrderedDict
+from typing import Optional
+from config import STREAM_REPLAY_SIZE, STREAM_QUEUE_SIZE, STREAM_HEARTBEAT_SECONDS
+from services.bus import bus
+
+# Pub/sub behind GET /api/social/stream. Events go through the bus so every
+# worker sees every event, and each worker numbers them for itself. Each
+# event is serialized once into an SSE frame and kept in a replay ring for
+# Last-Event-ID resume. A subscriber is a small ordered dict of pending
+# frames keyed by what they describe (a post, or one counter of one post), so
+# a burst of likes on a post collapses to its latest count. A subscriber
+# whose backlog still overflows is sent a reset and dropped; the client
+# re-syncs through /feed/changes. Ids carry a per-process epoch so a resume
+# against another process (or after a restart) is detected and answered with
+# a reset.
+
+RESET_FRAME = "event: reset\ndata: {}\n\n"
+HEARTBEAT_FRAME = ": ping\n\n"
+
+
+class Subscriber:
+    __slots__ = ("pending", "wake", "overflowed")
+
+    def __init__(self):
+        self.pending = OrderedDict()
+        self.wake = asyncio.Event()
+        self.overflowed = False
+
+
+class StreamHub:
+    def __init__(self):
+        self._epoch = format(int(time.time() * 1000), "x")
+        self._seq = itertools.count(1)
+        self._ring = deque(maxlen=STREAM_REPLAY_SIZE)
+        self._subscribers = set()
+        self._loop = None
+
+    def start(self):
+        # Called at startup, so events are numbered and replayable before the
+        # first subscriber connects
+        self._loop = asyncio.get_running_loop()
+
+    def publish(self, event_type: str, key: str, data: dict):
+        bus.publish("stream", {"event": event_type, "key": key, "data": data}, key=key)
+
+    def deliver(self, payload: dict):
+        event_type, key, data = payload["event"], payload["key"], payload["data"]
+        if self._loop is None:
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._dispatch(event_type, key, data)
+        else:
+            self._loop.call_soon_threadsafe(self._dispatch, event_type, key, data)
+
+    def _dispatch(self, event_type: str, key: str, data: dict):
+        seq = next(self._seq)
+        frame = f"id: {self._epoch}-{seq}\nevent: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+        self._ring.append((seq, key, frame))
+
+        for subscriber in self._subscribers:
+            if subscriber.overflowed:
+                continue
+            subscriber.pending.pop(key, None)
+            subscriber.pending[key] = frame
+            if len(subscriber.pending) > STREAM_QUEUE_SIZE:
+                subscriber.overflowed = True
+            subscriber.wake.set()
+
+    def _replay(self, subscriber: Subscriber, last_event_id: Optional[str]) -> bool:
+        if not last_event_id:
+            return True
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self._epoch or not seq.isdigit():
+            return False
+        seq = int(seq)
+        if self._ring and seq < self._ring[0][0] - 1:
+            return False
+        for event_seq, key, frame in self._ring:
+            if event_seq > seq:
+                subscriber.pending.pop(key, None)
+                subscriber.pending[key] = frame
+        return len(subscriber.pending) <= STREAM_QUEUE_SIZE
+
+    async def frames(self, last_event_id: Optional[str] = None):
+        subscriber = Subscriber()
+        self._subscribers.add(subscriber)
+        try:
+            if not self._replay(subscriber, last_event_id):
+                yield RESET_FRAME
+                return
+            yield "retry: 5000\n\n"
+
+            while True:
+                if not subscriber.pending:
+                    try:
+                        await asyncio.wait_for(subscriber.wake.wait(), STREAM_HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield HEARTBEAT_FRAME
+                        continue
+                    finally:
+                        subscriber.wake.clear()
+
+                if subscriber.overflowed:
+                    yield RESET_FRAME
+                    return
+
+                frames = "".join(subscriber.pending.values())
+                subscriber.pending.clear()
+                yield frames
+        finally:
+            self._subscribers.discard(subscriber)
+
+
+stream_hub = StreamHub()
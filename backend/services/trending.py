@@ -0,0 +1,185 @@
+import re
+import threading
+import time
+from array import array
+from datetime import datetime
+from supabase_client import supabase_admin
+from config import TRENDING_BUCKET_SECONDS, TRENDING_BUCKETS, TRENDING_TOP_K, TRENDING_SKETCH_WIDTH, TRENDING_SKETCH_DEPTH, TRENDING_WARMUP_POSTS
+
+# Trending hashtags and keywords over a sliding window of TRENDING_BUCKETS
+# buckets, each TRENDING_BUCKET_SECONDS wide. Every bucket holds a Count-Min
+# Sketch for frequency estimates and a space-saving summary of its heaviest
+# tokens, so memory is fixed by configuration, not by post volume. A query
+# takes the union of the buckets' heavy hitters as candidates and ranks them
+# by their summed sketch estimates. Buckets are reused in a ring.
+#
+# New posts arrive as "post" events on the bus's stream channel, so every
+# worker counts posts made on any worker. A periodic reload from the posts
+# table repairs counts missed while the bus was disconnected.
+
+HASHTAG_PATTERN = re.compile(r"#(\w{2,50})")
+WORD_PATTERN = re.compile(r"[a-z][a-z']{3,29}")
+
+STOPWORDS = frozenset("""
+    about after again also been before being between both could does doing down during each
+    from have having here into just like more most much only other over same should some such
+    than that their them then there these they this those through today under until very want
+    were what when where which while will with would your yours really going still ever every
+""".split())
+
+# Auto-posted boilerplate ("Unlocked ...") would outrank what people write
+TRENDING_SKIPPED_TYPES = ("achievement",)
+
+
+def extract_tokens(content: str) -> set:
+    tokens = {f"#{tag.lower()}" for tag in HASHTAG_PATTERN.findall(content or "")}
+    text = HASHTAG_PATTERN.sub(" ", (content or "").lower())
+    tokens.update(word for word in WORD_PATTERN.findall(text) if word not in STOPWORDS)
+    return tokens
+
+
+class CountMinSketch:
+    def __init__(self, width: int, depth: int):
+        self._width = width
+        self._depth = depth
+        self._rows = [array("I", bytes(4 * width)) for _ in range(depth)]
+
+    def add(self, token: str):
+        for seed, row in enumerate(self._rows):
+            row[hash((seed, token)) % self._width] += 1
+
+    def estimate(self, token: str) -> int:
+        return min(row[hash((seed, token)) % self._width] for seed, row in enumerate(self._rows))
+
+
+class SpaceSaving:
+    # Stream-summary layout: tokens grouped by count, so an increment moves a
+    # token to the next group and eviction takes any token from the smallest
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._counts = {}
+        self._groups = {}
+        self._min = 0
+
+    def _move(self, token: str, old: int, new: int):
+        if old:
+            group = self._groups[old]
+            group.discard(token)
+            if not group:
+                del self._groups[old]
+                if self._min == old:
+                    self._min = new
+        self._groups.setdefault(new, set()).add(token)
+        self._counts[token] = new
+
+    def add(self, token: str):
+        count = self._counts.get(token)
+        if count is not None:
+            self._move(token, count, count + 1)
+        elif len(self._counts) < self._capacity:
+            self._move(token, 0, 1)
+            self._min = 1
+        else:
+            floor = self._min
+            del self._counts[self._groups[floor].pop()]
+            self._groups[floor].add(token)
+            self._move(token, floor, floor + 1)
+
+    def tokens(self) -> list:
+        return list(self._counts)
+
+
+class TrendingIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = [None] * TRENDING_BUCKETS
+        self._pending = None
+
+    @staticmethod
+    def _bucket(slots: list, index: int):
+        slot = index % TRENDING_BUCKETS
+        bucket = slots[slot]
+        if bucket is None or bucket[0] != index:
+            bucket = (index, CountMinSketch(TRENDING_SKETCH_WIDTH, TRENDING_SKETCH_DEPTH), SpaceSaving(TRENDING_TOP_K))
+            slots[slot] = bucket
+        return bucket
+
+    @staticmethod
+    def _bucket_index(timestamp: float = None):
+        index = int((timestamp or time.time()) // TRENDING_BUCKET_SECONDS)
+        if index <= int(time.time() // TRENDING_BUCKET_SECONDS) - TRENDING_BUCKETS:
+            return None
+        return index
+
+    def _count(self, slots: list, content: str, timestamp: float = None):
+        index = self._bucket_index(timestamp)
+        if index is None:
+            return
+        _, sketch, heavy = self._bucket(slots, index)
+        for token in extract_tokens(content):
+            sketch.add(token)
+            heavy.add(token)
+
+    def add(self, content: str, timestamp: float = None):
+        with self._lock:
+            self._count(self._slots, content, timestamp)
+
+    def on_stream(self, payload: dict):
+        if payload.get("event") != "post":
+            return
+        post = payload["data"]
+        if post.get("type") in TRENDING_SKIPPED_TYPES:
+            return
+        timestamp = datetime.fromisoformat(post["timestamp"]).timestamp()
+        with self._lock:
+            self._count(self._slots, post.get("content"), timestamp)
+            if self._pending is not None:
+                self._pending.append((post["id"], post.get("content"), timestamp))
+
+    def top(self, limit: int, kind: str = "all") -> list:
+        oldest = int(time.time() // TRENDING_BUCKET_SECONDS) - TRENDING_BUCKETS
+        with self._lock:
+            live = [bucket for bucket in self._slots if bucket is not None and bucket[0] > oldest]
+            candidates = set()
+            for _, _, heavy in live:
+                candidates.update(heavy.tokens())
+            if kind == "hashtag":
+                candidates = {t for t in candidates if t.startswith("#")}
+            elif kind == "keyword":
+                candidates = {t for t in candidates if not t.startswith("#")}
+            scored = [(sum(sketch.estimate(t) for _, sketch, _ in live), t) for t in candidates]
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [{"token": token, "count": count} for count, token in scored[:limit]]
+
+    def load(self):
+        # The new buckets are built aside and swapped in, so readers never see
+        # them half full; posts streamed meanwhile are replayed unless the
+        # query already returned them
+        with self._lock:
+            self._pending = []
+        try:
+            since = time.time() - TRENDING_BUCKET_SECONDS * TRENDING_BUCKETS
+            query = supabase_admin.table("posts").select("id, content, timestamp").gte("timestamp", datetime.utcfromtimestamp(since).isoformat())
+            for post_type in TRENDING_SKIPPED_TYPES:
+                query = query.neq("type", post_type)
+            response = query.order("timestamp", desc=True).limit(TRENDING_WARMUP_POSTS).execute()
+
+            slots = [None] * TRENDING_BUCKETS
+            for post in response.data:
+                self._count(slots, post["content"], datetime.fromisoformat(post["timestamp"]).timestamp())
+            loaded = {post["id"] for post in response.data}
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            for post_id, content, timestamp in self._pending:
+                if post_id not in loaded:
+                    self._count(slots, content, timestamp)
+            self._pending = None
+            self._slots = slots
+
+
+trending = TrendingIndex()
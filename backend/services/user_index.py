@@ -0,0 +1,238 @@
+import heapq
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from supabase_client import supabase_admin
+from user_fields import USER_SUMMARY_SELECT
+from xp_utils import fold_pending_xp
+from services.bus import bus
+
+# In-process prefix index over username and name tokens for @-mention
+# autocomplete. Layout is array-backed so a million users stay small:
+#   - display records live in one bytearray, addressed by per-slot offsets
+#   - tokens are a sorted list of interned strings (common first names are
+#     shared) with a parallel array of slot numbers
+#   - slots are also kept in level order, for prefixes too common to rank
+#     by scanning their token range
+# Rewritten records are appended and the old bytes are reclaimed on the next
+# bulk load.
+#
+# Profile and level changes are published on the bus's "users" channel so
+# every worker's index applies them. Changes that arrive while a bulk load is
+# reading are replayed on top of it.
+
+SEPARATOR = "\x1f"
+LOAD_BATCH_SIZE = 1000
+MAX_CANDIDATES = 50000
+INDEXED_FIELDS = ("id", "name", "username", "avatar_url", "level")
+SLOT_MASK = 0xFFFFFFFF
+
+
+def _tokenize(username: str, name: str) -> set:
+    tokens = set()
+    if username:
+        tokens.add(username.lower())
+    for part in (name or "").lower().split():
+        tokens.add(part)
+    return tokens
+
+
+def _rank_key(level: int, slot: int) -> int:
+    # Sorts by level, highest first, then by slot
+    return (-level << 32) | slot
+
+
+class UserIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._changes = None
+        self._reset()
+
+    def _reset(self):
+        self.ready = False
+        self._blob = bytearray()
+        self._offsets = array("Q")
+        self._lengths = array("I")
+        self._levels = array("i")
+        self._slot_of = {}
+        self._tokens = []
+        self._token_slots = array("I")
+        self._ranked = array("q")
+
+    def _write_record(self, slot: int, user: dict):
+        raw = SEPARATOR.join([
+            user["id"],
+            user.get("username") or "",
+            user.get("name") or "",
+            user.get("avatar_url") or ""
+        ]).encode("utf-8")
+        offset = len(self._blob)
+        self._blob += raw
+        if slot == len(self._offsets):
+            self._offsets.append(offset)
+            self._lengths.append(len(raw))
+            self._levels.append(user.get("level") or 1)
+        else:
+            self._offsets[slot] = offset
+            self._lengths[slot] = len(raw)
+
+    def _read_record(self, slot: int) -> dict:
+        start = self._offsets[slot]
+        raw = self._blob[start:start + self._lengths[slot]].decode("utf-8")
+        user_id, username, name, avatar_url = raw.split(SEPARATOR)
+        return {
+            "id": user_id,
+            "name": name,
+            "username": username,
+            "avatar_url": avatar_url or None,
+            "level": self._levels[slot]
+        }
+
+    def _add_token(self, token: str, slot: int):
+        token = sys.intern(token)
+        pos = bisect_right(self._tokens, token)
+        self._tokens.insert(pos, token)
+        self._token_slots.insert(pos, slot)
+
+    def _set_level(self, slot: int, level: int):
+        if level == self._levels[slot]:
+            return
+        old = _rank_key(self._levels[slot], slot)
+        del self._ranked[bisect_left(self._ranked, old)]
+        self._levels[slot] = level
+        key = _rank_key(level, slot)
+        self._ranked.insert(bisect_left(self._ranked, key), key)
+
+    def _remove_token(self, token: str, slot: int):
+        lo = bisect_left(self._tokens, token)
+        hi = bisect_right(self._tokens, token)
+        for pos in range(lo, hi):
+            if self._token_slots[pos] == slot:
+                del self._tokens[pos]
+                del self._token_slots[pos]
+                return
+
+    def load(self):
+        with self._lock:
+            self._changes = {}
+
+        try:
+            users = []
+            last_id = None
+            while True:
+                # Keyset pages by id, so each page is an index range seek rather than an offset scan
+                query = supabase_admin.table("users").select("id, name, username, avatar_url, level")
+                if last_id is not None:
+                    query = query.gt("id", last_id)
+                response = query.order("id").limit(LOAD_BATCH_SIZE).execute()
+                users.extend(response.data)
+                if len(response.data) < LOAD_BATCH_SIZE:
+                    break
+                last_id = response.data[-1]["id"]
+        except Exception:
+            with self._lock:
+                self._changes = None
+            raise
+
+        with self._lock:
+            changes, self._changes = self._changes, None
+            self._reset()
+            pairs = []
+            for slot, user in enumerate(users):
+                self._slot_of[user["id"]] = slot
+                self._write_record(slot, user)
+                for token in _tokenize(user.get("username"), user.get("name")):
+                    pairs.append((sys.intern(token), slot))
+            pairs.sort()
+            self._tokens = [token for token, _ in pairs]
+            self._token_slots = array("I", (slot for _, slot in pairs))
+            self._ranked = array("q", sorted(_rank_key(level, slot) for slot, level in enumerate(self._levels)))
+            # Changes made while the table was being read may be missing from it
+            for change in changes.values():
+                if change["id"] in self._slot_of or "name" in change:
+                    self._apply(change)
+            self.ready = True
+
+    def upsert(self, user: dict):
+        bus.publish("users", {k: v for k, v in user.items() if k in INDEXED_FIELDS})
+
+    def set_level(self, user_id: str, level: int):
+        bus.publish("users", {"id": user_id, "level": level})
+
+    def deliver(self, change: dict):
+        with self._lock:
+            if self._changes is not None:
+                self._changes[change["id"]] = {**self._changes.get(change["id"], {}), **change}
+            if change["id"] in self._slot_of or "name" in change:
+                self._apply(change)
+
+    def _apply(self, user: dict):
+        slot = self._slot_of.get(user["id"])
+        if slot is None:
+            slot = len(self._offsets)
+            self._slot_of[user["id"]] = slot
+            old_tokens = set()
+            merged = user
+            self._write_record(slot, merged)
+            key = _rank_key(self._levels[slot], slot)
+            self._ranked.insert(bisect_left(self._ranked, key), key)
+        else:
+            current = self._read_record(slot)
+            old_tokens = _tokenize(current["username"], current["name"])
+            merged = {**current, **{k: v for k, v in user.items() if k in current}}
+            self._set_level(slot, merged.get("level") or 1)
+            self._write_record(slot, merged)
+
+        new_tokens = _tokenize(merged.get("username"), merged.get("name"))
+        for token in old_tokens - new_tokens:
+            self._remove_token(token, slot)
+        for token in new_tokens - old_tokens:
+            self._add_token(token, slot)
+
+    def get_many(self, user_ids: list) -> dict:
+        found = {}
+        with self._lock:
+            for user_id in user_ids:
+                slot = self._slot_of.get(user_id)
+                if slot is not None:
+                    found[user_id] = self._read_record(slot)
+        return found
+
+    def complete(self, prefix: str, limit: int = 10) -> list:
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+
+        with self._lock:
+            lo = bisect_left(self._tokens, prefix)
+            hi = bisect_left(self._tokens, prefix + "\U0010ffff")
+            if hi - lo <= MAX_CANDIDATES:
+                candidates = set(self._token_slots[lo:hi])
+                top = heapq.nlargest(limit, candidates, key=lambda slot: (self._levels[slot], -slot))
+                return [self._read_record(slot) for slot in top]
+
+            # Too many matches to rank; walk users from the highest level
+            # instead, which a prefix this common matches early
+            found = []
+            for key in self._ranked:
+                record = self._read_record(key & SLOT_MASK)
+                if any(token.startswith(prefix) for token in _tokenize(record["username"], record["name"])):
+                    found.append(record)
+                    if len(found) == limit:
+                        break
+            return found
+
+
+user_index = UserIndex()
+
+
+def get_user_summaries(ids: list) -> dict:
+    profiles = user_index.get_many(ids)
+
+    missing = list({i for i in ids if i not in profiles})
+    if missing:
+        response = supabase_admin.table("users").select(USER_SUMMARY_SELECT).in_("id", missing).execute()
+        profiles.update({u["id"]: fold_pending_xp(u) for u in response.data})
+
+    return profiles
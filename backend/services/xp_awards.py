@@ -0,0 +1,51 @@
+import logging
+from typing import Optional
+from supabase_client import supabase_admin
+from config import XP_COMPACT_BATCH_SIZE
+from services.events import emit, LEVEL_UP
+from services.leaderboard import leaderboard
+from services.user_index import user_index
+from services.xp_windows import xp_windows
+
+# Awards are appended to the xp_events ledger by record_xp_event, which also
+# returns the effective totals. The users row is only written by the
+# compactor, which folds pending events in batches.
+
+logger = logging.getLogger(__name__)
+
+def award_xp(user_id: str, amount: int, source: Optional[str] = None) -> Optional[dict]:
+    response = supabase_admin.rpc("record_xp_event", {
+        "p_user_id": user_id,
+        "p_amount": amount,
+        "p_source": source
+    }).execute()
+
+    if not response.data:
+        return None
+
+    row = response.data[0]
+    level_ups = max(0, row["level"] - row["previous_level"])
+
+    leaderboard.update(user_id, row["total_xp"])
+    xp_windows.update(user_id, row)
+    if level_ups:
+        user_index.set_level(user_id, row["level"])
+        emit(LEVEL_UP, user_id, level=row["level"], previous_level=row["previous_level"])
+
+    return {
+        "xp": row["xp"],
+        "level": row["level"],
+        "leveled_up": level_ups > 0,
+        "level_ups": level_ups
+    }
+
+def compact_xp_events():
+    compacted = 0
+    while True:
+        response = supabase_admin.rpc("compact_xp_events", {"p_batch_size": XP_COMPACT_BATCH_SIZE}).execute()
+        batch = response.data or 0
+        compacted += batch
+        if batch < XP_COMPACT_BATCH_SIZE:
+            break
+    if compacted:
+        logger.info("Compacted %d XP events", compacted)
@@ -0,0 +1,88 @@
+import threading
+from datetime import date, datetime, timedelta
+from typing import Optional
+from supabase_client import supabase_admin
+from config import XP_WEEKLY_RETENTION, XP_MONTHLY_RETENTION
+from services.leaderboard import Leaderboard, LOAD_BATCH_SIZE
+
+PERIODS = ("week", "month")
+
+# Weekly and monthly XP rankings. Counters live in xp_windows, folded in from
+# the XP ledger by the compactor; award_xp pushes effective totals into an
+# in-memory Leaderboard per current window. Boards for windows that have ended
+# are dropped and their rows deleted once they are older than the retention
+# setting.
+
+
+def window_start(period: str, day: Optional[date] = None) -> date:
+    day = day or datetime.utcnow().date()
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def _retention_cutoff(period: str, day: date) -> date:
+    start = window_start(period, day)
+    if period == "week":
+        return start - timedelta(weeks=XP_WEEKLY_RETENTION)
+    months = start.year * 12 + start.month - 1 - XP_MONTHLY_RETENTION
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def _window_loader(period: str, start: date):
+    def load():
+        # Compacted window XP plus pending ledger events, so a reconcile never
+        # rolls back awards the compactor has not reached yet
+        after = None
+        while True:
+            rows = supabase_admin.rpc("window_xp_totals", {
+                "p_period": period,
+                "p_window_start": start.isoformat(),
+                "p_after_user": after,
+                "p_limit": LOAD_BATCH_SIZE
+            }).execute().data or []
+            for row in rows:
+                yield row["user_id"], row["xp"]
+            if len(rows) < LOAD_BATCH_SIZE:
+                break
+            after = rows[-1]["user_id"]
+    return load
+
+
+class WindowedLeaderboards:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards = {}
+
+    def board(self, period: str) -> Leaderboard:
+        key = (period, window_start(period))
+        with self._lock:
+            board = self._boards.get(key)
+            if board is None:
+                board = Leaderboard(_window_loader(*key))
+                self._boards[key] = board
+            return board
+
+    def update(self, user_id: str, totals: dict):
+        for period in PERIODS:
+            key = (period, date.fromisoformat(totals[f"{period}_start"]))
+            with self._lock:
+                board = self._boards.get(key)
+            if board is not None:
+                board.update(user_id, totals[f"{period}_xp"])
+
+    def reconcile(self):
+        today = datetime.utcnow().date()
+        current = {(period, window_start(period, today)) for period in PERIODS}
+
+        with self._lock:
+            for key in list(self._boards):
+                if key not in current:
+                    del self._boards[key]
+
+        for period in PERIODS:
+            self.board(period).reconcile()
+            supabase_admin.table("xp_windows").delete().eq("period", period).lt("window_start", _retention_cutoff(period, today).isoformat()).execute()
+
+
+xp_windows = WindowedLeaderboards()
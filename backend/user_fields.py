@@ -0,0 +1,71 @@
+from fastapi import HTTPException
+from typing import Optional
+
+# Columns that may be read back from the users table. password_hash is
+# deliberately absent so it is never selected.
+USER_COLUMNS = (
+    "id",
+    "email",
+    "name",
+    "username",
+    "avatar_url",
+    "level",
+    "xp",
+    "streak_days",
+    "last_active_day",
+    "timezone",
+    "goals",
+    "activity_level",
+    "onboarding_completed",
+    "subscription_tier",
+    "subscription_active",
+    "created_at",
+    "updated_at"
+)
+
+USER_FIELD_PRESETS = {
+    "summary": ("id", "name", "username", "avatar_url", "level"),
+    "profile": (
+        "id",
+        "name",
+        "username",
+        "avatar_url",
+        "level",
+        "xp",
+        "streak_days",
+        "last_active_day",
+        "goals",
+        "activity_level",
+        "onboarding_completed",
+        "subscription_tier",
+        "created_at"
+    ),
+    "full": USER_COLUMNS
+}
+
+def _select(columns) -> str:
+    columns = list(columns)
+    # users.level/xp lag the XP ledger until compaction; pending_xp is a
+    # computed column so the delta comes back in the same query
+    if "level" in columns or "xp" in columns:
+        columns += ["level", "xp", "pending_xp"]
+    return ", ".join(dict.fromkeys(columns))
+
+def resolve_user_fields(fields: Optional[str]) -> str:
+    if not fields:
+        return _select(USER_COLUMNS)
+
+    if fields in USER_FIELD_PRESETS:
+        return _select(USER_FIELD_PRESETS[fields])
+
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in USER_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    if "id" not in requested:
+        requested.insert(0, "id")
+
+    return _select(requested)
+
+USER_SUMMARY_SELECT = resolve_user_fields("summary")
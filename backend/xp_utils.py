@@ -0,0 +1,29 @@
+XP_PER_LEVEL = 100
+
+# users.xp is progress within the current level; reaching level N + 1 takes
+# XP_PER_LEVEL * N, so lifetime XP is recoverable from (level, xp).
+
+def total_xp(level: int, xp: int) -> int:
+    return XP_PER_LEVEL * level * (level - 1) // 2 + xp
+
+def level_from_total(total: int) -> tuple:
+    level = 1
+    while total >= level * XP_PER_LEVEL:
+        total -= level * XP_PER_LEVEL
+        level += 1
+    return level, total
+
+def apply_xp(level: int, xp: int, amount: int) -> tuple:
+    new_xp = xp + amount
+    level_ups = 0
+    while new_xp >= level * XP_PER_LEVEL:
+        new_xp -= level * XP_PER_LEVEL
+        level += 1
+        level_ups += 1
+    return level, new_xp, level_ups
+
+def fold_pending_xp(row: dict) -> dict:
+    pending = row.pop("pending_xp", None)
+    if pending and "level" in row and "xp" in row:
+        row["level"], row["xp"] = level_from_total(max(0, total_xp(row["level"] or 1, row["xp"] or 0) + pending))
+    return row
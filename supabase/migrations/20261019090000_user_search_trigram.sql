@@ -0,0 +1,117 @@
+/*
+  # Trigram User Search
+
+  1. Extensions
+    - `pg_trgm` for trigram GIN indexes on free-text columns
+
+  2. Indexes
+    - `users_username_trgm_idx` - GIN trigram index on lower(username)
+    - `users_name_trgm_idx` - GIN trigram index on lower(name)
+    - `users_username_prefix_idx` / `users_name_prefix_idx` - B-tree indexes
+      on lower(username) / lower(name) in byte order, for prefix ranges
+
+  3. Functions
+    - `search_users_ranked(q, page_size, after_rank, after_username, after_id, max_hits)`
+      - Rank 0: exact username or name match
+      - Rank 1: username or name starts with the query
+      - Rank 2: username or name contains the query
+      - Rank 3: fuzzy (trigram similarity) match
+      - Queries shorter than three characters, which trigrams cannot
+        narrow, only match prefixes
+      - At most max_hits candidates are taken from each of the username
+        prefix range, the name prefix range and the substring/fuzzy
+        matches before ranking, so a common query costs at most three
+        bounded reads rather than a sort of every match
+      - Results ordered by (rank, lower(username), id) so the last row of a
+        page is a keyset cursor for the next one
+*/
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS users_username_trgm_idx ON users USING gin (lower(username) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS users_name_trgm_idx ON users USING gin (lower(name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS users_username_prefix_idx ON users ((lower(username) COLLATE "C"));
+CREATE INDEX IF NOT EXISTS users_name_prefix_idx ON users ((lower(name) COLLATE "C"));
+
+DROP FUNCTION IF EXISTS search_users_ranked(text, integer, integer, text, uuid);
+
+CREATE OR REPLACE FUNCTION search_users_ranked(
+  q text,
+  page_size integer DEFAULT 20,
+  after_rank integer DEFAULT NULL,
+  after_username text DEFAULT NULL,
+  after_id uuid DEFAULT NULL,
+  max_hits integer DEFAULT 1000
+)
+RETURNS TABLE (
+  id uuid,
+  name text,
+  username text,
+  avatar_url text,
+  level integer,
+  rank integer
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH needle AS (
+    SELECT
+      lower(trim(q)) AS term,
+      lower(trim(q)) COLLATE "C" AS lo,
+      (lower(trim(q)) || chr(1114111)) COLLATE "C" AS hi,
+      replace(replace(replace(lower(trim(q)), '\', '\\'), '%', '\%'), '_', '\_') AS pattern
+  ),
+  candidates AS (
+    (
+      SELECT u.id, u.name, u.username, u.avatar_url, u.level
+      FROM needle n
+      JOIN users u ON lower(u.username) COLLATE "C" >= n.lo AND lower(u.username) COLLATE "C" < n.hi
+      WHERE n.term <> ''
+      ORDER BY lower(u.username) COLLATE "C"
+      LIMIT GREATEST(max_hits, 1)
+    )
+    UNION
+    (
+      SELECT u.id, u.name, u.username, u.avatar_url, u.level
+      FROM needle n
+      JOIN users u ON lower(u.name) COLLATE "C" >= n.lo AND lower(u.name) COLLATE "C" < n.hi
+      WHERE n.term <> ''
+      ORDER BY lower(u.name) COLLATE "C"
+      LIMIT GREATEST(max_hits, 1)
+    )
+    UNION
+    (
+      SELECT u.id, u.name, u.username, u.avatar_url, u.level
+      FROM needle n
+      JOIN users u ON (
+        lower(u.username) LIKE '%' || n.pattern || '%'
+        OR lower(u.name) LIKE '%' || n.pattern || '%'
+        OR lower(u.username) % n.term
+        OR lower(u.name) % n.term
+      )
+      WHERE length(n.term) >= 3
+      LIMIT GREATEST(max_hits, 1)
+    )
+  ),
+  hits AS (
+    SELECT
+      c.id,
+      c.name,
+      c.username,
+      c.avatar_url,
+      c.level,
+      CASE
+        WHEN lower(c.username) = n.term OR lower(c.name) = n.term THEN 0
+        WHEN lower(c.username) LIKE n.pattern || '%' OR lower(c.name) LIKE n.pattern || '%' THEN 1
+        WHEN lower(c.username) LIKE '%' || n.pattern || '%' OR lower(c.name) LIKE '%' || n.pattern || '%' THEN 2
+        ELSE 3
+      END AS rank
+    FROM candidates c, needle n
+  )
+  SELECT h.id, h.name, h.username, h.avatar_url, h.level, h.rank
+  FROM hits h
+  WHERE after_rank IS NULL
+     OR (h.rank, lower(h.username), h.id) > (after_rank, after_username, after_id)
+  ORDER BY h.rank, lower(h.username), h.id
+  LIMIT LEAST(GREATEST(page_size, 1), 100);
+$$;
@@ -0,0 +1,59 @@
+/*
+  # Windowed XP Counters
+
+  1. New Tables
+    - `xp_windows`
+      - `period` (text) - Window granularity (week, month)
+      - `window_start` (date) - ISO week Monday or first day of the month (UTC)
+      - `user_id` (uuid, foreign key) - User earning the XP
+      - `xp` (integer) - XP earned inside the window
+      - `updated_at` (timestamptz) - Last increment
+
+  2. Indexes
+    - `xp_windows_rank_idx` on (period, window_start, xp DESC) so ranking a
+      window is an index range read
+
+  3. Functions
+    - `increment_window_xp(p_user_id, p_amount, p_week_start, p_month_start)`
+      - Upserts the week and month counters in one statement and returns the
+        new totals
+
+  4. Security
+    - Enable RLS; authenticated users can read all window totals
+*/
+
+CREATE TABLE IF NOT EXISTS xp_windows (
+  period text NOT NULL CHECK (period IN ('week', 'month')),
+  window_start date NOT NULL,
+  user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  xp integer NOT NULL DEFAULT 0,
+  updated_at timestamptz DEFAULT now(),
+  PRIMARY KEY (period, window_start, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS xp_windows_rank_idx ON xp_windows(period, window_start, xp DESC);
+
+ALTER TABLE xp_windows ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Anyone authenticated can read window totals"
+  ON xp_windows FOR SELECT
+  TO authenticated
+  USING (true);
+
+CREATE OR REPLACE FUNCTION increment_window_xp(
+  p_user_id uuid,
+  p_amount integer,
+  p_week_start date,
+  p_month_start date
+)
+RETURNS TABLE (period text, window_start date, xp integer)
+LANGUAGE sql
+AS $$
+  INSERT INTO xp_windows AS w (period, window_start, user_id, xp)
+  VALUES
+    ('week', p_week_start, p_user_id, p_amount),
+    ('month', p_month_start, p_user_id, p_amount)
+  ON CONFLICT (period, window_start, user_id)
+  DO UPDATE SET xp = w.xp + EXCLUDED.xp, updated_at = now()
+  RETURNING w.period, w.window_start, w.xp;
+$$;
@@ -0,0 +1,66 @@
+/*
+  # Streak Tracking
+
+  1. Changes to `users`
+    - `last_active_day` (date, nullable) - Last local calendar day with activity
+    - `timezone` (text, default 'UTC') - IANA zone used to decide the local day
+
+  2. Indexes
+    - `users_streak_active_idx` - partial index on last_active_day for users
+      with a live streak, used by the bulk reset
+
+  3. Functions
+    - `record_activity(p_user_id)` - Advances the streak for today in the
+      user's timezone. Repeat calls on the same local day do not write.
+      Returns the streak and when the local day ends.
+    - `reset_broken_streaks()` - Zeroes every streak whose last active day is
+      before yesterday (local), in one statement. Returns the number of rows reset.
+*/
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS last_active_day date;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS timezone text DEFAULT 'UTC';
+
+CREATE INDEX IF NOT EXISTS users_streak_active_idx ON users(last_active_day) WHERE streak_days > 0;
+
+CREATE OR REPLACE FUNCTION record_activity(p_user_id uuid)
+RETURNS TABLE (streak_days integer, last_active_day date, day_ends_at timestamptz)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_tz text;
+  v_today date;
+BEGIN
+  SELECT coalesce(u.timezone, 'UTC') INTO v_tz FROM users u WHERE u.id = p_user_id;
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+
+  v_today := (now() AT TIME ZONE v_tz)::date;
+
+  UPDATE users u
+  SET
+    streak_days = CASE WHEN u.last_active_day = v_today - 1 THEN u.streak_days + 1 ELSE 1 END,
+    last_active_day = v_today
+  WHERE u.id = p_user_id
+    AND (u.last_active_day IS NULL OR u.last_active_day < v_today);
+
+  RETURN QUERY
+  SELECT u.streak_days, u.last_active_day, ((v_today + 1)::timestamp AT TIME ZONE v_tz)
+  FROM users u
+  WHERE u.id = p_user_id;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION reset_broken_streaks()
+RETURNS integer
+LANGUAGE sql
+AS $$
+  WITH reset AS (
+    UPDATE users
+    SET streak_days = 0
+    WHERE streak_days > 0
+      AND last_active_day < (now() AT TIME ZONE coalesce(timezone, 'UTC'))::date - 1
+    RETURNING 1
+  )
+  SELECT count(*)::integer FROM reset;
+$$;
@@ -0,0 +1,232 @@
+/*
+  # Append-only XP Ledger
+
+  1. New Tables
+    - `xp_events`
+      - `id` (bigint, identity) - Monotonic event id
+      - `user_id` (uuid, foreign key) - User receiving the XP
+      - `amount` (integer) - XP delta
+      - `source` (text, nullable) - What awarded it (scan:body, manual, ...)
+      - `created_at` (timestamptz) - When it was awarded
+      - `compacted_at` (timestamptz, nullable) - When it was folded into users and xp_windows
+
+  2. Functions
+    - `xp_total(level, xp)` / `xp_level(total)` - Lifetime XP <-> level math
+      (level N + 1 costs 100 * N XP)
+    - `pending_xp(users)` - Computed column with the user's uncompacted XP
+    - `record_xp_event(p_user_id, p_amount, p_source)` - Appends one event and
+      returns effective totals (compacted + pending). Awards for one user
+      are serialized by a transaction-level advisory lock on the user id, so
+      they are totalled one after the other and a level-up is reported once;
+      the users row is neither locked nor written
+    - `window_xp_totals(p_period, p_window_start, p_after_user, p_limit)` -
+      Effective window XP per user (xp_windows + pending events), paged by
+      user id, for rebuilding the window leaderboards
+    - `compact_xp_events(p_batch_size)` - Folds a batch of pending events into
+      users.level/xp and xp_windows. SKIP LOCKED lets several workers compact
+      concurrently.
+
+  3. Changes
+    - `increment_window_xp` is dropped; window counters are now projections
+      of the ledger
+
+  4. Security
+    - Enable RLS; users can read their own ledger
+*/
+
+CREATE TABLE IF NOT EXISTS xp_events (
+  id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  amount integer NOT NULL,
+  source text,
+  created_at timestamptz DEFAULT now(),
+  compacted_at timestamptz
+);
+
+CREATE INDEX IF NOT EXISTS xp_events_user_id_idx ON xp_events(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS xp_events_pending_user_idx ON xp_events(user_id) WHERE compacted_at IS NULL;
+CREATE INDEX IF NOT EXISTS xp_events_pending_id_idx ON xp_events(id) WHERE compacted_at IS NULL;
+
+ALTER TABLE xp_events ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read own xp events"
+  ON xp_events FOR SELECT
+  TO authenticated
+  USING (auth.uid() = user_id);
+
+CREATE OR REPLACE FUNCTION xp_total(p_level integer, p_xp integer)
+RETURNS integer
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT 50 * coalesce(p_level, 1) * (coalesce(p_level, 1) - 1) + coalesce(p_xp, 0);
+$$;
+
+CREATE OR REPLACE FUNCTION xp_level(p_total integer)
+RETURNS integer
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+DECLARE
+  v_level integer;
+BEGIN
+  v_level := greatest(1, floor((1 + sqrt(1 + 0.08 * greatest(p_total, 0))) / 2)::integer);
+  WHILE v_level > 1 AND 50 * v_level * (v_level - 1) > p_total LOOP
+    v_level := v_level - 1;
+  END LOOP;
+  WHILE 50 * (v_level + 1) * v_level <= p_total LOOP
+    v_level := v_level + 1;
+  END LOOP;
+  RETURN v_level;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION pending_xp(users)
+RETURNS integer
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT coalesce(sum(e.amount), 0)::integer
+  FROM xp_events e
+  WHERE e.user_id = $1.id AND e.compacted_at IS NULL;
+$$;
+
+DROP FUNCTION IF EXISTS increment_window_xp(uuid, integer, date, date);
+
+CREATE OR REPLACE FUNCTION record_xp_event(p_user_id uuid, p_amount integer, p_source text DEFAULT NULL)
+RETURNS TABLE (
+  level integer,
+  xp integer,
+  total_xp integer,
+  previous_level integer,
+  week_start date,
+  week_xp integer,
+  month_start date,
+  month_xp integer
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+BEGIN
+  -- Taken before the totals are read: the next statement gets a fresh
+  -- snapshot that includes any concurrent award that held the lock
+  PERFORM pg_advisory_xact_lock(hashtextextended('xp_events:' || p_user_id::text, 0));
+
+  RETURN QUERY
+  WITH bounds AS (
+    SELECT
+      date_trunc('week', now() AT TIME ZONE 'UTC')::date AS week_start,
+      date_trunc('month', now() AT TIME ZONE 'UTC')::date AS month_start
+  ),
+  base AS (
+    SELECT
+      greatest(0, xp_total(u.level, u.xp) + p.pending) AS before_total,
+      p.pending_week,
+      p.pending_month,
+      coalesce((SELECT w.xp FROM xp_windows w WHERE w.period = 'week' AND w.window_start = b.week_start AND w.user_id = u.id), 0) AS week_base,
+      coalesce((SELECT w.xp FROM xp_windows w WHERE w.period = 'month' AND w.window_start = b.month_start AND w.user_id = u.id), 0) AS month_base,
+      b.week_start,
+      b.month_start
+    FROM users u
+    CROSS JOIN bounds b
+    CROSS JOIN LATERAL (
+      SELECT
+        coalesce(sum(e.amount), 0)::integer AS pending,
+        coalesce(sum(e.amount) FILTER (WHERE e.created_at >= b.week_start::timestamp AT TIME ZONE 'UTC'), 0)::integer AS pending_week,
+        coalesce(sum(e.amount) FILTER (WHERE e.created_at >= b.month_start::timestamp AT TIME ZONE 'UTC'), 0)::integer AS pending_month
+      FROM xp_events e
+      WHERE e.user_id = u.id AND e.compacted_at IS NULL
+    ) p
+    WHERE u.id = p_user_id
+  ),
+  inserted AS (
+    INSERT INTO xp_events (user_id, amount, source)
+    SELECT p_user_id, p_amount, p_source FROM base
+    RETURNING id
+  )
+  SELECT
+    xp_level(greatest(0, base.before_total + p_amount)),
+    greatest(0, base.before_total + p_amount) - xp_total(xp_level(greatest(0, base.before_total + p_amount)), 0),
+    greatest(0, base.before_total + p_amount),
+    xp_level(base.before_total),
+    base.week_start,
+    base.week_base + base.pending_week + p_amount,
+    base.month_start,
+    base.month_base + base.pending_month + p_amount
+  FROM base;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION window_xp_totals(p_period text, p_window_start date, p_after_user uuid DEFAULT NULL, p_limit integer DEFAULT 1000)
+RETURNS TABLE (user_id uuid, xp integer)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT t.user_id, sum(t.xp)::integer
+  FROM (
+    SELECT w.user_id, w.xp
+    FROM xp_windows w
+    WHERE w.period = p_period AND w.window_start = p_window_start
+    UNION ALL
+    SELECT e.user_id, e.amount
+    FROM xp_events e
+    WHERE e.compacted_at IS NULL
+      AND date_trunc(p_period, e.created_at AT TIME ZONE 'UTC')::date = p_window_start
+  ) AS t
+  WHERE p_after_user IS NULL OR t.user_id > p_after_user
+  GROUP BY t.user_id
+  ORDER BY t.user_id
+  LIMIT LEAST(GREATEST(p_limit, 1), 5000);
+$$;
+
+CREATE OR REPLACE FUNCTION compact_xp_events(p_batch_size integer DEFAULT 5000)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_count integer;
+BEGIN
+  WITH batch AS (
+    SELECT e.id
+    FROM xp_events e
+    WHERE e.compacted_at IS NULL
+    ORDER BY e.id
+    LIMIT p_batch_size
+    FOR UPDATE SKIP LOCKED
+  ),
+  compacted AS (
+    UPDATE xp_events e
+    SET compacted_at = now()
+    FROM batch b
+    WHERE e.id = b.id
+    RETURNING e.user_id, e.amount, e.created_at
+  ),
+  totals AS (
+    UPDATE users u
+    SET
+      level = xp_level(greatest(0, xp_total(u.level, u.xp) + d.amount)),
+      xp = greatest(0, xp_total(u.level, u.xp) + d.amount) - xp_total(xp_level(greatest(0, xp_total(u.level, u.xp) + d.amount)), 0)
+    FROM (
+      SELECT c.user_id, sum(c.amount)::integer AS amount
+      FROM compacted c
+      GROUP BY c.user_id
+    ) d
+    WHERE u.id = d.user_id
+  ),
+  windows AS (
+    INSERT INTO xp_windows AS w (period, window_start, user_id, xp)
+    SELECT 'week', date_trunc('week', c.created_at AT TIME ZONE 'UTC')::date, c.user_id, sum(c.amount)::integer
+    FROM compacted c
+    GROUP BY 2, 3
+    UNION ALL
+    SELECT 'month', date_trunc('month', c.created_at AT TIME ZONE 'UTC')::date, c.user_id, sum(c.amount)::integer
+    FROM compacted c
+    GROUP BY 2, 3
+    ON CONFLICT (period, window_start, user_id)
+    DO UPDATE SET xp = w.xp + EXCLUDED.xp, updated_at = now()
+  )
+  SELECT count(*)::integer INTO v_count FROM compacted;
+
+  RETURN v_count;
+END;
+$$;
@@ -0,0 +1,104 @@
+/*
+  # Achievements
+
+  1. New Tables
+    - `user_counters`
+      - `user_id` (uuid, foreign key) - Counter owner
+      - `counter` (text) - Counter name (scans, scans:body, posts, ...)
+      - `value` (bigint) - Running total
+      - Primary key (user_id, counter)
+
+    - `user_achievements`
+      - `user_id` (uuid, foreign key) - User holding the badge
+      - `achievement_id` (text) - Achievement key from the rule catalog
+      - `awarded_at` (timestamptz) - When it was unlocked
+      - Primary key (user_id, achievement_id) so awards are idempotent
+
+  2. Backfill
+    - `user_counters` is seeded from existing scans, posts, comments and chat
+      messages, and badges whose threshold is already passed are awarded
+      without XP, so existing users do not unlock them a second time
+
+  3. Functions
+    - `bump_user_counters(p_user_ids, p_counters, p_deltas)` - Adds
+      p_deltas[i] to counter p_counters[i] of user p_user_ids[i] in a single
+      upsert and returns the new values; one call per batch of events
+
+  4. Security
+    - Enable RLS; users can read their own counters, anyone authenticated can
+      read achievements
+*/
+
+CREATE TABLE IF NOT EXISTS user_counters (
+  user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  counter text NOT NULL,
+  value bigint NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, counter)
+);
+
+CREATE TABLE IF NOT EXISTS user_achievements (
+  user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  achievement_id text NOT NULL,
+  awarded_at timestamptz DEFAULT now(),
+  PRIMARY KEY (user_id, achievement_id)
+);
+
+ALTER TABLE user_counters ENABLE ROW LEVEL SECURITY;
+ALTER TABLE user_achievements ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read own counters"
+  ON user_counters FOR SELECT
+  TO authenticated
+  USING (auth.uid() = user_id);
+
+CREATE POLICY "Anyone authenticated can read achievements"
+  ON user_achievements FOR SELECT
+  TO authenticated
+  USING (true);
+
+INSERT INTO user_counters (user_id, counter, value)
+SELECT s.user_id, s.counter, count(*)
+FROM (
+  SELECT user_id, 'scans' AS counter FROM scans
+  UNION ALL
+  SELECT user_id, 'scans:' || scan_type FROM scans
+  UNION ALL
+  SELECT user_id, 'posts' FROM posts WHERE type IS DISTINCT FROM 'achievement'
+  UNION ALL
+  SELECT (c->>'user_id')::uuid, 'comments'
+  FROM posts p, jsonb_array_elements(coalesce(p.comments, '[]'::jsonb)) AS c
+  WHERE c->>'user_id' ~* '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+  UNION ALL
+  SELECT user_id, 'messages' FROM chat_messages
+) AS s
+JOIN users u ON u.id = s.user_id
+GROUP BY s.user_id, s.counter
+ON CONFLICT (user_id, counter) DO UPDATE SET value = EXCLUDED.value;
+
+-- Mirrors the counter rules in services/achievements.py at the time of this migration
+INSERT INTO user_achievements (user_id, achievement_id)
+SELECT c.user_id, t.achievement_id
+FROM user_counters c
+JOIN (VALUES
+  ('scans', 1, 'first_scan'),
+  ('scans', 25, 'scan_regular'),
+  ('scans:body', 10, 'body_tracker'),
+  ('scans:face', 10, 'glow_getter'),
+  ('scans:food', 10, 'meal_logger'),
+  ('posts', 1, 'first_post'),
+  ('posts', 50, 'storyteller'),
+  ('comments', 1, 'first_comment'),
+  ('messages', 100, 'chatterbox')
+) AS t(counter, threshold, achievement_id) ON t.counter = c.counter AND c.value >= t.threshold
+ON CONFLICT (user_id, achievement_id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_user_counters(p_user_ids uuid[], p_counters text[], p_deltas integer[])
+RETURNS TABLE (user_id uuid, counter text, value bigint)
+LANGUAGE sql
+AS $$
+  INSERT INTO user_counters AS c (user_id, counter, value)
+  SELECT b.user_id, b.counter, b.delta
+  FROM unnest(p_user_ids, p_counters, p_deltas) AS b(user_id, counter, delta)
+  ON CONFLICT (user_id, counter) DO UPDATE SET value = c.value + EXCLUDED.value
+  RETURNING c.user_id, c.counter, c.value;
+$$;
@@ -0,0 +1,332 @@
+/*
+  # Follow Graph and Home Timelines
+
+  1. New Tables
+    - `follows`
+      - `follower_id` (uuid, foreign key) - User who follows
+      - `followee_id` (uuid, foreign key) - User being followed
+      - `created_at` (timestamptz)
+      - Primary key (follower_id, followee_id) is the sorted "following" list;
+        `follows_followee_idx` is the sorted "followers" list
+
+    - `home_timelines`
+      - `user_id` (uuid, foreign key) - Timeline owner
+      - `post_ts` (timestamptz) - Post timestamp, the sort key
+      - `post_id` (uuid, foreign key) - Post
+      - `author_id` (uuid) - Post author, so unfollows and celebrity
+        promotion can prune cheaply
+      - `added_at` (timestamptz) - When the entry was written, so trimming
+        only visits timelines that grew since the last pass
+      - Capped per user by `trim_home_timelines`
+
+    - `home_timeline_trims`
+      - One row: where the last trim pass started
+
+    - `celebrities`
+      - `user_id` (uuid, primary key) - Authors whose posts are pulled on read
+        instead of fanned out
+
+  2. Triggers
+    - Follower and following counts are kept in user_counters
+
+  3. Functions
+    - `follow_user(p_follower_id, p_followee_id, p_backfill)` / `unfollow_user(...)`
+    - `fan_out_post(p_post_id, p_celebrity_threshold)` - Copies a post into
+      every follower's timeline in one statement, or marks the author as a
+      celebrity once they pass the threshold
+    - `home_feed(p_user_id, p_limit, p_before_ts, p_before_id)` - One page of
+      the home feed: a timeline range read merged with celebrity pulls
+    - `trim_home_timelines(p_cap)` - Drops entries past the cap from
+      timelines written to since the previous pass
+
+  4. Security
+    - Enable RLS; follows are public, timelines are private
+*/
+
+CREATE TABLE IF NOT EXISTS follows (
+  follower_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  followee_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  created_at timestamptz DEFAULT now(),
+  PRIMARY KEY (follower_id, followee_id),
+  CHECK (follower_id <> followee_id)
+);
+
+CREATE INDEX IF NOT EXISTS follows_followee_idx ON follows(followee_id, follower_id);
+
+CREATE TABLE IF NOT EXISTS home_timelines (
+  user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  post_ts timestamptz NOT NULL,
+  post_id uuid NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+  author_id uuid NOT NULL,
+  added_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (user_id, post_id)
+);
+
+CREATE INDEX IF NOT EXISTS home_timelines_page_idx ON home_timelines(user_id, post_ts DESC, post_id DESC);
+-- author_id first so promotion's author-wide delete is a range too
+CREATE INDEX IF NOT EXISTS home_timelines_author_idx ON home_timelines(author_id, user_id);
+-- Rows arrive in added_at order, so a BRIN index is enough to find recent ones
+CREATE INDEX IF NOT EXISTS home_timelines_added_at_idx ON home_timelines USING brin(added_at);
+
+CREATE TABLE IF NOT EXISTS home_timeline_trims (
+  id boolean PRIMARY KEY DEFAULT true CHECK (id),
+  started_at timestamptz NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS celebrities (
+  user_id uuid PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+  promoted_at timestamptz DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS posts_user_timestamp_idx ON posts(user_id, timestamp DESC, id DESC);
+
+ALTER TABLE follows ENABLE ROW LEVEL SECURITY;
+ALTER TABLE home_timelines ENABLE ROW LEVEL SECURITY;
+ALTER TABLE celebrities ENABLE ROW LEVEL SECURITY;
+ALTER TABLE home_timeline_trims ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Anyone authenticated can read follows"
+  ON follows FOR SELECT
+  TO authenticated
+  USING (true);
+
+CREATE POLICY "Users can follow"
+  ON follows FOR INSERT
+  TO authenticated
+  WITH CHECK (auth.uid() = follower_id);
+
+CREATE POLICY "Users can unfollow"
+  ON follows FOR DELETE
+  TO authenticated
+  USING (auth.uid() = follower_id);
+
+CREATE POLICY "Users can read own timeline"
+  ON home_timelines FOR SELECT
+  TO authenticated
+  USING (auth.uid() = user_id);
+
+CREATE OR REPLACE FUNCTION update_follow_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO user_counters AS c (user_id, counter, value)
+    VALUES (NEW.followee_id, 'followers', 1), (NEW.follower_id, 'following', 1)
+    ON CONFLICT (user_id, counter) DO UPDATE SET value = c.value + 1;
+    RETURN NEW;
+  END IF;
+
+  UPDATE user_counters SET value = greatest(0, value - 1)
+  WHERE (user_id = OLD.followee_id AND counter = 'followers')
+     OR (user_id = OLD.follower_id AND counter = 'following');
+  RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER follows_update_counts
+  AFTER INSERT OR DELETE ON follows
+  FOR EACH ROW
+  EXECUTE FUNCTION update_follow_counts();
+
+CREATE OR REPLACE FUNCTION follow_user(p_follower_id uuid, p_followee_id uuid, p_backfill integer DEFAULT 20)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  INSERT INTO follows (follower_id, followee_id)
+  VALUES (p_follower_id, p_followee_id)
+  ON CONFLICT DO NOTHING;
+
+  IF NOT FOUND THEN
+    RETURN false;
+  END IF;
+
+  IF NOT EXISTS (SELECT 1 FROM celebrities c WHERE c.user_id = p_followee_id) THEN
+    INSERT INTO home_timelines (user_id, post_ts, post_id, author_id)
+    SELECT p_follower_id, p.timestamp, p.id, p.user_id
+    FROM posts p
+    WHERE p.user_id = p_followee_id
+    ORDER BY p.timestamp DESC, p.id DESC
+    LIMIT p_backfill
+    ON CONFLICT DO NOTHING;
+  END IF;
+
+  RETURN true;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION unfollow_user(p_follower_id uuid, p_followee_id uuid)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  DELETE FROM follows f
+  WHERE f.follower_id = p_follower_id AND f.followee_id = p_followee_id;
+
+  IF NOT FOUND THEN
+    RETURN false;
+  END IF;
+
+  DELETE FROM home_timelines h
+  WHERE h.user_id = p_follower_id AND h.author_id = p_followee_id;
+
+  RETURN true;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION fan_out_post(p_post_id uuid, p_celebrity_threshold integer)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_author uuid;
+  v_ts timestamptz;
+  v_followers bigint;
+  v_count integer;
+BEGIN
+  SELECT p.user_id, p.timestamp INTO v_author, v_ts FROM posts p WHERE p.id = p_post_id;
+  IF NOT FOUND THEN
+    RETURN 0;
+  END IF;
+
+  INSERT INTO home_timelines (user_id, post_ts, post_id, author_id)
+  VALUES (v_author, v_ts, p_post_id, v_author)
+  ON CONFLICT DO NOTHING;
+
+  IF EXISTS (SELECT 1 FROM celebrities c WHERE c.user_id = v_author) THEN
+    RETURN 0;
+  END IF;
+
+  SELECT coalesce(max(c.value), 0) INTO v_followers
+  FROM user_counters c
+  WHERE c.user_id = v_author AND c.counter = 'followers';
+
+  IF v_followers >= p_celebrity_threshold THEN
+    INSERT INTO celebrities (user_id) VALUES (v_author) ON CONFLICT DO NOTHING;
+    -- Followers now pull this author on read; drop the pushed copies so
+    -- their timelines do not hold a stale subset
+    DELETE FROM home_timelines h WHERE h.author_id = v_author AND h.user_id <> v_author;
+    RETURN 0;
+  END IF;
+
+  INSERT INTO home_timelines (user_id, post_ts, post_id, author_id)
+  SELECT f.follower_id, v_ts, p_post_id, v_author
+  FROM follows f
+  WHERE f.followee_id = v_author
+  ON CONFLICT DO NOTHING;
+
+  GET DIAGNOSTICS v_count = ROW_COUNT;
+  RETURN v_count;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION home_feed(
+  p_user_id uuid,
+  p_limit integer DEFAULT 20,
+  p_before_ts timestamptz DEFAULT NULL,
+  p_before_id uuid DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  user_id uuid,
+  content text,
+  type text,
+  likes integer,
+  comments integer,
+  share_count integer,
+  is_liked boolean,
+  media jsonb,
+  xp_earned integer,
+  "timestamp" timestamptz
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH pushed AS (
+    SELECT h.post_id, h.post_ts
+    FROM home_timelines h
+    WHERE h.user_id = p_user_id
+      AND (p_before_ts IS NULL OR (h.post_ts, h.post_id) < (p_before_ts, p_before_id))
+    ORDER BY h.post_ts DESC, h.post_id DESC
+    LIMIT p_limit
+  ),
+  pulled AS (
+    SELECT cp.id AS post_id, cp.timestamp AS post_ts
+    FROM celebrities c
+    JOIN follows f ON f.follower_id = p_user_id AND f.followee_id = c.user_id
+    CROSS JOIN LATERAL (
+      SELECT p.id, p.timestamp
+      FROM posts p
+      WHERE p.user_id = c.user_id
+        AND (p_before_ts IS NULL OR (p.timestamp, p.id) < (p_before_ts, p_before_id))
+      ORDER BY p.timestamp DESC, p.id DESC
+      LIMIT p_limit
+    ) cp
+  ),
+  page AS (
+    SELECT * FROM pushed
+    UNION
+    SELECT * FROM pulled
+    ORDER BY post_ts DESC, post_id DESC
+    LIMIT p_limit
+  )
+  SELECT
+    p.id,
+    p.user_id,
+    p.content,
+    p.type,
+    p.likes,
+    jsonb_array_length(coalesce(p.comments, '[]'::jsonb)),
+    p.share_count,
+    coalesce(p.likes_by, '[]'::jsonb) ? p_user_id::text,
+    p.media,
+    p.xp_earned,
+    p.timestamp
+  FROM page
+  JOIN posts p ON p.id = page.post_id
+  ORDER BY page.post_ts DESC, page.post_id DESC;
+$$;
+
+CREATE OR REPLACE FUNCTION trim_home_timelines(p_cap integer)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_since timestamptz;
+  v_count integer;
+BEGIN
+  SELECT t.started_at INTO v_since FROM home_timeline_trims t FOR UPDATE;
+
+  -- Only timelines written since the previous pass can have grown past the
+  -- cap. The overlap covers writes whose transactions started before that
+  -- pass but committed after it.
+  WITH touched AS (
+    SELECT DISTINCT h.user_id
+    FROM home_timelines h
+    WHERE h.added_at >= coalesce(v_since - interval '5 minutes', '-infinity')
+  ),
+  edges AS (
+    SELECT t.user_id, e.post_ts, e.post_id
+    FROM touched t
+    CROSS JOIN LATERAL (
+      SELECT h.post_ts, h.post_id
+      FROM home_timelines h
+      WHERE h.user_id = t.user_id
+      ORDER BY h.post_ts DESC, h.post_id DESC
+      OFFSET p_cap
+      LIMIT 1
+    ) e
+  ),
+  trimmed AS (
+    DELETE FROM home_timelines h
+    USING edges e
+    WHERE h.user_id = e.user_id AND (h.post_ts, h.post_id) <= (e.post_ts, e.post_id)
+    RETURNING 1
+  )
+  SELECT count(*)::integer INTO v_count FROM trimmed;
+
+  INSERT INTO home_timeline_trims (id, started_at) VALUES (true, now())
+  ON CONFLICT (id) DO UPDATE SET started_at = EXCLUDED.started_at;
+
+  RETURN v_count;
+END;
+$$;
@@ -0,0 +1,82 @@
+/*
+  # Write-Behind Post Counters
+
+  1. Modified Tables
+    - `posts`
+      - `view_count` (integer) - Number of views
+
+  2. New Tables
+    - `post_counter_batches`
+      - `batch_id` (uuid, primary key) - Id of a flushed counter batch
+      - `applied_at` (timestamptz) - When the batch was applied
+      - Lets a batch replayed from a worker's local log apply at most once
+
+  3. Functions
+    - `apply_post_counter_deltas(p_batch_id, p_deltas)` - Applies a batch of
+      per-post deltas as one UPDATE. Each delta carries `post_id`, `shares`,
+      `views` and the `liked` / `unliked` user ids; `likes` is recomputed from
+      the resulting `likes_by`. Returns false if the batch was already applied.
+      Batch ids older than a day are pruned on the way.
+*/
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS view_count integer DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS post_counter_batches (
+  batch_id uuid PRIMARY KEY,
+  applied_at timestamptz DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS post_counter_batches_applied_at_idx ON post_counter_batches(applied_at);
+
+ALTER TABLE post_counter_batches ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION apply_post_counter_deltas(p_batch_id uuid, p_deltas jsonb)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  INSERT INTO post_counter_batches (batch_id)
+  VALUES (p_batch_id)
+  ON CONFLICT DO NOTHING;
+
+  IF NOT FOUND THEN
+    RETURN false;
+  END IF;
+
+  -- likes_by is merged against the row being updated (not a snapshot), so
+  -- concurrent batches from other workers do not overwrite each other; likes
+  -- is recomputed from the merged array only when the batch changed it
+  UPDATE posts p
+  SET
+    (likes_by, likes) = (
+      SELECT m.likes_by, CASE WHEN d.touches_likes THEN jsonb_array_length(m.likes_by) ELSE p.likes END
+      FROM (
+        SELECT coalesce(jsonb_agg(l.u), '[]'::jsonb) AS likes_by
+        FROM (
+          SELECT jsonb_array_elements_text(coalesce(p.likes_by, '[]'::jsonb))
+          EXCEPT
+          SELECT jsonb_array_elements_text(d.unliked)
+          UNION
+          SELECT jsonb_array_elements_text(d.liked)
+        ) AS l(u)
+      ) AS m
+    ),
+    share_count = coalesce(p.share_count, 0) + d.shares,
+    view_count = coalesce(p.view_count, 0) + d.views
+  FROM (
+    SELECT
+      d.post_id,
+      coalesce(d.shares, 0) AS shares,
+      coalesce(d.views, 0) AS views,
+      coalesce(d.liked, '[]'::jsonb) AS liked,
+      coalesce(d.unliked, '[]'::jsonb) AS unliked,
+      jsonb_array_length(coalesce(d.liked, '[]'::jsonb)) > 0 OR jsonb_array_length(coalesce(d.unliked, '[]'::jsonb)) > 0 AS touches_likes
+    FROM jsonb_to_recordset(p_deltas) AS d(post_id uuid, shares integer, views integer, liked jsonb, unliked jsonb)
+  ) AS d
+  WHERE p.id = d.post_id;
+
+  DELETE FROM post_counter_batches b WHERE b.applied_at < now() - interval '1 day';
+
+  RETURN true;
+END;
+$$;
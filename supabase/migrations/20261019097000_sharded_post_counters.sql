@@ -0,0 +1,316 @@
+/*
+  # Sharded Counters for Hot Posts
+
+  1. New Tables
+    - `sharded_posts`
+      - `post_id` (uuid, primary key) - Post whose counters are sharded
+      - `shards` (smallint) - Number of counter shards
+      - `promoted_at` (timestamptz) - When the post was promoted
+
+    - `post_counter_shards`
+      - `post_id` (uuid, foreign key) - Sharded post
+      - `shard` (smallint) - Shard number, 0 .. shards - 1
+      - `likes`, `shares`, `views` (bigint) - Deltas since promotion
+      - Primary key (post_id, shard)
+
+    - `post_likes`
+      - `post_id` (uuid, foreign key) - Sharded post
+      - `user_id` (uuid, foreign key) - User who liked it
+      - Primary key (post_id, user_id); holds likes_by while a post is sharded
+
+    - `post_write_rates`
+      - `post_id` (uuid) - Post that was written
+      - `window_start` (timestamptz) - Start of the reporting window
+      - `writes` (bigint) - Counter writes reported by all workers in it
+      - Primary key (post_id, window_start)
+
+  2. Functions
+    - `promote_post_counters(p_post_id, p_shards)` - Creates the shards and
+      moves likes_by into post_likes. The posts row keeps the base counts.
+    - `demote_post_counters(p_post_id)` - Folds shards and post_likes back
+      into the posts row and drops them
+    - `post_counter_totals(p_post_ids)` - Summed shard deltas per post
+    - `apply_post_counter_deltas(p_batch_id, p_deltas)` - Now sends deltas
+      for sharded posts to one randomly chosen shard per post, and like
+      membership to post_likes, so the posts row is not written
+    - `rebalance_post_counters(p_writes, p_window_seconds, p_shards,
+      p_promote_rate, p_demote_rate, p_min_sharded_seconds)` - Adds a
+      worker's write counts to the current window, then promotes and demotes
+      from the last complete window summed over all workers, and returns the
+      sharded posts. Every worker sees the same totals, and promotion and
+      demotion use different rates, so a post near a threshold does not flip
+      between modes from one worker to the next
+    - Promotion and demotion take an exclusive advisory lock per post and
+      batches take it shared, so a batch never straddles a mode switch
+*/
+
+CREATE TABLE IF NOT EXISTS sharded_posts (
+  post_id uuid PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+  shards smallint NOT NULL,
+  promoted_at timestamptz DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS post_counter_shards (
+  post_id uuid NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+  shard smallint NOT NULL,
+  likes bigint NOT NULL DEFAULT 0,
+  shares bigint NOT NULL DEFAULT 0,
+  views bigint NOT NULL DEFAULT 0,
+  PRIMARY KEY (post_id, shard)
+);
+
+CREATE TABLE IF NOT EXISTS post_likes (
+  post_id uuid NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+  user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  liked_at timestamptz DEFAULT now(),
+  PRIMARY KEY (post_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS post_likes_user_id_idx ON post_likes(user_id);
+
+CREATE TABLE IF NOT EXISTS post_write_rates (
+  post_id uuid NOT NULL,
+  window_start timestamptz NOT NULL,
+  writes bigint NOT NULL DEFAULT 0,
+  PRIMARY KEY (post_id, window_start)
+);
+
+CREATE INDEX IF NOT EXISTS post_write_rates_window_start_idx ON post_write_rates(window_start);
+
+ALTER TABLE sharded_posts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE post_counter_shards ENABLE ROW LEVEL SECURITY;
+ALTER TABLE post_likes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE post_write_rates ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Anyone authenticated can read post likes"
+  ON post_likes FOR SELECT
+  TO authenticated
+  USING (true);
+
+CREATE OR REPLACE FUNCTION promote_post_counters(p_post_id uuid, p_shards integer)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtextextended(p_post_id::text, 0));
+
+  INSERT INTO sharded_posts (post_id, shards)
+  SELECT p.id, p_shards FROM posts p WHERE p.id = p_post_id
+  ON CONFLICT DO NOTHING;
+
+  IF NOT FOUND THEN
+    RETURN false;
+  END IF;
+
+  INSERT INTO post_counter_shards (post_id, shard)
+  SELECT p_post_id, s FROM generate_series(0, p_shards - 1) AS s;
+
+  INSERT INTO post_likes (post_id, user_id)
+  SELECT p.id, u::uuid
+  FROM posts p, jsonb_array_elements_text(coalesce(p.likes_by, '[]'::jsonb)) AS u
+  WHERE p.id = p_post_id
+  ON CONFLICT DO NOTHING;
+
+  UPDATE posts p
+  SET likes = (SELECT count(*) FROM post_likes l WHERE l.post_id = p_post_id), likes_by = '[]'::jsonb
+  WHERE p.id = p_post_id;
+
+  RETURN true;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION demote_post_counters(p_post_id uuid)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtextextended(p_post_id::text, 0));
+
+  DELETE FROM sharded_posts s WHERE s.post_id = p_post_id;
+
+  IF NOT FOUND THEN
+    RETURN false;
+  END IF;
+
+  UPDATE posts p
+  SET
+    likes_by = (SELECT coalesce(jsonb_agg(l.user_id), '[]'::jsonb) FROM post_likes l WHERE l.post_id = p_post_id),
+    likes = (SELECT count(*) FROM post_likes l WHERE l.post_id = p_post_id),
+    share_count = coalesce(p.share_count, 0) + t.shares,
+    view_count = coalesce(p.view_count, 0) + t.views
+  FROM (
+    SELECT coalesce(sum(c.shares), 0) AS shares, coalesce(sum(c.views), 0) AS views
+    FROM post_counter_shards c
+    WHERE c.post_id = p_post_id
+  ) AS t
+  WHERE p.id = p_post_id;
+
+  DELETE FROM post_counter_shards c WHERE c.post_id = p_post_id;
+  DELETE FROM post_likes l WHERE l.post_id = p_post_id;
+
+  RETURN true;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION post_counter_totals(p_post_ids uuid[])
+RETURNS TABLE (post_id uuid, likes bigint, shares bigint, views bigint)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT c.post_id, sum(c.likes)::bigint, sum(c.shares)::bigint, sum(c.views)::bigint
+  FROM post_counter_shards c
+  WHERE c.post_id = ANY(p_post_ids)
+  GROUP BY c.post_id;
+$$;
+
+CREATE OR REPLACE FUNCTION apply_post_counter_deltas(p_batch_id uuid, p_deltas jsonb)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  INSERT INTO post_counter_batches (batch_id)
+  VALUES (p_batch_id)
+  ON CONFLICT DO NOTHING;
+
+  IF NOT FOUND THEN
+    RETURN false;
+  END IF;
+
+  -- Shared locks in a fixed order; the next statement reads the mode under them
+  PERFORM pg_advisory_xact_lock_shared(hashtextextended(d.post_id::text, 0))
+  FROM (
+    SELECT DISTINCT r.post_id
+    FROM jsonb_to_recordset(p_deltas) AS r(post_id uuid)
+    ORDER BY r.post_id
+  ) AS d;
+
+  -- One statement over the decoded batch: a shard is picked once per sharded
+  -- post, sharded posts get membership rows and the effective like delta on
+  -- that shard, and the rest are merged into the posts row
+  WITH post_counter_deltas AS MATERIALIZED (
+    SELECT
+      d.post_id,
+      coalesce(d.shares, 0) AS shares,
+      coalesce(d.views, 0) AS views,
+      coalesce(d.liked, '[]'::jsonb) AS liked,
+      coalesce(d.unliked, '[]'::jsonb) AS unliked,
+      (SELECT floor(random() * s.shards)::smallint FROM sharded_posts s WHERE s.post_id = d.post_id) AS shard
+    FROM jsonb_to_recordset(p_deltas) AS d(post_id uuid, shares integer, views integer, liked jsonb, unliked jsonb)
+  ),
+  liked AS (
+    INSERT INTO post_likes (post_id, user_id)
+    SELECT d.post_id, u::uuid
+    FROM post_counter_deltas d, jsonb_array_elements_text(d.liked) AS u
+    WHERE d.shard IS NOT NULL
+    ON CONFLICT DO NOTHING
+    RETURNING post_id
+  ),
+  unliked AS (
+    DELETE FROM post_likes l
+    USING post_counter_deltas d, jsonb_array_elements_text(d.unliked) AS u
+    WHERE d.shard IS NOT NULL AND l.post_id = d.post_id AND l.user_id = u::uuid
+    RETURNING l.post_id
+  ),
+  net AS (
+    SELECT post_id, sum(n) AS likes
+    FROM (
+      SELECT post_id, 1 AS n FROM liked
+      UNION ALL
+      SELECT post_id, -1 AS n FROM unliked
+    ) AS changes
+    GROUP BY post_id
+  ),
+  sharded AS (
+    UPDATE post_counter_shards c
+    SET
+      likes = c.likes + coalesce(n.likes, 0),
+      shares = c.shares + d.shares,
+      views = c.views + d.views
+    FROM post_counter_deltas d
+    LEFT JOIN net n ON n.post_id = d.post_id
+    WHERE c.post_id = d.post_id AND c.shard = d.shard
+    RETURNING c.post_id
+  )
+  -- likes_by is merged against the row being updated (not a snapshot), so
+  -- concurrent batches from other workers do not overwrite each other; likes
+  -- is recomputed from the merged array only when the batch changed it
+  UPDATE posts p
+  SET
+    (likes_by, likes) = (
+      SELECT m.likes_by, CASE WHEN jsonb_array_length(d.liked) > 0 OR jsonb_array_length(d.unliked) > 0 THEN jsonb_array_length(m.likes_by) ELSE p.likes END
+      FROM (
+        SELECT coalesce(jsonb_agg(l.u), '[]'::jsonb) AS likes_by
+        FROM (
+          SELECT jsonb_array_elements_text(coalesce(p.likes_by, '[]'::jsonb))
+          EXCEPT
+          SELECT jsonb_array_elements_text(d.unliked)
+          UNION
+          SELECT jsonb_array_elements_text(d.liked)
+        ) AS l(u)
+      ) AS m
+    ),
+    share_count = coalesce(p.share_count, 0) + d.shares,
+    view_count = coalesce(p.view_count, 0) + d.views
+  FROM post_counter_deltas d
+  WHERE p.id = d.post_id AND d.shard IS NULL;
+
+  DELETE FROM post_counter_batches b WHERE b.applied_at < now() - interval '1 day';
+
+  RETURN true;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION rebalance_post_counters(
+  p_writes jsonb,
+  p_window_seconds integer,
+  p_shards integer,
+  p_promote_rate integer,
+  p_demote_rate integer,
+  p_min_sharded_seconds integer
+)
+RETURNS TABLE (post_id uuid)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_window timestamptz := to_timestamp(floor(extract(epoch FROM now()) / p_window_seconds) * p_window_seconds);
+  v_post_id uuid;
+BEGIN
+  -- Writes count toward the window they are reported in, so a window is
+  -- complete once it has ended, whichever workers reported into it
+  INSERT INTO post_write_rates AS r (post_id, window_start, writes)
+  SELECT w.post_id, v_window, w.writes
+  FROM jsonb_to_recordset(p_writes) AS w(post_id uuid, writes bigint)
+  WHERE EXISTS (SELECT 1 FROM posts p WHERE p.id = w.post_id)
+  ON CONFLICT ON CONSTRAINT post_write_rates_pkey DO UPDATE SET writes = r.writes + excluded.writes;
+
+  -- One worker decides at a time; the others just read the outcome
+  IF pg_try_advisory_xact_lock(hashtextextended('post_counters:rebalance', 0)) THEN
+    FOR v_post_id IN
+      SELECT r.post_id
+      FROM post_write_rates r
+      WHERE r.window_start = v_window - make_interval(secs => p_window_seconds)
+        AND r.writes >= p_promote_rate::bigint * p_window_seconds
+        AND NOT EXISTS (SELECT 1 FROM sharded_posts s WHERE s.post_id = r.post_id)
+      ORDER BY r.post_id
+    LOOP
+      PERFORM promote_post_counters(v_post_id, p_shards);
+    END LOOP;
+
+    FOR v_post_id IN
+      SELECT s.post_id
+      FROM sharded_posts s
+      LEFT JOIN post_write_rates r
+        ON r.post_id = s.post_id AND r.window_start = v_window - make_interval(secs => p_window_seconds)
+      WHERE coalesce(r.writes, 0) < p_demote_rate::bigint * p_window_seconds
+        AND s.promoted_at <= now() - make_interval(secs => p_min_sharded_seconds)
+      ORDER BY s.post_id
+    LOOP
+      PERFORM demote_post_counters(v_post_id);
+    END LOOP;
+
+    DELETE FROM post_write_rates r WHERE r.window_start < v_window - make_interval(secs => p_window_seconds);
+  END IF;
+
+  RETURN QUERY SELECT s.post_id FROM sharded_posts s;
+END;
+$$;
@@ -0,0 +1,140 @@
+/*
+  # Full-Text Search over Posts and Chat Messages
+
+  1. Extensions
+    - `btree_gin` so chat search can index (room_id, search_vector) together
+
+  2. Modified Tables
+    - `posts`
+      - `search_vector` (tsvector) - Stemmed content, kept current by trigger
+    - `chat_messages`
+      - `search_vector` (tsvector) - Stemmed message, kept current by trigger
+
+  3. Functions
+    - `search_posts(q, page_size, after_rank, after_id, max_hits)`
+    - `search_chat_messages(p_room_id, q, page_size, after_rank, after_id, max_hits)`
+      - `q` uses web search syntax ("quoted phrases", -exclusions, or)
+      - Only the newest max_hits matches are ranked, so a common term costs
+        max_hits rank computations rather than one per match
+      - Results ordered by (rank DESC, id) so the last row of a page is a
+        keyset cursor for the next one
+
+  Existing rows are backfilled and the GIN indexes built without blocking
+  writes by supabase/scripts/full_text_search_backfill.sql, which has to run
+  outside a transaction and so is not a migration. Until it has run, search
+  only finds rows written after this migration.
+*/
+
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector;
+ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION posts_search_vector_update()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.search_vector := to_tsvector('english', coalesce(NEW.content, ''));
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION chat_messages_search_vector_update()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.search_vector := to_tsvector('english', coalesce(NEW.message, ''));
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER posts_search_vector_trigger
+  BEFORE INSERT OR UPDATE OF content ON posts
+  FOR EACH ROW
+  EXECUTE FUNCTION posts_search_vector_update();
+
+CREATE TRIGGER chat_messages_search_vector_trigger
+  BEFORE INSERT OR UPDATE OF message ON chat_messages
+  FOR EACH ROW
+  EXECUTE FUNCTION chat_messages_search_vector_update();
+
+CREATE OR REPLACE FUNCTION search_posts(
+  q text,
+  page_size integer DEFAULT 20,
+  after_rank real DEFAULT NULL,
+  after_id uuid DEFAULT NULL,
+  max_hits integer DEFAULT 1000
+)
+RETURNS TABLE (
+  id uuid,
+  user_id uuid,
+  content text,
+  type text,
+  likes integer,
+  share_count integer,
+  media jsonb,
+  "timestamp" timestamptz,
+  rank real
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH hits AS (
+    SELECT p.id, p.user_id, p.content, p.type, p.likes, p.share_count, p.media, p.timestamp,
+           ts_rank_cd(p.search_vector, query) AS rank
+    FROM websearch_to_tsquery('english', q) AS query
+    CROSS JOIN LATERAL (
+      SELECT p.*
+      FROM posts p
+      WHERE p.search_vector @@ query
+      ORDER BY p.timestamp DESC, p.id DESC
+      LIMIT GREATEST(max_hits, 1)
+    ) p
+  )
+  SELECT h.id, h.user_id, h.content, h.type, h.likes, h.share_count, h.media, h.timestamp, h.rank
+  FROM hits h
+  WHERE after_rank IS NULL
+     OR h.rank < after_rank
+     OR (h.rank = after_rank AND h.id > after_id)
+  ORDER BY h.rank DESC, h.id
+  LIMIT LEAST(GREATEST(page_size, 1), 100);
+$$;
+
+CREATE OR REPLACE FUNCTION search_chat_messages(
+  p_room_id uuid,
+  q text,
+  page_size integer DEFAULT 20,
+  after_rank real DEFAULT NULL,
+  after_id uuid DEFAULT NULL,
+  max_hits integer DEFAULT 1000
+)
+RETURNS TABLE (
+  id uuid,
+  room_id uuid,
+  user_id uuid,
+  message text,
+  type text,
+  "timestamp" timestamptz,
+  rank real
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH hits AS (
+    SELECT m.id, m.room_id, m.user_id, m.message, m.type, m.timestamp,
+           ts_rank_cd(m.search_vector, query) AS rank
+    FROM websearch_to_tsquery('english', q) AS query
+    CROSS JOIN LATERAL (
+      SELECT m.*
+      FROM chat_messages m
+      WHERE m.room_id = p_room_id AND m.search_vector @@ query
+      ORDER BY m.timestamp DESC, m.id DESC
+      LIMIT GREATEST(max_hits, 1)
+    ) m
+  )
+  SELECT h.id, h.room_id, h.user_id, h.message, h.type, h.timestamp, h.rank
+  FROM hits h
+  WHERE after_rank IS NULL
+     OR h.rank < after_rank
+     OR (h.rank = after_rank AND h.id > after_id)
+  ORDER BY h.rank DESC, h.id
+  LIMIT LEAST(GREATEST(page_size, 1), 100);
+$$;
@@ -0,0 +1,162 @@
+/*
+  # Feed Change Log
+
+  1. New Tables
+    - `feed_changes`
+      - `seq` (bigserial, primary key) - Monotonic change sequence
+      - `xid` (xid8) - Transaction that logged the change
+      - `post_id` (uuid) - Post that was created or changed
+      - `kind` (text) - 'post' for a new post, 'counters' for a counter change
+      - `likes`, `comments`, `shares` (integer) - Counter values after the change
+      - `changed_at` (timestamptz) - clock_timestamp() when the change was logged
+    - `feed_changes_horizon` - One row: the position of the newest change
+      pruned so far
+
+  2. Triggers
+    - `posts_record_change` - Logs inserts, and updates that change likes,
+      comment count or share_count
+    - `post_counter_shards_record_change` - Logs the summed totals when a
+      sharded post's shard changes
+
+  3. Functions
+    - `feed_changes_since(p_after_xid, p_after_seq, p_limit)` - Changes after
+      a position, oldest first
+    - `feed_changes_head()` - Transaction id below which the log is final
+    - `feed_changes_expired(p_after_xid, p_after_seq)` - Whether changes after
+      a position have been pruned
+    - `prune_feed_changes(p_before)` - Deletes changes logged before a time
+      and advances the horizon
+
+  4. Positions
+    Sequence numbers are taken in statement order, not commit order, so a
+    reader that moved past the highest committed seq could skip a lower one
+    committed later. Positions are (xid, seq) instead, and readers only see
+    changes whose xid is below the xmin of their snapshot: every transaction
+    before xmin has finished, so no change can appear behind a position a
+    reader has already passed.
+*/
+
+CREATE TABLE IF NOT EXISTS feed_changes (
+  seq bigserial PRIMARY KEY,
+  xid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+  post_id uuid NOT NULL,
+  kind text NOT NULL,
+  likes integer,
+  comments integer,
+  shares integer,
+  changed_at timestamptz NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE INDEX IF NOT EXISTS feed_changes_changed_at_idx ON feed_changes(changed_at);
+CREATE INDEX IF NOT EXISTS feed_changes_position_idx ON feed_changes(xid, seq);
+
+ALTER TABLE feed_changes ENABLE ROW LEVEL SECURITY;
+
+CREATE TABLE IF NOT EXISTS feed_changes_horizon (
+  id boolean PRIMARY KEY DEFAULT true CHECK (id),
+  xid xid8 NOT NULL,
+  seq bigint NOT NULL
+);
+
+ALTER TABLE feed_changes_horizon ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION record_post_change()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO feed_changes (post_id, kind, likes, comments, shares)
+    VALUES (NEW.id, 'post', coalesce(NEW.likes, 0), jsonb_array_length(coalesce(NEW.comments, '[]'::jsonb)), coalesce(NEW.share_count, 0));
+  ELSIF (NEW.likes, jsonb_array_length(coalesce(NEW.comments, '[]'::jsonb)), NEW.share_count)
+        IS DISTINCT FROM (OLD.likes, jsonb_array_length(coalesce(OLD.comments, '[]'::jsonb)), OLD.share_count) THEN
+    INSERT INTO feed_changes (post_id, kind, likes, comments, shares)
+    VALUES (NEW.id, 'counters', coalesce(NEW.likes, 0), jsonb_array_length(coalesce(NEW.comments, '[]'::jsonb)), coalesce(NEW.share_count, 0));
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER posts_record_change
+  AFTER INSERT OR UPDATE ON posts
+  FOR EACH ROW
+  EXECUTE FUNCTION record_post_change();
+
+CREATE OR REPLACE FUNCTION record_post_shard_change()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF (NEW.likes, NEW.shares) IS DISTINCT FROM (OLD.likes, OLD.shares) THEN
+    INSERT INTO feed_changes (post_id, kind, likes, comments, shares)
+    SELECT
+      p.id,
+      'counters',
+      coalesce(p.likes, 0) + t.likes,
+      jsonb_array_length(coalesce(p.comments, '[]'::jsonb)),
+      coalesce(p.share_count, 0) + t.shares
+    FROM posts p, (
+      SELECT sum(c.likes) AS likes, sum(c.shares) AS shares
+      FROM post_counter_shards c
+      WHERE c.post_id = NEW.post_id
+    ) AS t
+    WHERE p.id = NEW.post_id;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER post_counter_shards_record_change
+  AFTER UPDATE ON post_counter_shards
+  FOR EACH ROW
+  EXECUTE FUNCTION record_post_shard_change();
+
+CREATE OR REPLACE FUNCTION feed_changes_since(p_after_xid xid8, p_after_seq bigint, p_limit integer DEFAULT 500)
+RETURNS TABLE (xid xid8, seq bigint, post_id uuid, kind text, likes integer, comments integer, shares integer)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT f.xid, f.seq, f.post_id, f.kind, f.likes, f.comments, f.shares
+  FROM feed_changes f
+  WHERE (f.xid, f.seq) > (p_after_xid, p_after_seq)
+    AND f.xid < pg_snapshot_xmin(pg_current_snapshot())
+  ORDER BY f.xid, f.seq
+  LIMIT LEAST(GREATEST(p_limit, 1), 1000);
+$$;
+
+CREATE OR REPLACE FUNCTION feed_changes_head()
+RETURNS xid8
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT pg_snapshot_xmin(pg_current_snapshot());
+$$;
+
+CREATE OR REPLACE FUNCTION feed_changes_expired(p_after_xid xid8, p_after_seq bigint)
+RETURNS boolean
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT EXISTS (
+    SELECT 1
+    FROM feed_changes_horizon h
+    WHERE (h.xid, h.seq) > (p_after_xid, p_after_seq)
+  );
+$$;
+
+CREATE OR REPLACE FUNCTION prune_feed_changes(p_before timestamptz)
+RETURNS void
+LANGUAGE sql
+AS $$
+  WITH gone AS (
+    DELETE FROM feed_changes f
+    WHERE f.changed_at < p_before
+    RETURNING f.xid, f.seq
+  ), newest AS (
+    SELECT g.xid, g.seq
+    FROM gone g
+    ORDER BY g.xid DESC, g.seq DESC
+    LIMIT 1
+  )
+  INSERT INTO feed_changes_horizon (id, xid, seq)
+  SELECT true, n.xid, n.seq FROM newest n
+  ON CONFLICT (id) DO UPDATE
+  SET xid = EXCLUDED.xid, seq = EXCLUDED.seq
+  WHERE (feed_changes_horizon.xid, feed_changes_horizon.seq) < (EXCLUDED.xid, EXCLUDED.seq);
+$$;
@@ -0,0 +1,51 @@
+/*
+  # Chat History Keyset Pagination
+
+  1. Changes to `chat_messages`
+    - `timestamp` is backfilled and made NOT NULL so every row has a
+      position in the history order
+
+  2. Indexes
+    - `chat_messages_room_timestamp_idx` on (room_id, timestamp DESC, id DESC),
+      so the latest page of a room and each older page are one index range
+    - Drops `chat_messages_room_id_idx`, which the new index covers
+
+  3. Functions
+    - `chat_messages_before(p_room_id, p_limit, p_before_ts, p_before_id)` -
+      Messages of a room older than (p_before_ts, p_before_id), newest first;
+      the latest messages when no cursor is given
+*/
+
+UPDATE chat_messages SET timestamp = now() WHERE timestamp IS NULL;
+ALTER TABLE chat_messages ALTER COLUMN timestamp SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS chat_messages_room_timestamp_idx
+  ON chat_messages(room_id, timestamp DESC, id DESC);
+
+DROP INDEX IF EXISTS chat_messages_room_id_idx;
+
+CREATE OR REPLACE FUNCTION chat_messages_before(
+  p_room_id uuid,
+  p_limit integer DEFAULT 50,
+  p_before_ts timestamptz DEFAULT NULL,
+  p_before_id uuid DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  room_id uuid,
+  user_id uuid,
+  message text,
+  type text,
+  meta jsonb,
+  "timestamp" timestamptz
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT m.id, m.room_id, m.user_id, m.message, m.type, m.meta, m.timestamp
+  FROM chat_messages m
+  WHERE m.room_id = p_room_id
+    AND (p_before_ts IS NULL OR (m.timestamp, m.id) < (p_before_ts, p_before_id))
+  ORDER BY m.timestamp DESC, m.id DESC
+  LIMIT LEAST(GREATEST(p_limit, 1), 200);
+$$;
@@ -0,0 +1,167 @@
+/*
+  # Chat Sender Snapshots
+
+  1. Changes to `chat_messages`
+    - `sender` (jsonb) - {name, avatar} of the sender when the message was
+      written, so history needs no users lookup
+    - Existing rows are backfilled from users
+
+  2. Triggers
+    - `chat_messages_default_sender` - Fills `sender` from users on insert
+      when the writer did not supply it. Writers leave it out so the
+      snapshot is read at insert time, not when the message was queued
+
+  3. Indexes
+    - `chat_messages_user_id_idx` on (user_id, id) - Pages through a user's
+      messages for backfill
+
+  4. Functions
+    - `refresh_chat_senders(p_user_id, p_after_id, p_batch)` - Rewrites
+      stale snapshots among the next p_batch messages of one user after
+      p_after_id, in id order; returns the last id covered, or null when
+      there are no more. Called after a profile change with the previous
+      return value until it returns null
+    - `chat_messages_before` and `search_chat_messages` now return `sender`
+*/
+
+ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS sender jsonb;
+
+UPDATE chat_messages m
+SET sender = jsonb_build_object('name', u.name, 'avatar', u.avatar_url)
+FROM users u
+WHERE u.id = m.user_id AND m.sender IS NULL;
+
+CREATE INDEX IF NOT EXISTS chat_messages_user_id_idx ON chat_messages(user_id, id);
+
+CREATE OR REPLACE FUNCTION chat_messages_default_sender()
+RETURNS TRIGGER AS $$
+BEGIN
+  SELECT jsonb_build_object('name', u.name, 'avatar', u.avatar_url)
+  INTO NEW.sender
+  FROM users u
+  WHERE u.id = NEW.user_id;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER chat_messages_default_sender
+  BEFORE INSERT ON chat_messages
+  FOR EACH ROW
+  WHEN (NEW.sender IS NULL)
+  EXECUTE FUNCTION chat_messages_default_sender();
+
+CREATE OR REPLACE FUNCTION refresh_chat_senders(p_user_id uuid, p_after_id uuid DEFAULT NULL, p_batch integer DEFAULT 1000)
+RETURNS uuid
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  snapshot jsonb;
+  last_id uuid;
+BEGIN
+  SELECT jsonb_build_object('name', u.name, 'avatar', u.avatar_url)
+  INTO snapshot
+  FROM users u
+  WHERE u.id = p_user_id;
+
+  IF snapshot IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  -- Each call covers the next id range once, so a backfill reads every
+  -- message of the user a single time
+  SELECT max(page.id) INTO last_id
+  FROM (
+    SELECT s.id
+    FROM chat_messages s
+    WHERE s.user_id = p_user_id AND (p_after_id IS NULL OR s.id > p_after_id)
+    ORDER BY s.id
+    LIMIT GREATEST(p_batch, 1)
+  ) AS page;
+
+  IF last_id IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  UPDATE chat_messages m
+  SET sender = snapshot
+  WHERE m.user_id = p_user_id
+    AND (p_after_id IS NULL OR m.id > p_after_id)
+    AND m.id <= last_id
+    AND m.sender IS DISTINCT FROM snapshot;
+
+  RETURN last_id;
+END;
+$$;
+
+DROP FUNCTION IF EXISTS chat_messages_before(uuid, integer, timestamptz, uuid);
+
+CREATE FUNCTION chat_messages_before(
+  p_room_id uuid,
+  p_limit integer DEFAULT 50,
+  p_before_ts timestamptz DEFAULT NULL,
+  p_before_id uuid DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  room_id uuid,
+  user_id uuid,
+  sender jsonb,
+  message text,
+  type text,
+  meta jsonb,
+  "timestamp" timestamptz
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT m.id, m.room_id, m.user_id, m.sender, m.message, m.type, m.meta, m.timestamp
+  FROM chat_messages m
+  WHERE m.room_id = p_room_id
+    AND (p_before_ts IS NULL OR (m.timestamp, m.id) < (p_before_ts, p_before_id))
+  ORDER BY m.timestamp DESC, m.id DESC
+  LIMIT LEAST(GREATEST(p_limit, 1), 200);
+$$;
+
+DROP FUNCTION IF EXISTS search_chat_messages(uuid, text, integer, real, uuid, integer);
+
+CREATE FUNCTION search_chat_messages(
+  p_room_id uuid,
+  q text,
+  page_size integer DEFAULT 20,
+  after_rank real DEFAULT NULL,
+  after_id uuid DEFAULT NULL,
+  max_hits integer DEFAULT 1000
+)
+RETURNS TABLE (
+  id uuid,
+  room_id uuid,
+  user_id uuid,
+  sender jsonb,
+  message text,
+  type text,
+  "timestamp" timestamptz,
+  rank real
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH hits AS (
+    SELECT m.id, m.room_id, m.user_id, m.sender, m.message, m.type, m.timestamp,
+           ts_rank_cd(m.search_vector, query) AS rank
+    FROM websearch_to_tsquery('english', q) AS query
+    CROSS JOIN LATERAL (
+      SELECT m.*
+      FROM chat_messages m
+      WHERE m.room_id = p_room_id AND m.search_vector @@ query
+      ORDER BY m.timestamp DESC, m.id DESC
+      LIMIT GREATEST(max_hits, 1)
+    ) m
+  )
+  SELECT h.id, h.room_id, h.user_id, h.sender, h.message, h.type, h.timestamp, h.rank
+  FROM hits h
+  WHERE after_rank IS NULL
+     OR h.rank < after_rank
+     OR (h.rank = after_rank AND h.id > after_id)
+  ORDER BY h.rank DESC, h.id
+  LIMIT LEAST(GREATEST(page_size, 1), 100);
+$$;
@@ -0,0 +1,194 @@
+/*
+  # Chat Room Members
+
+  Moves chat room membership out of the `chat_rooms.members` jsonb array into
+  a table shaped like `community_members` (which references community_rooms,
+  so chat rooms get their own).
+
+  1. New Tables
+    - `chat_room_members`
+      - `id` (uuid, primary key)
+      - `room_id` (uuid) - References chat_rooms
+      - `user_id` (uuid) - References users
+      - `role` (text) - 'owner' for the creator, otherwise 'member'
+      - `joined_at` (timestamptz)
+      - Unique on (room_id, user_id)
+    - Backfilled from `chat_rooms.members`
+
+  2. Changes to `chat_rooms`
+    - `member_count` (integer) - Maintained by join_chat_room and the
+      creator trigger, checked against `max_members`
+    - `members` is dropped
+
+  3. Indexes
+    - `chat_room_members_user_idx` on (user_id, room_id) - rooms a user
+      belongs to
+
+  4. Triggers
+    - `chat_rooms_count_creator` / `chat_rooms_add_creator` - Count and add
+      the creator as owner when a room is created
+
+  5. Functions
+    - `join_chat_room(p_room_id, p_user_id)` - Adds a member unless the room
+      is full; returns 'joined', 'already_member', 'full' or 'not_found'
+    - `user_chat_rooms(p_user_id, p_limit)` - Rooms a user belongs to, most
+      recently active first
+
+  6. Security
+    - Room and message policies check `chat_room_members` instead of the
+      jsonb array
+    - Users can read their own memberships
+*/
+
+CREATE TABLE IF NOT EXISTS chat_room_members (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  room_id uuid NOT NULL REFERENCES chat_rooms(id) ON DELETE CASCADE,
+  user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  role text DEFAULT 'member',
+  joined_at timestamptz DEFAULT now(),
+  UNIQUE(room_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS chat_room_members_user_idx ON chat_room_members(user_id, room_id);
+
+ALTER TABLE chat_room_members ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read own memberships"
+  ON chat_room_members FOR SELECT
+  TO authenticated
+  USING (auth.uid() = user_id);
+
+INSERT INTO chat_room_members (room_id, user_id, role)
+SELECT r.id, u.id, CASE WHEN u.id = r.creator_id THEN 'owner' ELSE 'member' END
+FROM chat_rooms r
+CROSS JOIN LATERAL jsonb_array_elements_text(coalesce(r.members, '[]'::jsonb)) AS m(user_id)
+JOIN users u ON u.id::text = m.user_id
+ON CONFLICT (room_id, user_id) DO NOTHING;
+
+ALTER TABLE chat_rooms ADD COLUMN IF NOT EXISTS member_count integer NOT NULL DEFAULT 0;
+
+UPDATE chat_rooms r
+SET member_count = (SELECT count(*) FROM chat_room_members m WHERE m.room_id = r.id);
+
+DROP POLICY IF EXISTS "Anyone authenticated can read public rooms" ON chat_rooms;
+DROP POLICY IF EXISTS "Room members can read messages" ON chat_messages;
+DROP POLICY IF EXISTS "Room members can insert messages" ON chat_messages;
+
+ALTER TABLE chat_rooms DROP COLUMN IF EXISTS members;
+
+CREATE POLICY "Anyone authenticated can read public rooms"
+  ON chat_rooms FOR SELECT
+  TO authenticated
+  USING (
+    type = 'public' OR EXISTS (
+      SELECT 1 FROM chat_room_members m
+      WHERE m.room_id = chat_rooms.id AND m.user_id = auth.uid()
+    )
+  );
+
+CREATE POLICY "Room members can read messages"
+  ON chat_messages FOR SELECT
+  TO authenticated
+  USING (
+    EXISTS (
+      SELECT 1 FROM chat_rooms
+      WHERE chat_rooms.id = chat_messages.room_id
+      AND (chat_rooms.type = 'public' OR EXISTS (
+        SELECT 1 FROM chat_room_members m
+        WHERE m.room_id = chat_rooms.id AND m.user_id = auth.uid()
+      ))
+    )
+  );
+
+CREATE POLICY "Room members can insert messages"
+  ON chat_messages FOR INSERT
+  TO authenticated
+  WITH CHECK (
+    auth.uid() = user_id AND
+    EXISTS (
+      SELECT 1 FROM chat_rooms
+      WHERE chat_rooms.id = chat_messages.room_id
+      AND (chat_rooms.type = 'public' OR EXISTS (
+        SELECT 1 FROM chat_room_members m
+        WHERE m.room_id = chat_rooms.id AND m.user_id = auth.uid()
+      ))
+    )
+  );
+
+CREATE OR REPLACE FUNCTION chat_rooms_count_creator()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.member_count := CASE WHEN NEW.creator_id IS NULL THEN 0 ELSE 1 END;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER chat_rooms_count_creator
+  BEFORE INSERT ON chat_rooms
+  FOR EACH ROW
+  EXECUTE FUNCTION chat_rooms_count_creator();
+
+CREATE OR REPLACE FUNCTION chat_rooms_add_creator()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF NEW.creator_id IS NOT NULL THEN
+    INSERT INTO chat_room_members (room_id, user_id, role)
+    VALUES (NEW.id, NEW.creator_id, 'owner');
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER chat_rooms_add_creator
+  AFTER INSERT ON chat_rooms
+  FOR EACH ROW
+  EXECUTE FUNCTION chat_rooms_add_creator();
+
+CREATE OR REPLACE FUNCTION join_chat_room(p_room_id uuid, p_user_id uuid)
+RETURNS text
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM chat_room_members WHERE room_id = p_room_id AND user_id = p_user_id) THEN
+    RETURN 'already_member';
+  END IF;
+
+  -- The row lock on the room serializes joins, so the capacity check holds
+  UPDATE chat_rooms
+  SET member_count = member_count + 1,
+      last_activity = now()
+  WHERE id = p_room_id AND member_count < coalesce(max_members, 2147483647);
+
+  IF NOT FOUND THEN
+    IF EXISTS (SELECT 1 FROM chat_rooms WHERE id = p_room_id) THEN
+      RETURN 'full';
+    END IF;
+    RETURN 'not_found';
+  END IF;
+
+  INSERT INTO chat_room_members (room_id, user_id)
+  VALUES (p_room_id, p_user_id)
+  ON CONFLICT (room_id, user_id) DO NOTHING;
+
+  IF NOT FOUND THEN
+    -- A concurrent join by the same user got there first
+    UPDATE chat_rooms SET member_count = member_count - 1 WHERE id = p_room_id;
+    RETURN 'already_member';
+  END IF;
+
+  RETURN 'joined';
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION user_chat_rooms(p_user_id uuid, p_limit integer DEFAULT 50)
+RETURNS SETOF chat_rooms
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT r.*
+  FROM chat_room_members m
+  JOIN chat_rooms r ON r.id = m.room_id
+  WHERE m.user_id = p_user_id
+  ORDER BY r.last_activity DESC
+  LIMIT LEAST(GREATEST(p_limit, 1), 200);
+$$;
@@ -0,0 +1,137 @@
+/*
+  # Chat Read Cursors
+
+  1. Changes to `chat_rooms`
+    - `message_seq` (bigint) - Position of the room's newest message
+
+  2. Changes to `chat_messages`
+    - `room_seq` (bigint) - Position of the message in its room, assigned by
+      `chat_messages_assign_seq` from `chat_rooms.message_seq`. The room row
+      stays locked until the inserting transaction ends, so positions within
+      a room follow commit order: a message can never commit behind a
+      position a reader has already seen. Timestamps and ids do not have
+      that property, since a transaction can commit after a later one
+    - `timestamp` defaults to clock_timestamp(), so a message is stamped when
+      it is inserted rather than when the app accepted it
+    - Existing messages are numbered by (timestamp, id)
+
+  3. Changes to `chat_room_members`
+    - `last_read_seq` (bigint) - Position of the last message the member has
+      read; set to the room's newest position when they join
+      (`chat_room_members_start_cursor`), and to the newest one for existing
+      members
+
+  4. Indexes
+    - `chat_messages_room_seq_idx` on (room_id, room_seq)
+
+  5. Functions
+    - `mark_chat_room_read(p_room_id, p_user_id, p_message_id)` - Moves the
+      cursor to the position of p_message_id, or to the newest position when
+      it is null, using GREATEST so it never moves back
+    - `chat_unread_counts(p_user_id, p_room_ids, p_cap)` - Unread messages
+      from others per joined room (all joined rooms when p_room_ids is null),
+      among at most p_cap messages past the cursor; each count reads at most
+      p_cap entries of chat_messages_room_seq_idx, however many of them the
+      member sent
+*/
+
+ALTER TABLE chat_rooms ADD COLUMN IF NOT EXISTS message_seq bigint NOT NULL DEFAULT 0;
+ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS room_seq bigint;
+ALTER TABLE chat_room_members ADD COLUMN IF NOT EXISTS last_read_seq bigint NOT NULL DEFAULT 0;
+
+ALTER TABLE chat_messages ALTER COLUMN timestamp SET DEFAULT clock_timestamp();
+
+UPDATE chat_messages m
+SET room_seq = n.room_seq
+FROM (
+  SELECT id, row_number() OVER (PARTITION BY room_id ORDER BY timestamp, id) AS room_seq
+  FROM chat_messages
+) AS n
+WHERE m.id = n.id;
+
+UPDATE chat_rooms r
+SET message_seq = coalesce((SELECT max(m.room_seq) FROM chat_messages m WHERE m.room_id = r.id), 0);
+
+UPDATE chat_room_members c
+SET last_read_seq = r.message_seq
+FROM chat_rooms r
+WHERE r.id = c.room_id;
+
+ALTER TABLE chat_messages ALTER COLUMN room_seq SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS chat_messages_room_seq_idx ON chat_messages(room_id, room_seq);
+
+CREATE OR REPLACE FUNCTION chat_messages_assign_seq()
+RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE chat_rooms r
+  SET message_seq = r.message_seq + 1
+  WHERE r.id = NEW.room_id
+  RETURNING r.message_seq INTO NEW.room_seq;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER chat_messages_assign_seq
+  BEFORE INSERT ON chat_messages
+  FOR EACH ROW
+  EXECUTE FUNCTION chat_messages_assign_seq();
+
+CREATE OR REPLACE FUNCTION chat_room_members_start_cursor()
+RETURNS TRIGGER AS $$
+BEGIN
+  SELECT r.message_seq INTO NEW.last_read_seq
+  FROM chat_rooms r
+  WHERE r.id = NEW.room_id;
+  NEW.last_read_seq := coalesce(NEW.last_read_seq, 0);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER chat_room_members_start_cursor
+  BEFORE INSERT ON chat_room_members
+  FOR EACH ROW
+  EXECUTE FUNCTION chat_room_members_start_cursor();
+
+CREATE OR REPLACE FUNCTION mark_chat_room_read(p_room_id uuid, p_user_id uuid, p_message_id uuid DEFAULT NULL)
+RETURNS boolean
+LANGUAGE sql
+AS $$
+  WITH target AS (
+    SELECT coalesce(
+      (SELECT m.room_seq FROM chat_messages m WHERE m.room_id = p_room_id AND m.id = p_message_id),
+      (SELECT r.message_seq FROM chat_rooms r WHERE r.id = p_room_id AND p_message_id IS NULL)
+    ) AS seq
+  ), moved AS (
+    UPDATE chat_room_members c
+    SET last_read_seq = GREATEST(c.last_read_seq, t.seq)
+    FROM target t
+    WHERE c.room_id = p_room_id
+      AND c.user_id = p_user_id
+      AND t.seq > c.last_read_seq
+    RETURNING c.id
+  )
+  SELECT EXISTS (SELECT 1 FROM moved);
+$$;
+
+CREATE OR REPLACE FUNCTION chat_unread_counts(p_user_id uuid, p_room_ids uuid[] DEFAULT NULL, p_cap integer DEFAULT 100)
+RETURNS TABLE (room_id uuid, unread integer)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT c.room_id, (
+    SELECT count(*) FILTER (WHERE unread.user_id <> p_user_id)::integer
+    FROM (
+      -- Filter after the limit so the member's own messages count toward it
+      SELECT m.user_id
+      FROM chat_messages m
+      WHERE m.room_id = c.room_id
+        AND m.room_seq > c.last_read_seq
+      ORDER BY m.room_seq
+      LIMIT GREATEST(p_cap, 1)
+    ) AS unread
+  )
+  FROM chat_room_members c
+  WHERE c.user_id = p_user_id
+    AND (p_room_ids IS NULL OR c.room_id = ANY(p_room_ids));
+$$;
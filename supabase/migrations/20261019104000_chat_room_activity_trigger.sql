@@ -0,0 +1,34 @@
+/*
+  # Chat Room Activity Trigger
+
+  1. Triggers
+    - `chat_messages_bump_room` - After each insert statement on
+      chat_messages, sets `last_message` and `last_activity` of every room
+      that got messages to its newest inserted message. Runs once per
+      statement, so a batch insert updates each room once, and the room row
+      changes in the same transaction as the messages
+    - A room is only moved forward, never back to an older message
+*/
+
+CREATE OR REPLACE FUNCTION chat_messages_bump_room()
+RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE chat_rooms r
+  SET last_message = latest.message,
+      last_activity = latest.timestamp
+  FROM (
+    SELECT DISTINCT ON (i.room_id) i.room_id, i.message, i.timestamp
+    FROM inserted i
+    ORDER BY i.room_id, i.timestamp DESC, i.id DESC
+  ) AS latest
+  WHERE r.id = latest.room_id
+    AND (r.last_activity IS NULL OR r.last_activity <= latest.timestamp);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER chat_messages_bump_room
+  AFTER INSERT ON chat_messages
+  REFERENCING NEW TABLE AS inserted
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION chat_messages_bump_room();
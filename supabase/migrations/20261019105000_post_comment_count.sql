@@ -0,0 +1,16 @@
+/*
+  # Post Comment Count
+
+  1. Functions
+    - `comment_count(posts)` - Computed column with the length of the
+      post's comments array, so readers that only need the count do not
+      download the comments
+*/
+
+CREATE OR REPLACE FUNCTION comment_count(posts)
+RETURNS integer
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT jsonb_array_length(coalesce($1.comments, '[]'::jsonb));
+$$;
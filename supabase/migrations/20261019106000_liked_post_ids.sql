@@ -0,0 +1,39 @@
+/*
+  # Liked Post Ids
+
+  1. Functions
+    - `liked_post_ids(p_user_id, p_post_ids)` - The posts among p_post_ids
+      that the user likes, from likes_by or, for sharded posts, post_likes.
+      Lets feed reads skip downloading every post's likes_by array
+    - `post_like_state(p_post_id, p_user_id)` - The post's stored like count
+      and whether the user likes it, so a like reads two values rather than
+      the likes_by array
+*/
+
+CREATE OR REPLACE FUNCTION liked_post_ids(p_user_id uuid, p_post_ids uuid[])
+RETURNS TABLE (post_id uuid)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT p.id AS post_id
+  FROM posts p
+  WHERE p.id = ANY(p_post_ids)
+    AND coalesce(p.likes_by, '[]'::jsonb) ? p_user_id::text
+  UNION
+  SELECT l.post_id
+  FROM post_likes l
+  WHERE l.user_id = p_user_id AND l.post_id = ANY(p_post_ids);
+$$;
+
+CREATE OR REPLACE FUNCTION post_like_state(p_post_id uuid, p_user_id uuid)
+RETURNS TABLE (likes integer, liked boolean)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    coalesce(p.likes, 0),
+    coalesce(p.likes_by, '[]'::jsonb) ? p_user_id::text
+      OR EXISTS (SELECT 1 FROM post_likes l WHERE l.post_id = p.id AND l.user_id = p_user_id)
+  FROM posts p
+  WHERE p.id = p_post_id;
+$$;
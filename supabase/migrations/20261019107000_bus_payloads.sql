@@ -0,0 +1,24 @@
+/*
+  # Bus Payloads
+
+  1. New Tables
+    - `bus_payloads`
+      - `id` (bigint, identity)
+      - `payload` (text) - A cross-worker event batch too big for a NOTIFY
+        payload; the Postgres bus notifies its id instead
+      - `created_at` (timestamptz) - Rows older than five minutes are pruned
+        by the next write
+
+  2. Security
+    - Enable RLS with no policies; only the service role reads and writes
+*/
+
+CREATE TABLE IF NOT EXISTS bus_payloads (
+  id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  payload text NOT NULL,
+  created_at timestamptz DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS bus_payloads_created_at_idx ON bus_payloads(created_at);
+
+ALTER TABLE bus_payloads ENABLE ROW LEVEL SECURITY;
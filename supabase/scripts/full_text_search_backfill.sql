@@ -0,0 +1,68 @@
+/*
+  # Full-Text Search Backfill and Indexes
+
+  Ops script, not a migration: run it once after
+  20261019098000_full_text_search with psql in autocommit mode, e.g.
+
+    psql "$DATABASE_URL" -f supabase/scripts/full_text_search_backfill.sql
+
+  It must run outside a transaction block (so not through the migration
+  runner, which wraps each file in one): the backfill commits per batch and
+  the indexes are built CONCURRENTLY, so neither holds locks that block
+  writes to posts or chat_messages for the length of the run. It is safe to
+  rerun. If an index build fails it leaves an INVALID index behind; drop it
+  and run the script again.
+
+  1. Procedures
+    - `backfill_search_vectors(p_batch)` - Fills search_vector on rows
+      written before 20261019098000_full_text_search, p_batch rows per
+      commit, walking each table by primary key. Dropped once it has run
+
+  2. Indexes
+    - `posts_search_idx` - GIN index on posts.search_vector
+    - `chat_messages_search_idx` - GIN index on (room_id, search_vector), so
+      search within one room does not visit other rooms' matches
+*/
+
+CREATE OR REPLACE PROCEDURE backfill_search_vectors(p_batch integer DEFAULT 5000)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_last uuid := '00000000-0000-0000-0000-000000000000';
+  v_next uuid;
+BEGIN
+  LOOP
+    SELECT max(b.id) INTO v_next
+    FROM (SELECT p.id FROM posts p WHERE p.id > v_last ORDER BY p.id LIMIT p_batch) AS b;
+    EXIT WHEN v_next IS NULL;
+
+    UPDATE posts p
+    SET search_vector = to_tsvector('english', coalesce(p.content, ''))
+    WHERE p.id > v_last AND p.id <= v_next AND p.search_vector IS NULL;
+
+    v_last := v_next;
+    COMMIT;
+  END LOOP;
+
+  v_last := '00000000-0000-0000-0000-000000000000';
+  LOOP
+    SELECT max(b.id) INTO v_next
+    FROM (SELECT m.id FROM chat_messages m WHERE m.id > v_last ORDER BY m.id LIMIT p_batch) AS b;
+    EXIT WHEN v_next IS NULL;
+
+    UPDATE chat_messages m
+    SET search_vector = to_tsvector('english', coalesce(m.message, ''))
+    WHERE m.id > v_last AND m.id <= v_next AND m.search_vector IS NULL;
+
+    v_last := v_next;
+    COMMIT;
+  END LOOP;
+END;
+$$;
+
+CALL backfill_search_vectors();
+
+DROP PROCEDURE backfill_search_vectors(integer);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS posts_search_idx ON posts USING gin (search_vector);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS chat_messages_search_idx ON chat_messages USING gin (room_id, search_vector);
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+import pytest
+
+from services import bus as bus_module
+from services.bus import Bus, UnixSocketBackend, PostgresBackend
+
+TEST_DATABASE_URL = os.environ.get("BUS_TEST_DATABASE_URL")
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+    async def run(self, on_message):
+        await asyncio.Event().wait()
+
+
+async def _wait_for(predicate, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("timed out")
+        await asyncio.sleep(0.01)
+
+
+def test_publish_coalesces_keyed_events_into_one_batch():
+    backend = RecordingBackend()
+    bus = Bus(backend)
+    delivered = []
+    bus.subscribe("stream", delivered.append)
+
+    async def scenario():
+        task = asyncio.create_task(bus.run())
+        await asyncio.sleep(0)
+        bus.publish("stream", {"likes": 1}, key="post:1")
+        bus.publish("stream", {"text": "a"})
+        bus.publish("stream", {"likes": 2}, key="post:1")
+        bus.publish("stream", {"text": "b"})
+        await asyncio.sleep(0)
+        task.cancel()
+
+    asyncio.run(scenario())
+
+    # Local handlers see every event; the backend gets the latest per key, once
+    assert delivered == [{"likes": 1}, {"text": "a"}, {"likes": 2}, {"text": "b"}]
+    assert len(backend.sent) == 1
+    assert backend.sent[0]["events"] == [["stream", {"text": "a"}], ["stream", {"likes": 2}], ["stream", {"text": "b"}]]
+
+
+def test_remote_batches_skip_our_own_origin():
+    bus = Bus(RecordingBackend())
+    delivered = []
+    bus.subscribe("chat", delivered.append)
+
+    bus._receive({"origin": bus._origin, "events": [["chat", {"n": 1}]]})
+    bus._receive({"origin": "other", "events": [["chat", {"n": 2}]]})
+
+    assert delivered == [{"n": 2}]
+
+
+def test_unix_backend_relays_between_broker_and_client(tmp_path):
+    path = str(tmp_path / "bus.sock")
+    broker, client = UnixSocketBackend(path), UnixSocketBackend(path)
+    at_broker, at_client = [], []
+
+    async def scenario():
+        tasks = [asyncio.create_task(broker.run(at_broker.append))]
+        await _wait_for(lambda: broker._broker)
+        tasks.append(asyncio.create_task(client.run(at_client.append)))
+        await _wait_for(lambda: client._writer is not None and broker._peers)
+
+        client.send({"origin": "client", "events": [["chat", {"n": 1}]]})
+        await _wait_for(lambda: at_broker)
+        broker.send({"origin": "broker", "events": [["chat", {"n": 2}]]})
+        await _wait_for(lambda: at_client)
+        for task in tasks:
+            task.cancel()
+
+    asyncio.run(scenario())
+
+    assert at_broker == [{"origin": "client", "events": [["chat", {"n": 1}]]}]
+    assert at_client == [{"origin": "broker", "events": [["chat", {"n": 2}]]}]
+
+
+def test_postgres_backend_splits_batches_under_the_notify_limit():
+    backend = PostgresBackend("postgres://unused", "test")
+
+    async def scenario():
+        backend.send({"origin": "o", "events": [["stream", {"body": "x" * 3000}] for _ in range(5)]})
+        return backend._queue.qsize()
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_postgres_backend_keeps_events_over_the_notify_limit():
+    backend = PostgresBackend("postgres://unused", "test")
+    big = ["chat", {"message": "x" * 4000, "meta": {"note": "y" * 4096}}]
+
+    async def scenario():
+        backend.send({"origin": "o", "events": [["chat", {"n": 1}], big, ["chat", {"n": 2}]]})
+        return [backend._queue.get_nowait() for _ in range(backend._queue.qsize())]
+
+    queued = asyncio.run(scenario())
+
+    # The big event goes out alone, in order, to be stored and sent by reference
+    assert [json.loads(payload)["events"] for _, payload in queued] == [[["chat", {"n": 1}]], [big], [["chat", {"n": 2}]]]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.stored = {}
+        self.notified = []
+
+    async def fetchval(self, query, arg):
+        if query.lstrip().startswith("SELECT"):
+            return self.stored.get(arg)
+        self.stored[len(self.stored) + 1] = arg
+        return len(self.stored)
+
+    async def execute(self, query, *args, timeout=None):
+        if args:
+            self.notified.append(args[1])
+
+
+def test_postgres_backend_sends_oversized_batches_by_reference():
+    backend = PostgresBackend("postgres://unused", "test")
+    connection = FakeConnection()
+    big = ["chat", {"message": "x" * 9000}]
+    received = []
+
+    async def scenario():
+        backend.send({"origin": "o", "events": [big, ["chat", {"n": 1}]]})
+        sender = asyncio.create_task(backend._send_loop(connection))
+        await _wait_for(lambda: len(connection.notified) == 2)
+        sender.cancel()
+
+        inbox = asyncio.Queue()
+        for payload in connection.notified:
+            inbox.put_nowait(payload)
+        receiver = asyncio.create_task(backend._receive_loop(connection, inbox, received.append))
+        await _wait_for(lambda: len(received) == 2)
+        receiver.cancel()
+
+    asyncio.run(scenario())
+
+    assert all(len(payload) <= bus_module.NOTIFY_PAYLOAD_LIMIT for payload in connection.notified)
+    assert json.loads(connection.notified[0]) == {"origin": "o", "ref": 1}
+    assert received == [{"origin": "o", "events": [big]}, {"origin": "o", "events": [["chat", {"n": 1}]]}]
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="BUS_TEST_DATABASE_URL is not set")
+def test_postgres_backend_delivers_and_reconnects(monkeypatch):
+    asyncpg = pytest.importorskip("asyncpg")
+    monkeypatch.setattr(bus_module, "BUS_HEALTH_CHECK_SECONDS", 1)
+    channel = "levelup_bus_test"
+    sender, receiver = PostgresBackend(TEST_DATABASE_URL, channel), PostgresBackend(TEST_DATABASE_URL, channel)
+    received = []
+
+    async def deliver(n, pad=""):
+        # Keep sending until one arrives: LISTEN may not be set up yet
+        async def arrived():
+            sender.send({"origin": "sender", "events": [["chat", {"n": n, "pad": pad}]]})
+            await asyncio.sleep(0.2)
+            return any(message["events"][0][1]["n"] == n for message in received)
+
+        for _ in range(50):
+            if await arrived():
+                return
+        raise AssertionError(f"event {n} was not delivered")
+
+    async def scenario():
+        tasks = [
+            asyncio.create_task(sender.run(lambda message: None)),
+            asyncio.create_task(receiver.run(received.append))
+        ]
+        await deliver(1)
+        # Read back from bus_payloads, so the database needs the migrations
+        await deliver(2, pad="x" * 10000)
+
+        admin = await asyncpg.connect(TEST_DATABASE_URL)
+        try:
+            # Drops both backends' connections, as a server restart would
+            await admin.execute(
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                "WHERE datname = current_database() AND usename = current_user AND pid <> pg_backend_pid()"
+            )
+        finally:
+            await admin.close()
+
+        await deliver(3)
+        for task in tasks:
+            task.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,177 @@
+import asyncio
+import json
+
+from fastapi import WebSocketDisconnect
+
+from routes import social
+from services import chat_gateway as chat_gateway_module
+from services.chat_gateway import ChatConnection, ChatGateway, ChatWriter, SLOW_CONSUMER_CLOSE_CODE
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.closed_with = None
+
+    async def send_text(self, frame):
+        pass
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_slow_subscriber_is_evicted_without_affecting_the_room(monkeypatch):
+    monkeypatch.setattr(chat_gateway_module, "CHAT_SEND_QUEUE_SIZE", 2)
+    gateway = ChatGateway()
+
+    async def scenario():
+        # Neither connection runs its sender, so nothing drains their queues
+        slow = ChatConnection(FakeWebSocket(), {"id": "slow"})
+        fast = ChatConnection(FakeWebSocket(), {"id": "fast"})
+        gateway.join(slow, "room")
+        gateway.join(fast, "room")
+
+        for n in range(2):
+            gateway.deliver({"room_id": "room", "payload": {"n": n}})
+        fast.queue.get_nowait()
+        fast.queue.get_nowait()
+        gateway.deliver({"room_id": "room", "payload": {"n": 2}})
+        await asyncio.sleep(0)
+        return slow, fast
+
+    slow, fast = asyncio.run(scenario())
+
+    assert slow.websocket.closed_with == SLOW_CONSUMER_CLOSE_CODE
+    assert slow.rooms == set()
+    assert fast.rooms == {"room"}
+    assert fast.queue.get_nowait() == '{"n":2}'
+    assert fast.websocket.closed_with is None
+
+
+def test_leaving_the_last_member_drops_the_room():
+    gateway = ChatGateway()
+    connection = ChatConnection(FakeWebSocket(), {"id": "u"})
+
+    async def scenario():
+        gateway.join(connection, "room")
+        gateway.leave(connection, "room")
+        gateway.deliver({"room_id": "room", "payload": {"n": 1}})
+
+    asyncio.run(scenario())
+
+    assert connection.queue.empty()
+    assert "room" not in gateway._rooms
+
+
+class InsertError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class FakeTable:
+    def __init__(self, db):
+        self._db = db
+
+    def insert(self, rows):
+        self._rows = rows
+        return self
+
+    def execute(self):
+        rows = self._rows if isinstance(self._rows, list) else [self._rows]
+        for row in rows:
+            if row["id"] in self._db.reject:
+                raise InsertError(self._db.reject[row["id"]])
+        self._db.saved.extend(rows)
+
+
+class FakeSupabase:
+    def __init__(self, reject):
+        self.reject = reject
+        self.saved = []
+
+    def table(self, name):
+        return FakeTable(self)
+
+
+def _row(n):
+    return {"id": f"m{n}", "room_id": "room", "user_id": "u", "message": str(n)}
+
+
+def test_writer_drops_rejected_rows_and_keeps_the_rest(monkeypatch):
+    db = FakeSupabase({"m1": "23503"})
+    sent, failed = [], []
+    monkeypatch.setattr(chat_gateway_module, "supabase_admin", db)
+    monkeypatch.setattr(chat_gateway_module, "emit", lambda event, user_id, **data: sent.append(data["message_id"]))
+    monkeypatch.setattr(chat_gateway_module.chat_gateway, "broadcast", lambda room_id, payload: failed.append(payload))
+
+    writer = ChatWriter()
+    for n in range(3):
+        writer.enqueue(_row(n))
+    writer.flush()
+
+    assert [row["id"] for row in db.saved] == ["m0", "m2"]
+    assert sent == ["m0", "m2"]
+    assert failed == [{"type": "message_failed", "room_id": "room", "id": "m1"}]
+    assert writer._buffer == []
+
+
+def test_writer_requeues_on_transient_errors(monkeypatch):
+    db = FakeSupabase({"m1": "08006"})
+    sent = []
+    monkeypatch.setattr(chat_gateway_module, "supabase_admin", db)
+    monkeypatch.setattr(chat_gateway_module, "emit", lambda event, user_id, **data: sent.append(data["message_id"]))
+
+    writer = ChatWriter()
+    for n in range(3):
+        writer.enqueue(_row(n))
+    try:
+        writer.flush()
+    except InsertError:
+        pass
+
+    assert [row["id"] for row in db.saved] == ["m0"]
+    assert sent == ["m0"]
+    assert [row["id"] for row in writer._buffer] == ["m1", "m2"]
+
+
+class ScriptedWebSocket(FakeWebSocket):
+    def __init__(self, frames):
+        super().__init__()
+        self._frames = list(frames)
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self):
+        if not self._frames:
+            raise WebSocketDisconnect()
+        return self._frames.pop(0)
+
+
+ROOM_ID = "6f1c7c1e-0f7a-4a39-9d7e-2a4c8f0b9e11"
+
+
+def test_malformed_frames_get_errors_without_closing_the_socket(monkeypatch):
+    sent, queued = [], []
+    monkeypatch.setattr(social, "get_user_summaries", lambda ids: {"u": {"id": "u", "name": "U"}})
+    monkeypatch.setattr(social, "_can_join_room", lambda user_id, room_id: True)
+    monkeypatch.setattr(social.chat_gateway, "send", lambda connection, payload: sent.append(payload))
+    monkeypatch.setattr(social.chat_gateway, "broadcast", lambda room_id, payload: None)
+    monkeypatch.setattr(social.chat_writer, "enqueue", queued.append)
+    websocket = ScriptedWebSocket([
+        "[1, 2]",
+        '"subscribe"',
+        "{}",
+        json.dumps({"type": "subscribe", "room_id": ["x"]}),
+        json.dumps({"type": "subscribe", "room_id": "not-a-uuid"}),
+        json.dumps({"type": "subscribe", "room_id": ROOM_ID}),
+        json.dumps({"type": "message", "room_id": ROOM_ID}),
+        json.dumps({"type": "message", "room_id": ROOM_ID, "message": "hi", "client_id": {"a": 1}}),
+        json.dumps({"type": "message", "room_id": ROOM_ID, "message": "hi", "client_id": "c1"})
+    ])
+
+    asyncio.run(social.chat_socket(websocket, user_id="u"))
+
+    assert [frame["type"] for frame in sent] == ["error"] * 5 + ["subscribed", "error", "error", "ack"]
+    assert sent[-1]["client_id"] == "c1"
+    assert [row["message"] for row in queued] == ["hi"]
@@ -0,0 +1,20 @@
+import pytest
+from fastapi import HTTPException
+
+from routes.social import _decode_history_cursor
+
+MESSAGE_ID = "6f1c7c1e-0f7a-4a39-9d7e-2a4c8f0b9e11"
+
+
+def test_history_cursor_splits_timestamp_and_id():
+    assert _decode_history_cursor(f"2026-10-19T10:00:00Z,{MESSAGE_ID}") == {
+        "p_before_ts": "2026-10-19T10:00:00Z",
+        "p_before_id": MESSAGE_ID
+    }
+
+
+@pytest.mark.parametrize("before", ["2026-10-19T10:00:00Z,not-a-uuid", "2026-10-19T10:00:00Z", f"yesterday,{MESSAGE_ID}"])
+def test_malformed_history_cursors_are_rejected(before):
+    with pytest.raises(HTTPException) as error:
+        _decode_history_cursor(before)
+    assert error.value.status_code == 400
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import uuid
+import pytest
+
+# Runs against a migrated database; the rows it creates are deleted afterwards
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+async def _create_users(conn, count):
+    has_password = await conn.fetchval(
+        "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+        "WHERE table_name = 'users' AND column_name = 'password_hash')"
+    )
+    ids = []
+    for _ in range(count):
+        tag = uuid.uuid4().hex[:12]
+        columns = "email, name, username" + (", password_hash" if has_password else "")
+        values = [f"{tag}@test.invalid", tag, f"test_{tag}"] + (["x"] if has_password else [])
+        placeholders = ", ".join(f"${n}" for n in range(1, len(values) + 1))
+        ids.append(await conn.fetchval(f"INSERT INTO users ({columns}) VALUES ({placeholders}) RETURNING id", *values))
+    return ids
+
+
+def test_concurrent_joins_never_exceed_capacity():
+    asyncpg = pytest.importorskip("asyncpg")
+    capacity, joiners = 5, 20
+
+    async def scenario():
+        pool = await asyncpg.create_pool(TEST_DATABASE_URL, min_size=joiners, max_size=joiners)
+        async with pool.acquire() as conn:
+            creator, *users = await _create_users(conn, joiners + 1)
+            room_id = await conn.fetchval(
+                "INSERT INTO chat_rooms (name, max_members, creator_id) VALUES ('capacity test', $1, $2) RETURNING id",
+                capacity, creator
+            )
+        try:
+            async def join(user_id):
+                async with pool.acquire() as conn:
+                    return await conn.fetchval("SELECT join_chat_room($1, $2)", room_id, user_id)
+
+            results = await asyncio.gather(*(join(user_id) for user_id in users))
+            again = await join(users[results.index("joined")])
+            async with pool.acquire() as conn:
+                members = await conn.fetchval("SELECT count(*) FROM chat_room_members WHERE room_id = $1", room_id)
+                member_count = await conn.fetchval("SELECT member_count FROM chat_rooms WHERE id = $1", room_id)
+                missing = await conn.fetchval("SELECT join_chat_room($1, $2)", uuid.uuid4(), users[0])
+            return results, again, members, member_count, missing
+        finally:
+            async with pool.acquire() as conn:
+                await conn.execute("DELETE FROM chat_rooms WHERE id = $1", room_id)
+                await conn.execute("DELETE FROM users WHERE id = ANY($1::uuid[])", [creator, *users])
+            await pool.close()
+
+    results, again, members, member_count, missing = asyncio.run(scenario())
+
+    # The creator holds one of the seats
+    assert results.count("joined") == capacity - 1
+    assert results.count("full") == joiners - (capacity - 1)
+    assert members == member_count == capacity
+    assert again == "already_member"
+    assert missing == "not_found"
+
+
+def test_read_cursor_never_passes_a_message_that_commits_late():
+    asyncpg = pytest.importorskip("asyncpg")
+
+    async def scenario():
+        pool = await asyncpg.create_pool(TEST_DATABASE_URL, min_size=3, max_size=3)
+        async with pool.acquire() as conn:
+            creator, reader = await _create_users(conn, 2)
+            room_id = await conn.fetchval(
+                "INSERT INTO chat_rooms (name, max_members, creator_id) VALUES ('cursor test', 10, $1) RETURNING id",
+                creator
+            )
+            await conn.execute("INSERT INTO chat_messages (room_id, user_id, message) VALUES ($1, $2, 'before joining')", room_id, creator)
+            await conn.fetchval("SELECT join_chat_room($1, $2)", room_id, reader)
+        try:
+            async def unread():
+                async with pool.acquire() as conn:
+                    return await conn.fetchval("SELECT unread FROM chat_unread_counts($1, ARRAY[$2::uuid])", reader, room_id)
+
+            async def send(conn, text):
+                return await conn.fetchval(
+                    "INSERT INTO chat_messages (room_id, user_id, message) VALUES ($1, $2, $3) RETURNING id",
+                    room_id, creator, text
+                )
+
+            joined_unread = await unread()
+
+            # The first message is inserted but not committed; the second one
+            # has to wait for it, so it cannot take an earlier position
+            async with pool.acquire() as slow, pool.acquire() as fast:
+                transaction = slow.transaction()
+                await transaction.start()
+                late_id = await send(slow, "late")
+                sending = asyncio.ensure_future(send(fast, "early"))
+                await asyncio.sleep(0.2)
+                blocked = not sending.done()
+                await transaction.commit()
+                early_id = await sending
+
+            async with pool.acquire() as conn:
+                moved = await conn.fetchval("SELECT mark_chat_room_read($1, $2, $3)", room_id, reader, early_id)
+                back = await conn.fetchval("SELECT mark_chat_room_read($1, $2, $3)", room_id, reader, late_id)
+                seqs = await conn.fetch("SELECT id, room_seq FROM chat_messages WHERE id = ANY($1::uuid[])", [late_id, early_id])
+            return joined_unread, blocked, moved, back, {row["id"]: row["room_seq"] for row in seqs}, late_id, early_id, await unread()
+        finally:
+            async with pool.acquire() as conn:
+                await conn.execute("DELETE FROM chat_rooms WHERE id = $1", room_id)
+                await conn.execute("DELETE FROM users WHERE id = ANY($1::uuid[])", [creator, reader])
+            await pool.close()
+
+    joined_unread, blocked, moved, back, seqs, late_id, early_id, final_unread = asyncio.run(scenario())
+
+    assert joined_unread == 0
+    assert blocked
+    assert seqs[late_id] < seqs[early_id]
+    assert moved and not back
+    assert final_unread == 0
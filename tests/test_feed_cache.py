@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from routes import social
+from services import feed_cache as feed_cache_module
+from services import post_counters as post_counters_module
+from services.feed_cache import FeedCache
+
+
+class FakeQuery:
+    def __init__(self, db, source):
+        self._db = db
+        self.calls = [source]
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, *args))
+            return self
+        return call
+
+    def execute(self):
+        self._db.queries.append(self.calls)
+        return type("Result", (), {"data": self._db.results[self.calls[0]]})()
+
+
+class FakeSupabase:
+    def __init__(self, results):
+        self.results = results
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        query = FakeQuery(self, name)
+        query.calls.append(params)
+        return query
+
+
+def _post(post_id: str) -> dict:
+    return {
+        "id": post_id, "user_id": "u1", "content": post_id, "type": "general", "likes": 1,
+        "comment_count": 2, "share_count": 0, "media": [], "xp_earned": None,
+        "timestamp": "2026-10-19T10:00:00+00:00"
+    }
+
+
+def test_cached_pages_read_counts_and_look_up_likes_per_viewer(monkeypatch):
+    db = FakeSupabase({
+        "posts": [_post("p1"), _post("p2")],
+        "users": [{"id": "u1", "name": "Ann", "avatar_url": None, "level": 3}],
+        "liked_post_ids": [{"post_id": "p2"}]
+    })
+    monkeypatch.setattr(feed_cache_module, "supabase_admin", db)
+    monkeypatch.setattr(feed_cache_module, "feed_version", lambda: "v1")
+    monkeypatch.setattr(feed_cache_module, "get_user_summaries", lambda ids: {"u1": {"name": "Ann", "level": 3}})
+    monkeypatch.setattr(post_counters_module, "supabase_admin", db)
+    cache = FeedCache()
+
+    cache.load()
+    page = json.loads(cache.page_json(0, "viewer"))
+
+    select = next(call for call in db.queries[0] if call[0] == "select")[1]
+    assert "likes_by" not in select and "comments," not in select
+    assert [(p["id"], p["comments"], p["isLiked"]) for p in page["posts"]] == [("p1", 2, False), ("p2", 2, True)]
+    lookup = db.queries[-1][1]
+    assert lookup["p_user_id"] == "viewer" and sorted(lookup["p_post_ids"]) == ["p1", "p2"]
+
+    queries = len(db.queries)
+    anonymous = json.loads(cache.page_json(0, None))
+    assert not any(p["isLiked"] for p in anonymous["posts"])
+    assert len(db.queries) == queries
+
+
+def test_post_comments_load_on_demand(monkeypatch):
+    db = FakeSupabase({"posts": [{"comments": [
+        {"id": "1", "user_id": "u1", "content": "Nice", "timestamp": "2026-10-19T10:00:00"}
+    ]}]})
+    monkeypatch.setattr(social, "supabase_admin", db)
+    monkeypatch.setattr(social, "get_user_summaries", lambda ids: {"u1": {"name": "Ann", "avatar_url": None}})
+
+    result = asyncio.run(social.get_post_comments("p1"))
+
+    assert result == {"comments": [{
+        "id": "1", "user": {"name": "Ann", "avatar_url": None}, "content": "Nice", "timestamp": "2026-10-19T10:00:00"
+    }]}
+
+    db.results["posts"] = []
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(social.get_post_comments("missing"))
+    assert raised.value.status_code == 404
@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+
+from routes import social
+from services import feed_changes
+from services.feed_changes import decode_version, encode_version
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, data):
+        self._data = data
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return Result(self._data)
+
+
+class FakeSupabase:
+    def __init__(self, rpcs, posts=()):
+        self.rpcs = rpcs
+        self.posts = list(posts)
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return FakeQuery(self.rpcs[name])
+
+    def table(self, name):
+        return FakeQuery(self.posts)
+
+
+@pytest.fixture
+def use_db(monkeypatch):
+    def install(db):
+        monkeypatch.setattr(feed_changes, "supabase_admin", db)
+        monkeypatch.setattr(social, "supabase_admin", db)
+        monkeypatch.setattr(social, "get_user_summaries", lambda ids: {})
+        return db
+    return install
+
+
+def _changes(since, limit=500):
+    return asyncio.run(social.get_feed_changes(since=since, user_id=None, limit=limit))
+
+
+def test_versions_round_trip_and_reject_old_formats():
+    assert decode_version(encode_version("742", 18)) == ("742", 18)
+    assert decode_version("1234") is None
+    assert decode_version("abc-1") is None
+    assert decode_version("") is None
+
+
+def test_undecodable_versions_reset_to_the_head(use_db):
+    use_db(FakeSupabase({"feed_changes_head": "900"}))
+
+    assert _changes("1234") == {"version": "900-0", "reset": True}
+
+
+def test_versions_behind_the_pruned_log_reset(use_db):
+    db = use_db(FakeSupabase({"feed_changes_expired": True, "feed_changes_head": "900"}))
+
+    assert _changes("700-3") == {"version": "900-0", "reset": True}
+    assert ("feed_changes_expired", {"p_after_xid": "700", "p_after_seq": 3}) in db.calls
+
+
+def test_no_changes_keeps_the_version(use_db):
+    use_db(FakeSupabase({"feed_changes_expired": False, "feed_changes_since": []}))
+
+    assert _changes("700-3") == {"version": "700-3", "posts": [], "counters": [], "more": False}
+
+
+def test_changes_advance_to_the_last_position_read(use_db):
+    post = {"id": "p2", "user_id": "u", "content": "hi", "timestamp": "2026-10-19T10:00:00+00:00", "likes": 0}
+    db = use_db(FakeSupabase({
+        "feed_changes_expired": False,
+        "feed_changes_since": [
+            {"xid": "701", "seq": 1, "kind": "counter", "post_id": "p1", "likes": 1, "comments": 0, "shares": 0},
+            {"xid": "701", "seq": 2, "kind": "counter", "post_id": "p1", "likes": 2, "comments": 0, "shares": 0},
+            {"xid": "702", "seq": 1, "kind": "post", "post_id": "p2", "likes": 0, "comments": 0, "shares": 0}
+        ]
+    }, posts=[post]))
+
+    result = _changes("700-3", limit=3)
+
+    assert result["version"] == "702-1"
+    assert result["counters"] == [["p1", 2, 0, 0]]
+    assert [entry["id"] for entry in result["posts"]] == ["p2"]
+    assert result["more"] is True
+    assert ("feed_changes_since", {"p_after_xid": "700", "p_after_seq": 3, "p_limit": 3}) in db.calls
@@ -0,0 +1,31 @@
+import pytest
+from fastapi import HTTPException
+
+from routes.social import _decode_home_cursor, _encode_home_cursor
+
+POST_ID = "6f1c7c1e-0f7a-4a39-9d7e-2a4c8f0b9e11"
+
+
+def test_home_cursor_is_url_safe_and_round_trips():
+    cursor = _encode_home_cursor({"timestamp": "2026-10-19T10:00:00.123456+00:00", "id": POST_ID})
+
+    assert not set(cursor) & set("+/:,")
+    assert _decode_home_cursor(cursor) == {
+        "p_before_ts": "2026-10-19T10:00:00.123456+00:00",
+        "p_before_id": POST_ID
+    }
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bnVsbA==", "WzEsMiwzXQ=="])
+def test_malformed_home_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        _decode_home_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_home_cursor_rejects_bad_fields():
+    cursor = _encode_home_cursor({"timestamp": "yesterday", "id": POST_ID})
+
+    with pytest.raises(HTTPException) as error:
+        _decode_home_cursor(cursor)
+    assert error.value.status_code == 400
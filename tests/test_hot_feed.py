@@ -0,0 +1,102 @@
+import time
+from datetime import datetime, timezone
+
+from services import hot_feed as hot_feed_module
+from services.hot_feed import HotFeed
+
+
+def _iso(seconds_ago: float) -> str:
+    return datetime.fromtimestamp(time.time() - seconds_ago, timezone.utc).isoformat()
+
+
+def test_ranks_by_decayed_engagement():
+    feed = HotFeed(10)
+    feed.add_post("old", _iso(3600 * 24))
+    feed.add_post("new", _iso(60))
+    feed.update("old", likes=10)
+
+    assert feed.page(0, 10) == ["old", "new"]
+    feed.update("new", likes=20)
+    assert feed.page(0, 10) == ["new", "old"]
+    assert feed.page(1, 1) == ["old"]
+
+
+def test_posts_outside_the_top_are_benched_and_can_climb_back():
+    feed = HotFeed(2)
+    feed.add_post("a", _iso(600))
+    feed.add_post("b", _iso(600))
+    feed.update("a", likes=5)
+    feed.update("b", likes=5)
+    feed.add_post("late", _iso(60))
+
+    assert "late" not in feed.page(0, 10)
+    feed.update("late", comments=10)
+    assert feed.page(0, 1) == ["late"]
+    assert len(feed.page(0, 10)) == 2
+
+
+def test_redecay_drops_posts_that_left_the_window():
+    feed = HotFeed(10)
+    window = hot_feed_module.HOT_FEED_WINDOW_HOURS * 3600
+    feed.add_post("expired", _iso(window + 60))
+    feed.add_post("fresh", _iso(60))
+
+    feed.redecay()
+
+    assert feed.page(0, 10) == ["fresh"]
+    feed.update("expired", likes=100)
+    assert feed.page(0, 10) == ["fresh"]
+
+
+class FakeQuery:
+    def __init__(self, db):
+        self._db = db
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, *args))
+            return self
+        return call
+
+    def execute(self):
+        self._db.queries.append(self.calls)
+        page = self._db.pages.pop(0)
+        if self._db.during_read:
+            self._db.during_read()
+            self._db.during_read = None
+        return type("Result", (), {"data": page})()
+
+
+class FakeSupabase:
+    def __init__(self, pages, during_read=None):
+        self.pages = pages
+        self.during_read = during_read
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+def test_reconcile_pages_the_window_by_timestamp_and_id(monkeypatch):
+    monkeypatch.setattr(hot_feed_module, "LOAD_BATCH_SIZE", 2)
+    ts = [_iso(300), _iso(200), _iso(100)]
+    rows = [
+        {"id": "p1", "likes": 1, "comment_count": 0, "share_count": 0, "timestamp": ts[0]},
+        {"id": "p2", "likes": 2, "comment_count": 0, "share_count": 0, "timestamp": ts[1]},
+        {"id": "p3", "likes": 3, "comment_count": 0, "share_count": 0, "timestamp": ts[2]}
+    ]
+    feed = HotFeed(10)
+    # A like recorded while the table is being read wins over the row read
+    db = FakeSupabase([rows[:2], rows[2:]], during_read=lambda: feed.update("p1", likes=50))
+    monkeypatch.setattr(hot_feed_module, "supabase_admin", db)
+    feed.add_post("p1", ts[0])
+
+    feed.reconcile()
+
+    assert feed.ready
+    assert feed.page(0, 10) == ["p1", "p3", "p2"]
+    first, second = db.queries
+    assert ("order", "timestamp") in first and ("order", "id") in first
+    assert ("gte", "timestamp", ts[1]) in second
+    assert ("or_", f'timestamp.gt."{ts[1]}",id.gt.p2') in second
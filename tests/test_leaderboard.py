@@ -0,0 +1,68 @@
+from services import leaderboard as leaderboard_module
+from services.leaderboard import Leaderboard, load_lifetime_totals
+
+
+class FakeQuery:
+    def __init__(self, db):
+        self._db = db
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, *args))
+            return self
+        return call
+
+    def execute(self):
+        self._db.queries.append(self.calls)
+        after = next((args[1] for name, *args in self.calls if name == "gt"), None)
+        rows = [dict(user) for user in self._db.users if after is None or user["id"] > after]
+        return type("Result", (), {"data": rows[:leaderboard_module.LOAD_BATCH_SIZE]})()
+
+
+class FakeSupabase:
+    def __init__(self, users):
+        self.users = users
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+def test_lifetime_totals_are_keyset_paged_and_include_pending_xp(monkeypatch):
+    monkeypatch.setattr(leaderboard_module, "LOAD_BATCH_SIZE", 2)
+    db = FakeSupabase([
+        {"id": "a", "level": 1, "xp": 10, "pending_xp": 0},
+        {"id": "b", "level": 2, "xp": 0, "pending_xp": 5},
+        {"id": "c", "level": 1, "xp": 0, "pending_xp": None}
+    ])
+    monkeypatch.setattr(leaderboard_module, "supabase_admin", db)
+
+    assert list(load_lifetime_totals()) == [("a", 10), ("b", 105), ("c", 0)]
+    assert [next((args[1] for name, *args in calls if name == "gt"), None) for calls in db.queries] == [None, "b"]
+
+
+def test_ranks_update_in_place_and_ties_break_by_id():
+    board = Leaderboard(lambda: [])
+    for user_id, total in [("a", 50), ("b", 70), ("c", 50), ("d", 10)]:
+        board.update(user_id, total)
+    board.update("d", 60)
+
+    assert board.top(10) == [(1, "b", 70), (2, "d", 60), (3, "a", 50), (4, "c", 50)]
+    assert board.rank_of("a") == (3, 50)
+    assert board.rank_of("missing") is None
+    assert [user_id for _, user_id, _ in board.around("a", 1)] == ["d", "a", "c"]
+
+
+def test_reconcile_keeps_awards_made_while_loading():
+    def loader():
+        # An award lands mid-read; the row read for "a" predates it
+        board.update("a", 500)
+        yield "a", 100
+        yield "b", 200
+
+    board = Leaderboard(loader)
+    board.reconcile()
+
+    assert board.ready
+    assert board.top(2) == [(1, "a", 500), (2, "b", 200)]
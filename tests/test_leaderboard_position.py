@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from routes import social
+from services.leaderboard import Leaderboard
+
+USER_ID = "6f1c7c1e-0f7a-4a39-9d7e-2a4c8f0b9e11"
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self._db = db
+        self._table = table
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, *args, *kwargs.items()))
+            return self
+        return call
+
+    def execute(self):
+        self._db.queries.append((self._table, self.calls))
+        head = any(("head", True) in call for call in self.calls)
+        data = [] if head else self._db.rows.get(self._table, [])
+        return type("Result", (), {"data": data, "count": self._db.ahead if head else None})()
+
+
+class FakeSupabase:
+    def __init__(self, rows, ahead=0):
+        self.rows = rows
+        self.ahead = ahead
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def unready_board(monkeypatch):
+    board = Leaderboard(lambda: [])
+    monkeypatch.setattr(social, "_leaderboard_board", lambda period: board)
+    monkeypatch.setattr(social, "get_user_summaries", lambda ids: {})
+    return board
+
+
+def _position(user_id, **params):
+    return asyncio.run(social.get_leaderboard_position(user_id, **params))
+
+
+def test_position_is_counted_from_the_database_until_the_board_loads(monkeypatch, unready_board):
+    db = FakeSupabase({"users": [{"id": USER_ID, "level": 3, "xp": 40}]}, ahead=6)
+    monkeypatch.setattr(social, "supabase_admin", db)
+
+    result = _position(USER_ID, radius=2)
+
+    assert result["rank"] == 7
+    assert result["score"] == 340
+    count_filters = [calls for table, calls in db.queries if any(("head", True) in call for call in calls)]
+    assert ("or_", "level.gt.3,and(level.eq.3,xp.gt.40)") in count_filters[0]
+    # Neighbours come from the same ordering, two places either side
+    listing = [calls for table, calls in db.queries if any(call[0] == "range" for call in calls)]
+    assert ("range", 4, 8) in listing[0]
+
+
+def test_ready_board_answers_from_memory(monkeypatch, unready_board):
+    monkeypatch.setattr(social, "supabase_admin", None)
+    unready_board.update(USER_ID, 120)
+    unready_board.update("other", 300)
+    unready_board.ready = True
+
+    result = _position(USER_ID)
+
+    assert (result["rank"], result["score"]) == (2, 120)
+    assert [entry["id"] for entry in result["neighbors"]] == ["other", USER_ID]
+
+
+@pytest.mark.parametrize("user_id", [USER_ID, "not-a-uuid"])
+def test_unknown_users_are_not_found(monkeypatch, unready_board, user_id):
+    monkeypatch.setattr(social, "supabase_admin", FakeSupabase({"users": []}))
+
+    with pytest.raises(HTTPException) as error:
+        _position(user_id)
+    assert error.value.status_code == 404
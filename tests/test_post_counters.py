@@ -0,0 +1,80 @@
+import asyncio
+import fcntl
+import json
+
+from routes import social
+from services import post_counters as post_counters_module
+from services.post_counters import PostCounterBuffer
+
+
+class FakeQuery:
+    def __init__(self, db, name, params):
+        self._db = db
+        self._call = (name, params)
+
+    def execute(self):
+        self._db.calls.append(self._call)
+        return type("Result", (), {"data": self._db.results.get(self._call[0])})()
+
+
+class FakeSupabase:
+    def __init__(self, results=None):
+        self.results = results or {}
+        self.calls = []
+
+    def rpc(self, name, params):
+        return FakeQuery(self, name, params)
+
+
+def _write_log(path, records, tail=""):
+    path.write_text("".join(json.dumps(r) + "\n" for r in records) + tail)
+
+
+def test_replay_applies_left_behind_logs_under_their_file_names(tmp_path, monkeypatch):
+    db = FakeSupabase()
+    monkeypatch.setattr(post_counters_module, "supabase_admin", db)
+    _write_log(tmp_path / "batch-a.log", [
+        {"post_id": "p1", "user_id": "u1", "liked": True},
+        {"post_id": "p1", "counter": "shares", "delta": 1}
+    ])
+    # The last change was torn mid-write, so it was never acknowledged
+    _write_log(tmp_path / "batch-b.log", [{"post_id": "p2", "counter": "views", "delta": 1}], tail='{"post_id": "p2", "cou')
+    _write_log(tmp_path / "live.log", [{"post_id": "p3", "counter": "views", "delta": 1}])
+
+    with open(tmp_path / "live.log", "a") as live:
+        fcntl.flock(live, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        PostCounterBuffer(str(tmp_path)).replay()
+
+    assert [params["p_batch_id"] for _, params in db.calls] == ["batch-a", "batch-b"]
+    assert db.calls[0][1]["p_deltas"] == [{"post_id": "p1", "shares": 1, "views": 0, "liked": ["u1"], "unliked": []}]
+    assert db.calls[1][1]["p_deltas"] == [{"post_id": "p2", "shares": 0, "views": 1, "liked": [], "unliked": []}]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["live.log"]
+
+
+def test_like_state_folds_unflushed_likes_into_the_stored_state(tmp_path, monkeypatch):
+    db = FakeSupabase({"post_like_state": [{"likes": 5, "liked": False}]})
+    monkeypatch.setattr(post_counters_module, "supabase_admin", db)
+    buffer = PostCounterBuffer(str(tmp_path))
+    buffer.open()
+
+    assert buffer.like_state("p1", "u1") == (5, False)
+    buffer.like("p1", "u1", True)
+    assert buffer.like_state("p1", "u1") == (6, True)
+    assert db.calls[0] == ("post_like_state", {"p_post_id": "p1", "p_user_id": "u1"})
+
+    db.results["post_like_state"] = []
+    assert buffer.like_state("missing", "u1") is None
+
+
+def test_like_reads_only_the_like_state(tmp_path, monkeypatch):
+    db = FakeSupabase({"post_like_state": [{"likes": 3, "liked": True}]})
+    buffer = PostCounterBuffer(str(tmp_path))
+    buffer.open()
+    monkeypatch.setattr(post_counters_module, "supabase_admin", db)
+    monkeypatch.setattr(social, "supabase_admin", db)
+    monkeypatch.setattr(social, "post_counters", buffer)
+
+    result = asyncio.run(social.like_post(social.LikePostRequest(user_id="u1", post_id="p1")))
+
+    assert result == {"liked": False, "likes": 2}
+    assert [name for name, _ in db.calls] == ["post_like_state"]
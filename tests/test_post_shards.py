@@ -0,0 +1,62 @@
+import pytest
+
+from services import post_shards as post_shards_module
+from services.post_shards import PostShards
+
+
+class FakeQuery:
+    def __init__(self, db, name, params):
+        self._db = db
+        self._call = (name, params)
+
+    def execute(self):
+        self._db.calls.append(self._call)
+        result = self._db.results[self._call[0]]
+        if isinstance(result, Exception):
+            raise result
+        return type("Result", (), {"data": result})()
+
+
+class FakeSupabase:
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def rpc(self, name, params):
+        return FakeQuery(self, name, params)
+
+
+def test_rebalance_reports_writes_and_takes_the_shared_decision(monkeypatch):
+    db = FakeSupabase({
+        "rebalance_post_counters": [{"post_id": "hot"}],
+        "post_counter_totals": [{"post_id": "hot", "likes": 4, "shares": 1, "views": 9}]
+    })
+    monkeypatch.setattr(post_shards_module, "supabase_admin", db)
+    shards = PostShards()
+    for _ in range(3):
+        shards.observe("hot")
+    shards.observe("cold")
+
+    shards.rebalance()
+
+    name, params = db.calls[0]
+    assert name == "rebalance_post_counters"
+    assert sorted((w["post_id"], w["writes"]) for w in params["p_writes"]) == [("cold", 1), ("hot", 3)]
+    assert params["p_promote_rate"] > params["p_demote_rate"]
+    assert shards.is_sharded("hot") and not shards.is_sharded("cold")
+    assert shards.overlay({"id": "hot", "likes": 1})["likes"] == 5
+
+
+def test_unreported_writes_carry_over(monkeypatch):
+    db = FakeSupabase({"rebalance_post_counters": RuntimeError("down"), "post_counter_totals": []})
+    monkeypatch.setattr(post_shards_module, "supabase_admin", db)
+    shards = PostShards()
+    shards.observe("p1")
+
+    with pytest.raises(RuntimeError):
+        shards.rebalance()
+    shards.observe("p1")
+    db.results["rebalance_post_counters"] = []
+    shards.rebalance()
+
+    assert db.calls[-1][1]["p_writes"] == [{"post_id": "p1", "writes": 2}]
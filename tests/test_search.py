@@ -0,0 +1,19 @@
+import pytest
+from fastapi import HTTPException
+
+from routes.social import _decode_rank_cursor, _encode_rank_cursor
+
+POST_ID = "6f1c7c1e-0f7a-4a39-9d7e-2a4c8f0b9e11"
+
+
+def test_rank_cursor_round_trips():
+    cursor = _encode_rank_cursor({"rank": 0.25, "id": POST_ID})
+
+    assert _decode_rank_cursor(cursor) == {"after_rank": 0.25, "after_id": POST_ID}
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bnVsbA==", "WzEsMiwzXQ=="])
+def test_malformed_rank_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        _decode_rank_cursor(cursor)
+    assert error.value.status_code == 400
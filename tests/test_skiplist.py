@@ -0,0 +1,51 @@
+import random
+import pytest
+
+from services.skiplist import IndexableSkipList
+
+
+def test_matches_a_sorted_list_under_random_inserts_and_removes():
+    rng = random.Random(7)
+    skiplist = IndexableSkipList()
+    reference = []
+
+    for _ in range(2000):
+        if reference and rng.random() < 0.4:
+            key = rng.choice(reference)
+            skiplist.remove(key)
+            reference.remove(key)
+        else:
+            key = (rng.randrange(-500, 0), f"user-{rng.randrange(10000)}")
+            if key in reference:
+                continue
+            skiplist.insert(key)
+            reference.append(key)
+            reference.sort()
+
+        assert len(skiplist) == len(reference)
+
+    for position, key in enumerate(reference):
+        assert skiplist.rank(key) == position
+    assert skiplist.slice(0, len(reference)) == reference
+    assert skiplist.slice(10, 5) == reference[10:15]
+
+
+def test_slice_out_of_range_is_empty():
+    skiplist = IndexableSkipList()
+    for key in range(5):
+        skiplist.insert(key)
+
+    assert skiplist.slice(5, 3) == []
+    assert skiplist.slice(-1, 3) == []
+    assert skiplist.slice(0, 0) == []
+    assert skiplist.slice(3, 10) == [3, 4]
+
+
+def test_missing_keys_raise_key_error():
+    skiplist = IndexableSkipList()
+    skiplist.insert(1)
+
+    with pytest.raises(KeyError):
+        skiplist.rank(2)
+    with pytest.raises(KeyError):
+        skiplist.remove(2)
@@ -0,0 +1,124 @@
+import random
+from collections import Counter
+
+from services import trending as trending_module
+from services.trending import CountMinSketch, SpaceSaving, TrendingIndex, extract_tokens
+
+
+def test_extract_tokens_splits_hashtags_and_keywords():
+    tokens = extract_tokens("Morning #Workout done, feeling strong! #gains with them")
+
+    assert tokens == {"#workout", "#gains", "morning", "done", "feeling", "strong"}
+
+
+def test_count_min_sketch_never_underestimates():
+    rng = random.Random(3)
+    sketch = CountMinSketch(256, 4)
+    counts = Counter(f"token{rng.randrange(2000)}" for _ in range(20000))
+    for token, count in counts.items():
+        for _ in range(count):
+            sketch.add(token)
+
+    for token, count in counts.items():
+        assert sketch.estimate(token) >= count
+    assert sketch.estimate("never-added") >= 0
+
+
+def test_space_saving_keeps_every_token_above_its_error_bound():
+    rng = random.Random(5)
+    capacity = 20
+    summary = SpaceSaving(capacity)
+    stream = ["heavy-a"] * 500 + ["heavy-b"] * 300 + [f"noise{rng.randrange(5000)}" for _ in range(2000)]
+    rng.shuffle(stream)
+    for token in stream:
+        summary.add(token)
+
+    # Any token seen more than n / capacity times must still be tracked
+    tokens = summary.tokens()
+    assert len(tokens) == capacity
+    assert "heavy-a" in tokens and "heavy-b" in tokens
+
+
+def test_top_ranks_tokens_across_buckets(monkeypatch):
+    index = TrendingIndex()
+    now = 1_000_000.0
+    monkeypatch.setattr(trending_module.time, "time", lambda: now)
+    bucket = trending_module.TRENDING_BUCKET_SECONDS
+
+    for _ in range(3):
+        index.add("#protein shake", now)
+    index.add("#protein again", now - bucket)
+    index.add("#cardio", now)
+    # Older than the window
+    index.add("#ancient", now - bucket * (trending_module.TRENDING_BUCKETS + 1))
+
+    top = index.top(2, kind="hashtag")
+    assert [entry["token"] for entry in top] == ["#protein", "#cardio"]
+    assert top[0]["count"] >= 4
+    assert all(entry["token"] != "#ancient" for entry in index.top(10))
+
+
+def test_stream_post_events_are_counted():
+    index = TrendingIndex()
+    index.on_stream({"event": "counters", "key": "likes:1", "data": {"post_id": "1", "likes": 3}})
+    index.on_stream({"event": "post", "key": "post:1", "data": {
+        "content": "#legday",
+        "timestamp": trending_module.datetime.utcnow().isoformat()
+    }})
+
+    assert [entry["token"] for entry in index.top(5, kind="hashtag")] == ["#legday"]
+
+
+def _post_event(post_id, content, post_type="general"):
+    return {"event": "post", "key": f"post:{post_id}", "data": {
+        "id": post_id,
+        "content": content,
+        "type": post_type,
+        "timestamp": trending_module.datetime.utcnow().isoformat()
+    }}
+
+
+def test_achievement_posts_are_not_counted():
+    index = TrendingIndex()
+    index.on_stream(_post_event("1", "Unlocked Level Up Legend: Reached level 10!", post_type="achievement"))
+    index.on_stream(_post_event("2", "#legday"))
+
+    assert [entry["token"] for entry in index.top(10)] == ["#legday"]
+
+
+class FakeQuery:
+    def __init__(self, rows, during_execute):
+        self._rows = rows
+        self._during_execute = during_execute
+        self.filters = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.filters.append((name, *args))
+            return self
+        return call
+
+    def execute(self):
+        self._during_execute()
+        return type("Result", (), {"data": self._rows})()
+
+
+def test_load_swaps_in_new_buckets_and_replays_posts_streamed_meanwhile(monkeypatch):
+    index = TrendingIndex()
+    index.add("#stale")
+    now = trending_module.datetime.utcnow().isoformat()
+    rows = [{"id": "1", "content": "#loaded", "timestamp": now}]
+
+    def stream_during_load():
+        # Readers still see the old buckets until the swap
+        assert [entry["token"] for entry in index.top(10)] == ["#stale"]
+        index.on_stream(_post_event("1", "#loaded"))
+        index.on_stream(_post_event("2", "#streamed"))
+
+    query = FakeQuery(rows, stream_during_load)
+    monkeypatch.setattr(trending_module, "supabase_admin", type("DB", (), {"table": lambda self, name: query})())
+
+    index.load()
+
+    assert {entry["token"]: entry["count"] for entry in index.top(10)} == {"#loaded": 1, "#streamed": 1}
+    assert ("neq", "type", "achievement") in query.filters
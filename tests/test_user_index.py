@@ -0,0 +1,98 @@
+from services import user_index as user_index_module
+from services.user_index import UserIndex
+
+
+def _user(n, name, level=1, username=None):
+    return {"id": f"u{n:03d}", "name": name, "username": username or f"user{n}", "avatar_url": None, "level": level}
+
+
+class FakeQuery:
+    def __init__(self, db):
+        self._db = db
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, *args))
+            return self
+        return call
+
+    def execute(self):
+        self._db.queries.append(self.calls)
+        after = next((args[1] for name, *args in self.calls if name == "gt"), None)
+        rows = [user for user in self._db.users if after is None or user["id"] > after]
+        if self._db.during_read:
+            self._db.during_read()
+            self._db.during_read = None
+        return type("Result", (), {"data": rows[:user_index_module.LOAD_BATCH_SIZE]})()
+
+
+class FakeSupabase:
+    def __init__(self, users, during_read=None):
+        self.users = sorted(users, key=lambda user: user["id"])
+        self.during_read = during_read
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+def _loaded(monkeypatch, users, during_read=None, index=None):
+    monkeypatch.setattr(user_index_module, "LOAD_BATCH_SIZE", 2)
+    db = FakeSupabase(users, during_read)
+    monkeypatch.setattr(user_index_module, "supabase_admin", db)
+    index = index or UserIndex()
+    index.load()
+    return index, db
+
+
+def test_load_pages_by_id(monkeypatch):
+    users = [_user(n, f"Name{n}") for n in range(5)]
+    index, db = _loaded(monkeypatch, users)
+
+    assert index.ready
+    assert set(index.get_many([user["id"] for user in users])) == {user["id"] for user in users}
+    assert [next((args[1] for name, *args in calls if name == "gt"), None) for calls in db.queries] == [None, "u001", "u003"]
+    assert not any(name == "range" for calls in db.queries for name, *_ in calls)
+
+
+def test_complete_matches_name_and_username_prefixes_by_level(monkeypatch):
+    index, _ = _loaded(monkeypatch, [
+        _user(1, "Sam Lee", level=3),
+        _user(2, "Samantha Ray", level=9),
+        _user(3, "Alex Sampson", level=5, username="lexi"),
+        _user(4, "Bo", level=20)
+    ])
+
+    assert [user["id"] for user in index.complete("sam")] == ["u002", "u003", "u001"]
+    assert [user["id"] for user in index.complete("Sam", limit=1)] == ["u002"]
+    assert index.complete("lex")[0]["name"] == "Alex Sampson"
+    assert index.complete("  ") == []
+
+
+def test_common_prefixes_walk_users_by_level(monkeypatch):
+    index, _ = _loaded(monkeypatch, [_user(n, f"Sam{n}", level=n) for n in range(1, 8)] + [_user(9, "Zed", level=50)])
+    monkeypatch.setattr(user_index_module, "MAX_CANDIDATES", 2)
+
+    assert [user["id"] for user in index.complete("sam", limit=3)] == ["u007", "u006", "u005"]
+
+
+def test_changes_apply_and_survive_a_concurrent_reload(monkeypatch):
+    users = [_user(1, "Sam Lee"), _user(2, "Ann Bo")]
+    index, _ = _loaded(monkeypatch, users)
+
+    index.deliver({"id": "u001", "name": "Kim Lee"})
+    assert index.complete("sam") == []
+    assert index.complete("kim")[0]["id"] == "u001"
+
+    # Arrive while the reload is reading a table that does not have them yet
+    def during_read():
+        index.deliver({"id": "u002", "level": 12})
+        index.deliver(_user(3, "New Person"))
+
+    _loaded(monkeypatch, users, during_read, index=index)
+
+    assert index.get_many(["u002"])["u002"]["level"] == 12
+    assert index.complete("new")[0]["id"] == "u003"
+    # The reload read the table, which still has the old name
+    assert index.complete("sam")[0]["id"] == "u001"